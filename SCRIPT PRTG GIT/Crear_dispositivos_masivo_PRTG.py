@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import requests
+import csv
+import json
+import os
+import re
+import time
+import threading
+import urllib3
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from Obtener_lista_Dispositivos_PRTG import obtener_todos_dispositivos
+import perfil_prtg as perfil
+import transferencia_prtg as transferencia
+import registro_prtg as registro
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+log = registro.obtener("creacion_masiva")
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+PRTG_SERVER = "https://TU.URL.com"
+USERNAME = "tu_user"
+PASSHASH = "tupasshash"
+
+ENTRADA_CSV = "dispositivos_nuevos.csv"          # Columnas: Dispositivo, Host, GrupoID[, PlantillaID]
+RESULTADOS_CSV = "resultado_creacion_dispositivos.csv"
+PLANTILLA_ID = "1234"     # Dispositivo que se duplica cuando la fila no trae PlantillaID
+REANUDAR = True           # PRTG deja pausados los objetos duplicados; True los reanuda
+
+INVENTARIO_CACHE = "inventario_dispositivos.json"
+CACHE_TTL = 900           # Segundos que se reutiliza el inventario guardado
+
+MAX_WORKERS = 4
+MAX_RPS = 2               # Peticiones por segundo contra PRTG (entre todos los workers)
+MAX_RETRIES = 3
+RETRY_DELAY = 5
+
+API = f"{PRTG_SERVER}/api/"
+CAMPOS_RESULTADO = ["Dispositivo", "Host", "GrupoID", "Estado", "ObjID", "Detalle"]
+
+limitador = transferencia.LimitadorTasa(MAX_RPS)
+
+
+def clave(host, grupo_id):
+    return (str(host).strip().lower(), str(grupo_id).strip())
+
+
+# ==========================
+# INVENTARIO EN CACHÉ
+# ==========================
+class Inventario:
+    """
+    Índice (host, ID de grupo) -> objid de los dispositivos existentes.
+    Se arma con obtener_todos_dispositivos() y se guarda en INVENTARIO_CACHE,
+    junto con los dispositivos que crea este script, para que una nueva
+    ejecución no vuelva a crearlos.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.indice = {}
+        self.dispositivos = []
+
+    def cargar(self):
+        if os.path.exists(INVENTARIO_CACHE):
+            with open(INVENTARIO_CACHE, encoding="utf-8") as f:
+                cache = json.load(f)
+            edad = time.time() - cache.get("generado", 0)
+            if edad < CACHE_TTL:
+                print(f"Usando inventario en caché ({len(cache['dispositivos'])} dispositivos, {edad:.0f}s)")
+                self._indexar(cache["dispositivos"])
+                return
+
+        print("Consultando inventario de dispositivos en PRTG...")
+        dispositivos = obtener_todos_dispositivos(API + "table.json", USERNAME, PASSHASH)
+        self._indexar([{"objid": d.get("objid"), "host": d.get("host"), "parentid": d.get("parentid"),
+                        "device": d.get("device")} for d in dispositivos])
+        self.guardar()
+
+    def _indexar(self, dispositivos):
+        self.dispositivos = list(dispositivos)
+        self.indice = {clave(d["host"], d["parentid"]): d["objid"] for d in self.dispositivos}
+
+    def buscar(self, host, grupo_id):
+        with self.lock:
+            return self.indice.get(clave(host, grupo_id))
+
+    def agregar(self, objid, host, grupo_id, nombre):
+        with self.lock:
+            self.indice[clave(host, grupo_id)] = objid
+            self.dispositivos.append({"objid": objid, "host": host, "parentid": grupo_id, "device": nombre})
+
+    def guardar(self):
+        with self.lock:
+            datos = {"generado": time.time(), "dispositivos": self.dispositivos}
+        with open(INVENTARIO_CACHE + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(datos, f)
+        os.replace(INVENTARIO_CACHE + ".tmp", INVENTARIO_CACHE)
+
+
+# ==========================
+# LLAMADAS A LA API
+# ==========================
+def llamar_api(pagina, params, **kwargs):
+    limitador.esperar()
+    params = dict(params, username=USERNAME, passhash=PASSHASH)
+    r = requests.get(API + pagina, params=params, verify=False, timeout=60,
+                     headers=transferencia.CABECERAS, **kwargs)
+    transferencia.registrar(r)
+    return r
+
+
+def buscar_en_prtg(host, grupo_id):
+    """Consulta directa a PRTG, para confirmar si un intento fallido llegó a crear el dispositivo."""
+    r = llamar_api("table.json", {"content": "devices", "columns": "objid,host",
+                                  "id": grupo_id, "filter_host": host})
+    r.raise_for_status()
+    for d in r.json().get("devices", []):
+        if clave(d.get("host"), grupo_id) == clave(host, grupo_id):
+            return d.get("objid")
+    return None
+
+
+def duplicar_dispositivo(plantilla_id, nombre, host, grupo_id):
+    """duplicateobject.htm responde con una redirección a la página del objeto nuevo."""
+    r = llamar_api("duplicateobject.htm",
+                   {"id": plantilla_id, "name": nombre, "host": host, "targetid": grupo_id},
+                   allow_redirects=False)
+    r.raise_for_status()
+    encontrado = re.search(r"id=(\d+)", r.headers.get("Location", ""))
+    if not encontrado:
+        raise RuntimeError(f"PRTG no devolvió el ID del dispositivo nuevo (HTTP {r.status_code})")
+    return encontrado.group(1)
+
+
+def reanudar(objid):
+    llamar_api("pause.htm", {"id": objid, "action": 1}).raise_for_status()
+
+
+# ==========================
+# CREACIÓN DE UN DISPOSITIVO
+# ==========================
+def crear(fila, inventario):
+    nombre = fila["Dispositivo"]
+    host = fila["Host"]
+    grupo_id = fila["GrupoID"]
+    resultado = {"Dispositivo": nombre, "Host": host, "GrupoID": grupo_id, "ObjID": "", "Detalle": ""}
+    objid = None
+
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            # Tras un fallo (p. ej. timeout) PRTG puede haber creado el dispositivo igual
+            if objid is None and attempt > 1:
+                objid = buscar_en_prtg(host, grupo_id)
+                if objid:
+                    inventario.agregar(objid, host, grupo_id, nombre)
+                    resultado["Detalle"] = "confirmado tras reintento"
+
+            if not objid:
+                with perfil.etapa("fetch", host):
+                    objid = duplicar_dispositivo(fila.get("PlantillaID") or PLANTILLA_ID, nombre, host, grupo_id)
+                inventario.agregar(objid, host, grupo_id, nombre)
+            # Un dispositivo ya creado en un intento anterior también se reanuda
+            if REANUDAR:
+                reanudar(objid)
+            return dict(resultado, Estado="creado", ObjID=objid)
+        except Exception as e:
+            log.warning(f"{nombre} ({host}) intento {attempt}/{MAX_RETRIES}: {e}", extra={"datos": {"host": host, "grupo": grupo_id}})
+            resultado["Detalle"] = str(e)
+            if attempt < MAX_RETRIES:
+                time.sleep(RETRY_DELAY)
+
+    if objid:
+        # Existe en PRTG pero no se pudo reanudar: queda pausado
+        return dict(resultado, Estado="creado_pausado", ObjID=objid)
+    return dict(resultado, Estado="error")
+
+
+# ==========================
+# MAIN
+# ==========================
+def leer_entrada():
+    with open(ENTRADA_CSV, newline="", encoding="utf-8-sig") as f:
+        filas = []
+        for fila in csv.DictReader(f):
+            fila = {k.strip(): (v or "").strip() for k, v in fila.items() if k}
+            if fila.get("Dispositivo") and fila.get("Host") and fila.get("GrupoID", "").isdigit():
+                filas.append(fila)
+            else:
+                print(f"Fila inválida, se omite: {fila}")
+        return filas
+
+
+def main():
+    print("\n=== CREACIÓN MASIVA DE DISPOSITIVOS PRTG ===\n")
+
+    filas = leer_entrada()
+    print(f"{len(filas)} dispositivos en {ENTRADA_CSV}")
+
+    inventario = Inventario()
+    with perfil.etapa("inventario"):
+        inventario.cargar()
+
+    resultados = []
+    pendientes = []
+    vistos = set()
+    for fila in filas:
+        k = clave(fila["Host"], fila["GrupoID"])
+        base = {"Dispositivo": fila["Dispositivo"], "Host": fila["Host"], "GrupoID": fila["GrupoID"], "Detalle": ""}
+        existente = inventario.buscar(fila["Host"], fila["GrupoID"])
+        if existente:
+            resultados.append(dict(base, Estado="existente", ObjID=existente))
+        elif k in vistos:
+            resultados.append(dict(base, Estado="repetido en CSV", ObjID=""))
+        else:
+            vistos.add(k)
+            pendientes.append(fila)
+
+    print(f"Ya existen: {sum(r['Estado'] == 'existente' for r in resultados)} | "
+          f"Repetidos en CSV: {sum(r['Estado'] == 'repetido en CSV' for r in resultados)} | "
+          f"A crear: {len(pendientes)}\n")
+
+    progreso = registro.Progreso(len(pendientes), etiqueta="dispositivos", log=log)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futuros = [executor.submit(crear, fila, inventario) for fila in pendientes]
+        for idx, futuro in enumerate(as_completed(futuros), start=1):
+            resultado = futuro.result()
+            resultados.append(resultado)
+            log.debug(f"[{idx}/{len(pendientes)}] {resultado['Dispositivo']} ({resultado['Host']}): {resultado['Estado']}",
+                      extra={"datos": {"host": resultado["Host"], "estado": resultado["Estado"], "objid": resultado["ObjID"]}})
+            progreso.avanzar()
+            if idx % 50 == 0:
+                inventario.guardar()
+
+    inventario.guardar()
+    progreso.terminar()
+
+    with perfil.etapa("write"), open(RESULTADOS_CSV, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CAMPOS_RESULTADO)
+        writer.writeheader()
+        writer.writerows(resultados)
+
+    conteo = {}
+    for r in resultados:
+        conteo[r["Estado"]] = conteo.get(r["Estado"], 0) + 1
+    print(f"\nResultados en {RESULTADOS_CSV}: " + " | ".join(f"{k}: {v}" for k, v in conteo.items()))
+    transferencia.reporte()
+
+
+if __name__ == "__main__":
+    with perfil.sesion():
+        main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import requests
+import time
+import urllib3
+from concurrent.futures import ThreadPoolExecutor
+from historicos_prtg import resumir_historico
+import perfil_prtg as perfil
+import transferencia_prtg as transferencia
+from salidas_prtg import ColaEscritura, crear_salidas
+import registro_prtg as registro
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+log = registro.obtener("federacion")
+
+# ==========================
+# CONFIGURACIÓN: UN PERFIL POR CORE PRTG
+# ==========================
+# max_rps: peticiones por segundo permitidas contra ese core.
+# grupos: IDs de grupos para el trabajo de disponibilidad en ese core.
+SERVIDORES = [
+    {"nombre": "Region1", "url": "https://prtg-region1.tu.dominio.com/api/", "username": "tu_user",
+     "passhash": "tupasshash", "max_rps": 5, "workers": 4, "grupos": ["1234"]},
+    {"nombre": "Region2", "url": "https://prtg-region2.tu.dominio.com/api/", "username": "tu_user",
+     "passhash": "tupasshash", "max_rps": 2, "workers": 2, "grupos": ["5678"]},
+]
+
+OUTPUT_PREFIX = "federacion_prtg"
+PAGE_SIZE = 500
+MAX_RETRIES = 3
+RETRY_DELAY = 5
+LATENCIA_MAX_MS = 50000
+
+TRABAJOS = ("inventario", "canales", "disponibilidad")
+SALIDAS = ("csv", "xlsx", "sqlite", "sql")
+
+
+# ==========================
+# SESIÓN CON LÍMITE DE TASA POR SERVIDOR
+# ==========================
+class SesionLimitada(requests.Session):
+    def __init__(self, limitador):
+        super().__init__()
+        self.verify = False
+        self.limitador = limitador
+
+    def request(self, *args, **kwargs):
+        self.limitador.esperar()
+        return super().request(*args, **kwargs)
+
+
+class ServidorPRTG:
+    def __init__(self, perfil):
+        self.nombre = perfil["nombre"]
+        self.url = perfil["url"]
+        self.credenciales = {"username": perfil["username"], "passhash": perfil["passhash"]}
+        self.workers = perfil.get("workers", 4)
+        self.grupos = [str(g) for g in perfil.get("grupos", [])]
+        self.session = SesionLimitada(transferencia.LimitadorTasa(perfil.get("max_rps", 5)))
+
+    def get_table(self, params):
+        params = dict(params, **self.credenciales)
+        for attempt in range(1, MAX_RETRIES + 1):
+            try:
+                r = self.session.get(self.url + "table.json", params=params, timeout=30,
+                                     headers=transferencia.CABECERAS)
+                r.raise_for_status()
+                transferencia.registrar(r)
+                return r.json()
+            except Exception as e:
+                log.warning(f"[{self.nombre}] Error (intento {attempt}/{MAX_RETRIES}): {e}", extra={"datos": {"servidor": self.nombre}})
+                if attempt < MAX_RETRIES:
+                    time.sleep(RETRY_DELAY)
+        return None
+
+    def paginar(self, content, columns, **filtros):
+        with perfil.etapa("inventario"):
+            return self._paginar(content, columns, **filtros)
+
+    def _paginar(self, content, columns, **filtros):
+        items = []
+        seen_ids = set()
+        start = 0
+        while True:
+            data = self.get_table(dict(filtros, content=content, columns=columns, count=PAGE_SIZE, start=start))
+            if not data or content not in data:
+                break
+
+            nuevos = [i for i in data[content] if i.get("objid") not in seen_ids]
+            for i in nuevos:
+                seen_ids.add(i.get("objid"))
+            items.extend(nuevos)
+
+            if len(data[content]) < PAGE_SIZE or not nuevos:
+                break
+            start += PAGE_SIZE
+        return items
+
+
+# ==========================
+# TRABAJOS
+# ==========================
+def trabajo_inventario(srv, pool, fechas):
+    devices = srv.paginar("devices", "objid,probe,group,device,host,status,sensorcount,downsens")
+    print(f"[{srv.nombre}] Inventario: {len(devices)} dispositivos")
+    return [{
+        "Servidor": srv.nombre,
+        "ObjID": d.get("objid", ""),
+        "Probe": d.get("probe", ""),
+        "Grupo": d.get("group", ""),
+        "Dispositivo": d.get("device", ""),
+        "IP / Host": d.get("host", ""),
+        "Estado": d.get("status", ""),
+        "Sensores Totales": d.get("sensorcount_raw", d.get("sensorcount", "")),
+        "Sensores en Down": d.get("downsens_raw", d.get("downsens", ""))
+    } for d in devices]
+
+
+def trabajo_canales(srv, pool, fechas):
+    sensors = srv.paginar("sensors", "objid,group,device,sensor,host")
+    print(f"[{srv.nombre}] Canales: {len(sensors)} sensores")
+
+    def canales_de(sensor):
+        with perfil.etapa("fetch", f"{srv.nombre}/{sensor['objid']}"):
+            data = srv.get_table({"content": "channels", "id": sensor["objid"], "columns": "name,lastvalue,unit"})
+        if not data or "channels" not in data:
+            return []
+        return [{
+            "Servidor": srv.nombre,
+            "Group": sensor.get("group"),
+            "Device": sensor.get("device"),
+            "Sensor": sensor.get("sensor"),
+            "Host": sensor.get("host"),
+            "SensorID": sensor.get("objid"),
+            "Channel": ch.get("name"),
+            "LastValue": ch.get("lastvalue_raw", ch.get("lastvalue")),
+            "Unit": ch.get("unit", "")
+        } for ch in data["channels"]]
+
+    filas = []
+    for resultado in pool.map(canales_de, sensors):
+        filas.extend(resultado)
+    return filas
+
+
+def trabajo_disponibilidad(srv, pool, fechas):
+    start_date, end_date = fechas
+    sdate_fmt = start_date.replace("/", "-") + "-00-00-00"
+    edate_fmt = end_date.replace("/", "-") + "-23-59-59"
+
+    sensors = []
+    for gid in srv.grupos:
+        encontrados = srv.paginar("sensors", "objid,group,device,sensor,status", id=gid)
+        sensors.extend(s for s in encontrados if "ping" in s.get("sensor", "").lower())
+    print(f"[{srv.nombre}] Disponibilidad: {len(sensors)} sensores Ping")
+
+    def disponibilidad_de(s):
+        params = dict(srv.credenciales, id=s["objid"], avg=3600, sdate=sdate_fmt, edate=edate_fmt)
+        stats = resumir_historico(srv.url + "historicdata.json", params, MAX_RETRIES, RETRY_DELAY,
+                                  latencia_max=LATENCIA_MAX_MS, session=srv.session) or {}
+        validas = stats.get("muestras_validas", 0)
+        return {
+            "Servidor": srv.nombre,
+            "Grupo": s.get("group"),
+            "Dispositivo": s.get("device"),
+            "Sensor": s.get("sensor"),
+            "SensorID": s.get("objid"),
+            "Disponibilidad": round(100 * stats["muestras_up"] / validas, 2) if validas else None,
+            "Promedio (ms)": stats.get("latencia_promedio"),
+            "Horas Up": stats.get("muestras_up", 0),
+            "Horas Down": stats.get("muestras_down", 0),
+            "Horas Omitidas (Warning/Paused/Unknown)": stats.get("muestras_omitidas", 0),
+            "Total Horas": stats.get("muestras_totales", 0),
+            "Fecha Inicio": start_date,
+            "Fecha Fin": end_date
+        }
+
+    return list(pool.map(disponibilidad_de, sensors))
+
+
+FUNCIONES_TRABAJO = {
+    "inventario": trabajo_inventario,
+    "canales": trabajo_canales,
+    "disponibilidad": trabajo_disponibilidad,
+}
+
+
+def ejecutar_servidor(srv, trabajos, fechas):
+    """Ejecuta los trabajos pedidos contra un core, con su propio pool de workers."""
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=srv.workers) as pool:
+        for trabajo in trabajos:
+            inicio = time.monotonic()
+            try:
+                resultados[trabajo] = FUNCIONES_TRABAJO[trabajo](srv, pool, fechas)
+            except Exception as e:
+                log.error(f"[{srv.nombre}] Error en trabajo {trabajo}: {e}", extra={"datos": {"servidor": srv.nombre}})
+                resultados[trabajo] = []
+            print(f"[{srv.nombre}] {trabajo}: {len(resultados[trabajo])} filas en {time.monotonic() - inicio:.1f}s")
+    return resultados
+
+
+# ==========================
+# SALIDAS COMBINADAS
+# ==========================
+def exportar_sql(filas):
+    # La configuración SQL vive en el script de carga a BD.
+    import pyodbc
+    from Insertar_datos_historicos_PRTG_en_BD_SQL import conectar_sql
+
+    conn = conectar_sql()
+    if not conn:
+        print("No se pudo conectar SQL.")
+        return
+
+    cursor = conn.cursor()
+    cursor.execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='Disponibilidad_Federada_PRTG' AND xtype='U')
+        BEGIN
+            CREATE TABLE Disponibilidad_Federada_PRTG (
+                ID INT IDENTITY(1,1) PRIMARY KEY,
+                Servidor NVARCHAR(100),
+                Grupo NVARCHAR(200),
+                Dispositivo NVARCHAR(255),
+                Sensor NVARCHAR(255),
+                SensorID INT NULL,
+                Disponibilidad DECIMAL(5,2) NULL,
+                Latencia_Promedio DECIMAL(10,2) NULL,
+                Horas_Up DECIMAL(10,2),
+                Horas_Down DECIMAL(10,2),
+                Horas_Omitidas DECIMAL(10,2),
+                Total_Horas DECIMAL(10,2),
+                Fecha_Inicio NVARCHAR(50),
+                Fecha_Fin NVARCHAR(50),
+                FechaRegistro DATETIME DEFAULT GETDATE(),
+                CONSTRAINT UQ_Servidor_SensorID_Period UNIQUE (Servidor, SensorID, Fecha_Inicio, Fecha_Fin)
+            )
+        END
+    """)
+    # Mismo tipo de horas que Disponibilidad_PRTG; las tablas anteriores las tenían como INT
+    for columna in ("Horas_Up", "Horas_Down", "Horas_Omitidas", "Total_Horas"):
+        cursor.execute(f"""
+            IF EXISTS (SELECT * FROM INFORMATION_SCHEMA.COLUMNS
+                       WHERE TABLE_NAME = 'Disponibilidad_Federada_PRTG' AND COLUMN_NAME = '{columna}'
+                       AND DATA_TYPE = 'int')
+                ALTER TABLE Disponibilidad_Federada_PRTG ALTER COLUMN {columna} DECIMAL(10,2) NULL
+        """)
+    conn.commit()
+
+    insertados = duplicados = 0
+    for fila in filas:
+        try:
+            cursor.execute("""
+                INSERT INTO Disponibilidad_Federada_PRTG
+                (Servidor, Grupo, Dispositivo, Sensor, SensorID, Disponibilidad, Latencia_Promedio,
+                 Horas_Up, Horas_Down, Horas_Omitidas, Total_Horas, Fecha_Inicio, Fecha_Fin)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, tuple(fila.values()))
+            conn.commit()
+            insertados += 1
+        except pyodbc.IntegrityError:
+            conn.rollback()
+            duplicados += 1
+
+    conn.close()
+    print(f"SQL: {insertados} insertados, {duplicados} duplicados en Disponibilidad_Federada_PRTG")
+
+
+# ==========================
+# MAIN
+# ==========================
+def leer_opciones(texto, validas):
+    elegidas = [t.strip().lower() for t in texto.split(",") if t.strip()]
+    return [t for t in validas if t in elegidas]
+
+
+def main():
+    print("\n=== FEDERACIÓN PRTG — Varios cores en paralelo ===\n")
+    print("Servidores: " + ", ".join(p["nombre"] for p in SERVIDORES))
+
+    trabajos = leer_opciones(input(f"Trabajos ({','.join(TRABAJOS)}): "), TRABAJOS)
+    salidas = leer_opciones(input(f"Salidas ({','.join(SALIDAS)}): "), SALIDAS)
+    if not trabajos or not salidas:
+        print("Debe elegir al menos un trabajo y una salida.")
+        return
+
+    fechas = None
+    if "disponibilidad" in trabajos:
+        fechas = (input("Fecha inicio: ").strip(), input("Fecha fin: ").strip())
+
+    servidores = [ServidorPRTG(p) for p in SERVIDORES]
+
+    inicio = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(servidores)) as executor:
+        por_servidor = list(executor.map(lambda srv: ejecutar_servidor(srv, trabajos, fechas), servidores))
+
+    combinados = {t: [fila for r in por_servidor for fila in r.get(t, [])] for t in trabajos}
+    print(f"\nConsultas completadas en {time.monotonic() - inicio:.1f}s")
+
+    # csv, xlsx y sqlite: un archivo / hoja / tabla por trabajo, escritos en segundo plano
+    genericas = [s for s in salidas if s != "sql"]
+    if genericas:
+        cola = ColaEscritura(crear_salidas(genericas, OUTPUT_PREFIX, "federacion"))
+        cola.iniciar()
+        for trabajo, filas in combinados.items():
+            cola.enviar(filas, tabla=trabajo)
+
+    with perfil.etapa("write"):
+        if "sql" in salidas:
+            if combinados.get("disponibilidad"):
+                exportar_sql(combinados["disponibilidad"])
+            else:
+                print("SQL: solo se exporta el trabajo de disponibilidad.")
+
+    if genericas:
+        cola.cerrar()
+        print(f"Generado: {', '.join(genericas)} ({OUTPUT_PREFIX})")
+
+    transferencia.reporte()
+    print("\n=== PROCESO FINALIZADO ===")
+
+
+if __name__ == "__main__":
+    with perfil.sesion():
+        main()
@@ -1,416 +1,1040 @@
-import requests
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-
-import requests
-import csv
-import time
-import re
-import pyodbc
-from urllib3.exceptions import InsecureRequestWarning
-from datetime import datetime
-
-# ==========================
-# Configuracion y conexion con api de PRTG
-# ==========================
-requests.packages.urllib3.disable_warnings(category=InsecureRequestWarning)
-
-PRTG_URL = "https://TU.URL.com/api/"
-USERNAME = "tu_user"
-PASSHASH = "tupasshash"
-
-OUTPUT_FILE = "disponibilidad_ping.csv"
-
-SQL_SERVER = r"tuservidor\SQLEXPRESS"
-SQL_DATABASE = "tu_base_de_datos"
-SQL_USERNAME = "tu_usuario_de_SQL"
-SQL_PASSWORD = "tu_contraseña_de_SQL"
-USE_WINDOWS_AUTH = False
-
-REQUEST_DELAY = 1.0
-GET_MAX_RETRIES = 3
-GET_RETRY_DELAY = 5
-
-
-# ==========================
-# Reintentos de conexion en caso de lentitud en la red
-# ==========================
-def get_data_with_retry(url, params=None, max_retries=3, timeout=30):
-    for attempt in range(1, max_retries + 1):
-        try:
-            r = requests.get(url, params=params, timeout=timeout, verify=False)
-            r.raise_for_status()
-            return r
-        except Exception as e:
-            print(f"    ⚠ Error al consultar {url} (intento {attempt}/{max_retries}): {e}")
-            if attempt < max_retries:
-                time.sleep(GET_RETRY_DELAY)
-    return None
-
-
-# ==========================
-# PRTG: sensores y históricos
-# ==========================
-def get_sensors_by_group(group_id):
-    print(f"\nBuscando sensores Ping en el grupo {group_id}...")
-    url = f"{PRTG_URL}table.json"
-    params = {
-        "content": "sensors",
-        "columns": "objid,group,device,sensor,status,message,host",
-        "id": group_id,
-        "username": USERNAME,
-        "passhash": PASSHASH
-    }
-
-    r = get_data_with_retry(url, params=params, max_retries=GET_MAX_RETRIES, timeout=20)
-    if not r:
-        print(f"No se pudo obtener información del grupo {group_id}")
-        return []
-
-    data = r.json()
-    sensors = data.get("sensors", [])
-
-    sensores_ping = [s for s in sensors if "sensor" in s and "ping" in s["sensor"].lower()]
-    print(f"{len(sensores_ping)} sensores Ping encontrados en grupo {group_id}")
-    return sensores_ping
-
-
-def get_historic_data(sensor_id, start_date, end_date):
-
-    try:
-        if "-" in start_date and len(start_date.split("-")) > 3:
-            sdate_fmt = start_date
-            edate_fmt = end_date
-        else:
-            sdate_fmt = start_date.replace("/", "-") + "-00-00-00"
-            edate_fmt = end_date.replace("/", "-") + "-23-59-59"
-    except:
-        print("Formato de fecha inválido")
-        return None, {}
-
-    url = f"{PRTG_URL}historicdata.json"
-    params = {
-        "id": sensor_id,
-        "avg": 3600,
-        "sdate": sdate_fmt,
-        "edate": edate_fmt,
-        "username": USERNAME,
-        "passhash": PASSHASH
-    }
-
-    print(f"\nConsultando históricos de sensor {sensor_id}")
-    print(f"        Rango: {sdate_fmt} → {edate_fmt}")
-
-    response = None
-    for attempt in range(1, GET_MAX_RETRIES + 1):
-        try:
-            resp = requests.get(url, params=params, timeout=60, verify=False)
-            resp.raise_for_status()
-            response = resp
-            break
-        except Exception as e:
-            print(f"Error al consultar (intento {attempt}/{GET_MAX_RETRIES}): {e}")
-            if attempt < GET_MAX_RETRIES:
-                time.sleep(GET_RETRY_DELAY)
-
-    if not response:
-        print("    ⚠ Sin respuesta del servidor.")
-        return None, {}
-
-    data = response.json()
-    hist = data.get("histdata", [])
-    if not hist:
-        print("    ⚠ Sensor sin datos históricos en ese rango.")
-        return None, {}
-
-    json_text = response.text
-
-    uptime_values = []
-    muestras_validas = 0
-    muestras_omitidas = 0
-    muestras_up = 0
-    muestras_down = 0
-    muestras_totales = len(hist)
-
-    for i, point in enumerate(hist):
-
-        if point.get("coverage_raw", 0) < 10000:
-            muestras_omitidas += 1
-            continue
-
-        dt = point.get("datetime")
-        if not dt:
-            muestras_omitidas += 1
-            continue
-
-        start_idx = json_text.find(f'"{dt}"')
-        if start_idx == -1:
-            muestras_omitidas += 1
-            continue
-
-        if i < len(hist) - 1:
-            next_dt = hist[i+1].get("datetime", "")
-            end_idx = json_text.find(f'"{next_dt}"', start_idx)
-            if end_idx == -1:
-                end_idx = len(json_text)
-        else:
-            end_idx = len(json_text)
-
-        record_text = json_text[start_idx:end_idx]
-
-        value_raw_matches = re.findall(r'"value_raw"\s*:\s*(".*?"|[0-9]+\.?[0-9]*)', record_text)
-
-        latencia_raw = value_raw_matches[:4]
-
-        tiene_latency = False
-        for tok in latencia_raw:
-            tok_clean = tok.strip().strip('"')
-            if tok_clean == "":
-                continue
-            try:
-                float(tok_clean)
-                tiene_latency = True
-                break
-            except:
-                continue
-
-        if tiene_latency:
-            uptime_values.append(100)
-            muestras_up += 1
-            muestras_validas += 1
-        else:
-            uptime_values.append(0)
-            muestras_down += 1
-            muestras_validas += 1
-
-    estadisticas = {
-        "muestras_totales": muestras_totales,
-        "muestras_validas": muestras_validas,
-        "muestras_up": muestras_up,
-        "muestras_down": muestras_down,
-        "muestras_omitidas": muestras_omitidas
-    }
-
-    if uptime_values:
-        avg = sum(uptime_values) / len(uptime_values)
-        return round(avg, 2), estadisticas
-    else:
-        return None, estadisticas
-
-
-# ==========================
-# Gestion de la BD SQL
-# ==========================
-def conectar_sql():
-    print("\nIntentando conectar a SQL Server...")
-    try:
-        if USE_WINDOWS_AUTH:
-            conn_str = (
-                f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                f"SERVER={SQL_SERVER};"
-                f"DATABASE={SQL_DATABASE};"
-                f"Trusted_Connection=yes;"
-            )
-        else:
-            conn_str = (
-                f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                f"SERVER={SQL_SERVER};"
-                f"DATABASE={SQL_DATABASE};"
-                f"UID={SQL_USERNAME};"
-                f"PWD={SQL_PASSWORD};"
-            )
-        conn = pyodbc.connect(conn_str, autocommit=False, timeout=10)
-        print("Conexión SQL OK")
-        return conn
-    except Exception as e:
-        print(f"Error conectando a SQL Server: {e}")
-        return None
-
-
-def crear_tabla_si_no_existe(conn):
-    cursor = conn.cursor()
-    cursor.execute("""
-        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='Disponibilidad_PRTG' AND xtype='U')
-        BEGIN
-            CREATE TABLE Disponibilidad_PRTG (
-                ID INT IDENTITY(1,1) PRIMARY KEY,
-                Grupo NVARCHAR(200),
-                Dispositivo NVARCHAR(255),
-                Sensor NVARCHAR(255),
-                SensorID INT NULL,
-                Disponibilidad DECIMAL(5,2) NULL,
-                Horas_Up INT,
-                Horas_Down INT,
-                Horas_Omitidas INT,
-                Total_Horas INT,
-                Fecha_Inicio NVARCHAR(50),
-                Fecha_Fin NVARCHAR(50),
-                FechaRegistro DATETIME DEFAULT GETDATE(),
-                CONSTRAINT UQ_SensorID_Period UNIQUE (SensorID, Fecha_Inicio, Fecha_Fin)
-            )
-        END
-    """)
-    conn.commit()
-    print("✔ Tabla SQL verificada / creada")
-
-
-# ==========================
-# VALIDACIÓN DE RANGOS EN BD
-# ==========================
-def existe_rango_en_bd(conn, sensor_id, fecha_inicio, fecha_fin):
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT COUNT(*)
-        FROM Disponibilidad_PRTG
-        WHERE SensorID = ?
-          AND (
-                Fecha_Inicio <= ?
-            AND Fecha_Fin >= ?
-          )
-    """, (sensor_id, fecha_fin, fecha_inicio))
-
-    count = cursor.fetchone()[0]
-    return count > 0
-
-
-# ==========================
-# Insertar datos
-# ==========================
-def insertar_resumen(conn, fila):
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-            INSERT INTO Disponibilidad_PRTG
-            (Grupo, Dispositivo, Sensor, SensorID, Disponibilidad, Horas_Up, Horas_Down,
-             Horas_Omitidas, Total_Horas, Fecha_Inicio, Fecha_Fin)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            fila.get("Grupo"),
-            fila.get("Dispositivo"),
-            fila.get("Sensor"),
-            fila.get("SensorID"),
-            fila.get("Disponibilidad"),
-            fila.get("Horas Up", 0),
-            fila.get("Horas Down", 0),
-            fila.get("Horas Omitidas (Warning/Paused/Unknown)", 0),
-            fila.get("Total Horas", 0),
-            fila.get("Fecha Inicio"),
-            fila.get("Fecha Fin")
-        ))
-        conn.commit()
-        return "insertado"
-    except pyodbc.IntegrityError:
-        return "duplicado"
-    except Exception as e:
-        print(f"Error SQL al insertar: {e}")
-        return "error"
-
-
-# ==========================
-# MAIN
-# ==========================
-def main():
-
-    print("\n=== DISPONIBILIDAD PRTG — Basado SOLO en latencia (value_raw) ===\n")
-
-    grupos_input = input("Ingrese los ID de los grupos separados por coma: ")
-    grupos = [g.strip() for g in grupos_input.split(",") if g.strip().isdigit()]
-    if not grupos:
-        print("No ingresó grupos válidos.")
-        return
-
-    start_date = input("Fecha inicio: ").strip()
-    end_date = input("Fecha fin: ").strip()
-
-    test_url = f"{PRTG_URL}table.json"
-    params = {"content": "sensors", "columns": "objid", "id": grupos[0], "username": USERNAME, "passhash": PASSHASH}
-    if not get_data_with_retry(test_url, params=params, max_retries=2, timeout=10):
-        print("Error conectando a PRTG.")
-        return
-    print("✔ Conexión a PRTG verificada")
-
-    conn = conectar_sql()
-    if not conn:
-        print("No se pudo conectar SQL.")
-        return
-
-    crear_tabla_si_no_existe(conn)
-
-    print("\nConsultando sensores Ping...\n")
-    todos_sensores = []
-    for gid in grupos:
-        todos_sensores.extend(get_sensors_by_group(gid))
-
-    print(f"✔ Total sensores Ping: {len(todos_sensores)}\n")
-
-    resultados = []
-    total_insertados = 0
-    total_duplicados = 0
-
-    for idx, s in enumerate(todos_sensores, start=1):
-        sid = s.get("objid")
-        estado = s.get("status")
-        print(f"\n[{idx}/{len(todos_sensores)}] Sensor ID {sid} — {s.get('device')} / {s.get('sensor')} — Estado actual: {estado}")
-
-        # ===============================================================
-        # VALIDAR SI EL RANGO YA EXISTE EN LA BD (EVITA DATOS DUPLICADOS)
-        # ===============================================================
-        if existe_rango_en_bd(conn, sid, start_date, end_date):
-            print("⚠ Omitido: Ya existe información de este sensor en un rango de fechas que se cruza")
-            total_duplicados += 1
-            continue
-
-        disponibilidad, stats = get_historic_data(sid, start_date, end_date)
-
-        print(f"    Disponibilidad calculada: {disponibilidad}%")
-        print(f"    Horas UP: {stats.get('muestras_up')} | DOWN: {stats.get('muestras_down')} | Omitidas: {stats.get('muestras_omitidas')} | Total: {stats.get('muestras_totales')}")
-
-        fila = {
-            "Grupo": s.get("group"),
-            "Dispositivo": s.get("device"),
-            "Sensor": s.get("sensor"),
-            "SensorID": sid,
-            "Disponibilidad": disponibilidad,
-            "Horas Up": stats.get("muestras_up", 0),
-            "Horas Down": stats.get("muestras_down", 0),
-            "Horas Omitidas (Warning/Paused/Unknown)": stats.get("muestras_omitidas", 0),
-            "Total Horas": stats.get("muestras_totales", 0),
-            "Fecha Inicio": start_date,
-            "Fecha Fin": end_date
-        }
-
-        resultado = insertar_resumen(conn, fila)
-
-        if resultado == "insertado":
-            print("Insertado en SQL")
-            total_insertados += 1
-        elif resultado == "duplicado":
-            print("Omitido (registro duplicado exacto)")
-            total_duplicados += 1
-        else:
-            print("Error insertando en SQL")
-
-        resultados.append(fila)
-
-        time.sleep(REQUEST_DELAY)
-
-    try:
-        with open(OUTPUT_FILE, "w", newline="", encoding="utf-8") as f:
-            fieldnames = list(resultados[0].keys())
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(resultados)
-
-        print(f"\n✔ CSV generado: {OUTPUT_FILE}")
-    except:
-        print(f"\nNo se pudo generar el CSV")
-
-    print(f"\n=== PROCESO COMPLETADO ===")
-    print(f"Insertados: {total_insertados}")
-    print(f"Duplicados: {total_duplicados}")
-
-    conn.close()
-
-
-if __name__ == "__main__":
-    main()
+import requests
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import requests
+import time
+import queue
+import threading
+try:
+    import pyodbc
+except ImportError:   # Solo hace falta con "sql" en SALIDAS
+    pyodbc = None
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib3.exceptions import InsecureRequestWarning
+from datetime import datetime
+from historicos_prtg import resumir_historico, sensores_unicos, repartir_resultados, SketchLatencia, cortes_a_intervalos, latencias_prtg, combinar_sketches
+import perfil_prtg as perfil
+import transferencia_prtg as transferencia
+from almacen_prtg import resumir_con_almacen, ALMACEN_DIR
+from salidas_prtg import ColaEscritura, crear_salidas
+from mantenimiento_prtg import cargar_mantenimientos, grupos_por_sensor, rango_fechas
+import registro_prtg as registro
+from arbol_prtg import descargar_arbol, sensores_de_dispositivos
+from canales_prtg import EvaluadorCanales, tipo_de_sensor, CANALES_ARCHIVO
+from periodos_prtg import leer_periodos, union, rangos_ole, tramos, por_tramos
+
+# ==========================
+# Configuracion y conexion con api de PRTG
+# ==========================
+requests.packages.urllib3.disable_warnings(category=InsecureRequestWarning)
+log = registro.obtener("disponibilidad_sql")
+
+PRTG_URL = "https://TU.URL.com/api/"
+USERNAME = "tu_user"
+PASSHASH = "tupasshash"
+
+OUTPUT_FILE = "disponibilidad_ping.csv"
+# Cada sensor se descarga y calcula una vez y el resultado va a todas las salidas elegidas:
+# sql (Disponibilidad_PRTG, rollups, cortes y percentiles en SQL Server), csv, xlsx, sqlite
+# (estas tres con el mismo nombre base que OUTPUT_FILE, más su tabla de percentiles)
+SALIDAS = ["sql", "csv"]
+
+SQL_SERVER = r"tuservidor\SQLEXPRESS"
+SQL_DATABASE = "tu_base_de_datos"
+SQL_USERNAME = "tu_usuario_de_SQL"
+SQL_PASSWORD = "tu_contraseña_de_SQL"
+USE_WINDOWS_AUTH = False
+
+REQUEST_DELAY = 1.0
+GET_MAX_RETRIES = 3
+GET_RETRY_DELAY = 5
+LATENCIA_MAX_MS = None     # Con un valor (p. ej. 50000), latencias fuera de [0, valor) ms no cuentan como up
+
+PRTG_WORKERS = 4           # Consultas de históricos en paralelo
+SQL_WRITERS = 4            # Workers escritores, cada uno con su propia conexión
+SQL_BATCH_SIZE = 50        # Filas por transacción de cada worker
+SQL_RECONNECT_RETRIES = 3
+
+USAR_ALMACEN_LOCAL = True  # Reutiliza históricos ya descargados (carpeta almacen_prtg)
+RESOLUCION = 3600          # avg de historicdata: 3600 (promedio por hora) o 0 (cada escaneo, ponderado por su intervalo)
+TIPOS_SENSOR = ["ping"]    # Tipos evaluados (ping, http, port, snmp): ver MAPAS_CANALES en canales_prtg.py
+USAR_ARBOL = True          # Grupos por ID o por nombre (admite *) sobre el árbol descargado de PRTG
+MULTIPERIODO = False       # Pide varios períodos (2024-01, 2024-T1, ytd...): una descarga, una fila por período
+
+
+# ==========================
+# Reintentos de conexion en caso de lentitud en la red
+# ==========================
+def get_data_with_retry(url, params=None, max_retries=3, timeout=30):
+    for attempt in range(1, max_retries + 1):
+        try:
+            r = requests.get(url, params=params, timeout=timeout, verify=False, headers=transferencia.CABECERAS)
+            r.raise_for_status()
+            return transferencia.registrar(r)
+        except Exception as e:
+            log.warning(f"Error al consultar {url} (intento {attempt}/{max_retries}): {e}")
+            if attempt < max_retries:
+                time.sleep(GET_RETRY_DELAY)
+    return None
+
+
+# ==========================
+# PRTG: sensores y históricos
+# ==========================
+def get_sensors_by_group(group_id):
+    print(f"\nBuscando sensores ({', '.join(TIPOS_SENSOR)}) en el grupo {group_id}...")
+    url = f"{PRTG_URL}table.json"
+    params = {
+        "content": "sensors",
+        "columns": "objid,parentid,group,device,sensor,status,host,type",
+        "id": group_id,
+        "username": USERNAME,
+        "passhash": PASSHASH
+    }
+
+    r = get_data_with_retry(url, params=params, max_retries=GET_MAX_RETRIES, timeout=20)
+    if not r:
+        print(f"No se pudo obtener información del grupo {group_id}")
+        return []
+
+    data = r.json()
+    sensors = data.get("sensors", [])
+
+    sensores_tipo = [s for s in sensors if tipo_de_sensor(s, TIPOS_SENSOR)]
+    print(f"{len(sensores_tipo)} sensores encontrados en grupo {group_id}")
+    return sensores_tipo
+
+
+def consultar_tabla(params):
+    """table.json con credenciales y reintentos; devuelve el JSON o None (lo usa arbol_prtg)."""
+    params = dict(params, username=USERNAME, passhash=PASSHASH)
+    r = get_data_with_retry(f"{PRTG_URL}table.json", params=params, max_retries=GET_MAX_RETRIES, timeout=30)
+    return r.json() if r else None
+
+
+def get_sensors_by_devices(dispositivos):
+    """Sensores de TIPOS_SENSOR de los dispositivos elegidos en el árbol, en tandas de filter_parentid."""
+    sensores = sensores_de_dispositivos(consultar_tabla, dispositivos,
+                                        "objid,parentid,group,device,sensor,status,host,type")
+    sensores_tipo = [s for s in sensores if tipo_de_sensor(s, TIPOS_SENSOR)]
+    print(f"{len(sensores_tipo)} sensores encontrados en {len(dispositivos)} dispositivos")
+    return sensores_tipo
+
+
+def get_historic_data(sensor_id, start_date, end_date, mantenimiento=None, canales=None, periodos=None):
+
+    try:
+        if "-" in start_date and len(start_date.split("-")) > 3:
+            sdate_fmt = start_date
+            edate_fmt = end_date
+        else:
+            sdate_fmt = start_date.replace("/", "-") + "-00-00-00"
+            edate_fmt = end_date.replace("/", "-") + "-23-59-59"
+    except:
+        print("Formato de fecha inválido")
+        return None, {}
+
+    url = f"{PRTG_URL}historicdata.json"
+    params = {
+        "id": sensor_id,
+        "avg": RESOLUCION,
+        "sdate": sdate_fmt,
+        "edate": edate_fmt,
+        "username": USERNAME,
+        "passhash": PASSHASH
+    }
+
+    log.debug(f"Consultando históricos de sensor {sensor_id} | Rango: {sdate_fmt} → {edate_fmt}",
+              extra={"datos": {"sensor": sensor_id, "desde": sdate_fmt, "hasta": edate_fmt}})
+
+    if USAR_ALMACEN_LOCAL:
+        estadisticas = resumir_con_almacen(url, params, GET_MAX_RETRIES, GET_RETRY_DELAY, latencia_max=LATENCIA_MAX_MS,
+                                           mantenimiento=mantenimiento, canales=canales, periodos=periodos)
+    else:
+        estadisticas = resumir_historico(url, params, GET_MAX_RETRIES, GET_RETRY_DELAY, latencia_max=LATENCIA_MAX_MS,
+                                         mantenimiento=mantenimiento, canales=canales, periodos=periodos)
+    if estadisticas is None:
+        log.warning(f"Sensor {sensor_id}: sin respuesta del servidor.", extra={"datos": {"sensor": sensor_id}})
+        return [(None, {})] * len(periodos) if periodos is not None else (None, {})
+
+    # Con periodos, una lista con un resultado por período de la misma descarga
+    if periodos is not None:
+        return [resultado_de(sensor_id, e) for e in estadisticas]
+    return resultado_de(sensor_id, estadisticas)
+
+
+def resultado_de(sensor_id, estadisticas):
+    """(disponibilidad, estadísticas) de un resumen."""
+    if not estadisticas["muestras_totales"]:
+        log.warning(f"Sensor {sensor_id}: sin datos históricos en ese rango.", extra={"datos": {"sensor": sensor_id}})
+        return None, {}
+
+    return estadisticas["disponibilidad"], estadisticas
+
+
+# ==========================
+# Gestion de la BD SQL
+# ==========================
+def conectar_sql():
+    print("\nIntentando conectar a SQL Server...")
+    try:
+        if USE_WINDOWS_AUTH:
+            conn_str = (
+                f"DRIVER={{ODBC Driver 17 for SQL Server}};"
+                f"SERVER={SQL_SERVER};"
+                f"DATABASE={SQL_DATABASE};"
+                f"Trusted_Connection=yes;"
+            )
+        else:
+            conn_str = (
+                f"DRIVER={{ODBC Driver 17 for SQL Server}};"
+                f"SERVER={SQL_SERVER};"
+                f"DATABASE={SQL_DATABASE};"
+                f"UID={SQL_USERNAME};"
+                f"PWD={SQL_PASSWORD};"
+            )
+        conn = pyodbc.connect(conn_str, autocommit=False, timeout=10)
+        print("Conexión SQL OK")
+        return conn
+    except Exception as e:
+        print(f"Error conectando a SQL Server: {e}")
+        return None
+
+
+def crear_tabla_si_no_existe(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='Disponibilidad_PRTG' AND xtype='U')
+        BEGIN
+            CREATE TABLE Disponibilidad_PRTG (
+                ID INT IDENTITY(1,1) PRIMARY KEY,
+                Grupo NVARCHAR(200),
+                Dispositivo NVARCHAR(255),
+                Sensor NVARCHAR(255),
+                SensorID INT NULL,
+                Disponibilidad DECIMAL(5,2) NULL,
+                Horas_Up DECIMAL(10,2),
+                Horas_Down DECIMAL(10,2),
+                Horas_Omitidas DECIMAL(10,2),
+                Total_Horas DECIMAL(10,2),
+                Fecha_Inicio NVARCHAR(50),
+                Fecha_Fin NVARCHAR(50),
+                FechaRegistro DATETIME DEFAULT GETDATE(),
+                CONSTRAINT UQ_SensorID_Period UNIQUE (SensorID, Fecha_Inicio, Fecha_Fin)
+            )
+        END
+    """)
+    # Columnas agregadas después de la primera versión de la tabla
+    cursor.execute("""
+        IF COL_LENGTH('Disponibilidad_PRTG', 'Latencia_P50') IS NULL
+            ALTER TABLE Disponibilidad_PRTG ADD
+                Latencia_P50 DECIMAL(10,2) NULL,
+                Latencia_P95 DECIMAL(10,2) NULL,
+                Latencia_P99 DECIMAL(10,2) NULL
+    """)
+    cursor.execute("""
+        IF COL_LENGTH('Disponibilidad_PRTG', 'Horas_Mantenimiento') IS NULL
+            ALTER TABLE Disponibilidad_PRTG ADD Horas_Mantenimiento DECIMAL(10,2) NULL
+    """)
+    # Con datos crudos las horas traen fracción: las tablas anteriores las tenían como INT
+    for columna in ("Horas_Up", "Horas_Down", "Horas_Omitidas", "Total_Horas", "Horas_Mantenimiento"):
+        cursor.execute(f"""
+            IF EXISTS (SELECT * FROM INFORMATION_SCHEMA.COLUMNS
+                       WHERE TABLE_NAME = 'Disponibilidad_PRTG' AND COLUMN_NAME = '{columna}' AND DATA_TYPE = 'int')
+                ALTER TABLE Disponibilidad_PRTG ALTER COLUMN {columna} DECIMAL(10,2) NULL
+        """)
+    cursor.execute("""
+        IF COL_LENGTH('Disponibilidad_PRTG', 'Latencia_Promedio') IS NULL
+            ALTER TABLE Disponibilidad_PRTG ADD Latencia_Promedio DECIMAL(10,2) NULL
+    """)
+    cursor.execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='Cortes_PRTG' AND xtype='U')
+        BEGIN
+            CREATE TABLE Cortes_PRTG (
+                SensorID INT NOT NULL,
+                Inicio DATETIME NOT NULL,
+                Fin DATETIME NOT NULL,
+                Duracion_Minutos INT NOT NULL,
+                Muestras INT NOT NULL,
+                Fecha_Inicio NVARCHAR(50) NOT NULL,
+                Fecha_Fin NVARCHAR(50) NOT NULL,
+                CONSTRAINT PK_Cortes_PRTG PRIMARY KEY (SensorID, Inicio, Fecha_Inicio, Fecha_Fin)
+            )
+        END
+    """)
+    # Con MULTIPERIODO un mismo corte se guarda una vez por cada período que lo contiene:
+    # las tablas anteriores tenían la clave solo por (SensorID, Inicio)
+    cursor.execute("""
+        IF NOT EXISTS (
+            SELECT * FROM sys.index_columns ic
+            JOIN sys.indexes i ON i.object_id = ic.object_id AND i.index_id = ic.index_id
+            WHERE i.name = 'PK_Cortes_PRTG' AND COL_NAME(ic.object_id, ic.column_id) = 'Fecha_Inicio'
+        )
+        EXEC('UPDATE Cortes_PRTG SET Fecha_Inicio = ISNULL(Fecha_Inicio, ''''), Fecha_Fin = ISNULL(Fecha_Fin, '''');
+              ALTER TABLE Cortes_PRTG DROP CONSTRAINT PK_Cortes_PRTG;
+              ALTER TABLE Cortes_PRTG ALTER COLUMN Fecha_Inicio NVARCHAR(50) NOT NULL;
+              ALTER TABLE Cortes_PRTG ALTER COLUMN Fecha_Fin NVARCHAR(50) NOT NULL;
+              ALTER TABLE Cortes_PRTG ADD CONSTRAINT PK_Cortes_PRTG PRIMARY KEY (SensorID, Inicio, Fecha_Inicio, Fecha_Fin);')
+    """)
+    cursor.execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='Percentiles_Latencia_PRTG' AND xtype='U')
+        BEGIN
+            CREATE TABLE Percentiles_Latencia_PRTG (
+                Nivel NVARCHAR(20) NOT NULL,
+                Clave NVARCHAR(255) NOT NULL,
+                Fecha_Inicio NVARCHAR(50) NOT NULL,
+                Fecha_Fin NVARCHAR(50) NOT NULL,
+                Sensores INT,
+                Muestras INT,
+                Latencia_P50 DECIMAL(10,2) NULL,
+                Latencia_P95 DECIMAL(10,2) NULL,
+                Latencia_P99 DECIMAL(10,2) NULL,
+                Sketch NVARCHAR(MAX),
+                FechaActualizacion DATETIME DEFAULT GETDATE(),
+                CONSTRAINT PK_Percentiles_Latencia PRIMARY KEY (Nivel, Clave, Fecha_Inicio, Fecha_Fin)
+            )
+        END
+    """)
+    # Sensores ya combinados en cada sketch, para no sumarlos dos veces
+    cursor.execute("""
+        IF COL_LENGTH('Percentiles_Latencia_PRTG', 'SensorIDs') IS NULL
+            ALTER TABLE Percentiles_Latencia_PRTG ADD SensorIDs NVARCHAR(MAX) NULL
+    """)
+    for tabla, columna_fecha in TABLAS_ROLLUP.values():
+        cursor.execute(f"""
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='{tabla}' AND xtype='U')
+            BEGIN
+                CREATE TABLE {tabla} (
+                    Nivel NVARCHAR(20) NOT NULL,
+                    Clave NVARCHAR(255) NOT NULL,
+                    {columna_fecha} DATE NOT NULL,
+                    Grupo NVARCHAR(200),
+                    Dispositivo NVARCHAR(255) NULL,
+                    Sensor NVARCHAR(255) NULL,
+                    Horas_Up DECIMAL(12,2) NOT NULL DEFAULT 0,
+                    Horas_Down DECIMAL(12,2) NOT NULL DEFAULT 0,
+                    Horas_Omitidas DECIMAL(12,2) NOT NULL DEFAULT 0,
+                    Latencia_Suma FLOAT NOT NULL DEFAULT 0,
+                    Latencia_Muestras INT NOT NULL DEFAULT 0,
+                    Segundos_Up BIGINT NOT NULL DEFAULT 0,
+                    Segundos_Down BIGINT NOT NULL DEFAULT 0,
+                    Disponibilidad AS CAST(100.0 * Segundos_Up / NULLIF(Segundos_Up + Segundos_Down, 0) AS DECIMAL(5,2)),
+                    Latencia_Promedio AS CAST(Latencia_Suma / NULLIF(Latencia_Muestras, 0) AS DECIMAL(10,2)),
+                    FechaActualizacion DATETIME DEFAULT GETDATE(),
+                    CONSTRAINT PK_{tabla} PRIMARY KEY (Nivel, Clave, {columna_fecha})
+                )
+            END
+        """)
+        # Tablas anteriores a los datos crudos: la disponibilidad pasa a calcularse en segundos
+        cursor.execute(f"""
+            IF COL_LENGTH('{tabla}', 'Segundos_Up') IS NULL
+            BEGIN
+                ALTER TABLE {tabla} ADD
+                    Segundos_Up BIGINT NOT NULL DEFAULT 0,
+                    Segundos_Down BIGINT NOT NULL DEFAULT 0;
+                EXEC('UPDATE {tabla} SET Segundos_Up = Horas_Up * 3600, Segundos_Down = Horas_Down * 3600;
+                      ALTER TABLE {tabla} DROP COLUMN Disponibilidad;
+                      ALTER TABLE {tabla} ADD Disponibilidad AS
+                          CAST(100.0 * Segundos_Up / NULLIF(Segundos_Up + Segundos_Down, 0) AS DECIMAL(5,2));')
+            END
+        """)
+        # Horas INT de tablas anteriores: su DEFAULT impide cambiar el tipo, se quita y se vuelve a crear
+        for columna in ("Horas_Up", "Horas_Down", "Horas_Omitidas"):
+            cursor.execute(f"""
+                IF EXISTS (SELECT * FROM INFORMATION_SCHEMA.COLUMNS
+                           WHERE TABLE_NAME = '{tabla}' AND COLUMN_NAME = '{columna}' AND DATA_TYPE = 'int')
+                BEGIN
+                    DECLARE @restriccion NVARCHAR(300) = (
+                        SELECT QUOTENAME(dc.name) FROM sys.default_constraints dc
+                        JOIN sys.columns c ON c.object_id = dc.parent_object_id AND c.column_id = dc.parent_column_id
+                        WHERE dc.parent_object_id = OBJECT_ID('{tabla}') AND c.name = '{columna}');
+                    IF @restriccion IS NOT NULL
+                        EXEC('ALTER TABLE {tabla} DROP CONSTRAINT ' + @restriccion);
+                    ALTER TABLE {tabla} ALTER COLUMN {columna} DECIMAL(12,2) NOT NULL;
+                    ALTER TABLE {tabla} ADD DEFAULT 0 FOR {columna};
+                END
+            """)
+    conn.commit()
+    print("✔ Tablas SQL verificadas / creadas")
+
+
+# ==========================
+# VALIDACIÓN DE RANGOS EN BD
+# ==========================
+def sensores_con_rango_en_bd(conn, fecha_inicio, fecha_fin):
+    """Devuelve los SensorID que ya tienen un rango que se cruza con el pedido (una sola consulta)."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT DISTINCT SensorID
+        FROM Disponibilidad_PRTG
+        WHERE Fecha_Inicio <= ?
+          AND Fecha_Fin >= ?
+    """, (fecha_fin, fecha_inicio))
+
+    return {row[0] for row in cursor.fetchall()}
+
+
+# ==========================
+# Insertar datos
+# ==========================
+INSERT_RESUMEN_SQL = """
+    INSERT INTO Disponibilidad_PRTG
+    (Grupo, Dispositivo, Sensor, SensorID, Disponibilidad, Horas_Up, Horas_Down,
+     Horas_Omitidas, Total_Horas, Fecha_Inicio, Fecha_Fin, Latencia_P50, Latencia_P95, Latencia_P99,
+     Horas_Mantenimiento, Latencia_Promedio)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def parametros_resumen(fila):
+    return (
+        fila.get("Grupo"),
+        fila.get("Dispositivo"),
+        fila.get("Sensor"),
+        fila.get("SensorID"),
+        fila.get("Disponibilidad"),
+        fila.get("Horas Up", 0),
+        fila.get("Horas Down", 0),
+        fila.get("Horas Omitidas (Warning/Paused/Unknown)", 0),
+        fila.get("Total Horas", 0),
+        fila.get("Fecha Inicio"),
+        fila.get("Fecha Fin"),
+        fila.get("Latencia P50 (ms)"),
+        fila.get("Latencia P95 (ms)"),
+        fila.get("Latencia P99 (ms)"),
+        fila.get("Horas Mantenimiento", 0),
+        fila.get("Latencia Promedio (ms)")
+    )
+
+
+# Un corte por fila (inicio, fin, duración), no una fila por hora caída:
+# MTTR y MTBF se calculan desde aquí sin volver a consultar PRTG.
+INSERT_CORTE_SQL = """
+    INSERT INTO Cortes_PRTG
+    (SensorID, Inicio, Fin, Duracion_Minutos, Muestras, Fecha_Inicio, Fecha_Fin)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def parametros_cortes(fila, cortes):
+    return [
+        (fila.get("SensorID"), inicio, fin, minutos, muestras, fila.get("Fecha Inicio"), fila.get("Fecha Fin"))
+        for inicio, fin, minutos, muestras in cortes or []
+    ]
+
+
+def insertar_resumen(conn, fila, deltas=None, cortes=None):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(INSERT_RESUMEN_SQL, parametros_resumen(fila))
+        if deltas:
+            aplicar_rollups(cursor, deltas)
+        if cortes:
+            cursor.executemany(INSERT_CORTE_SQL, parametros_cortes(fila, cortes))
+        conn.commit()
+        return "insertado"
+    except pyodbc.IntegrityError:
+        # Si la conexión se cayó, el rollback también falla: quien llama la verifica
+        try:
+            conn.rollback()
+        except pyodbc.Error:
+            pass
+        return "duplicado"
+    except Exception as e:
+        log.error(f"Error SQL al insertar: {e}")
+        try:
+            conn.rollback()
+        except pyodbc.Error:
+            pass
+        return "error"
+
+
+# ==========================
+# Rollups diarios y mensuales (Power BI)
+# ==========================
+# Tablas pre-agregadas por sensor, dispositivo y grupo. Se guardan sumas
+# (horas y latencias), no promedios, para poder sumar los aportes de cada
+# nueva carga sin recalcular: Disponibilidad y Latencia_Promedio son
+# columnas calculadas.
+TABLAS_ROLLUP = {
+    "diario": ("Disponibilidad_Diaria_PRTG", "Fecha"),
+    "mensual": ("Disponibilidad_Mensual_PRTG", "Mes"),
+}
+
+MERGE_ROLLUP_SQL = """
+    MERGE {tabla} WITH (HOLDLOCK) AS t
+    USING (SELECT ? AS Nivel, ? AS Clave, ? AS {col}, ? AS Grupo, ? AS Dispositivo, ? AS Sensor,
+                  ? AS Horas_Up, ? AS Horas_Down, ? AS Horas_Omitidas,
+                  ? AS Latencia_Suma, ? AS Latencia_Muestras, ? AS Segundos_Up, ? AS Segundos_Down) AS s
+    ON t.Nivel = s.Nivel AND t.Clave = s.Clave AND t.{col} = s.{col}
+    WHEN MATCHED THEN UPDATE SET
+        Horas_Up = t.Horas_Up + s.Horas_Up,
+        Horas_Down = t.Horas_Down + s.Horas_Down,
+        Horas_Omitidas = t.Horas_Omitidas + s.Horas_Omitidas,
+        Latencia_Suma = t.Latencia_Suma + s.Latencia_Suma,
+        Latencia_Muestras = t.Latencia_Muestras + s.Latencia_Muestras,
+        Segundos_Up = t.Segundos_Up + s.Segundos_Up,
+        Segundos_Down = t.Segundos_Down + s.Segundos_Down,
+        FechaActualizacion = GETDATE()
+    WHEN NOT MATCHED THEN
+        INSERT (Nivel, Clave, {col}, Grupo, Dispositivo, Sensor, Horas_Up, Horas_Down,
+                Horas_Omitidas, Latencia_Suma, Latencia_Muestras, Segundos_Up, Segundos_Down)
+        VALUES (s.Nivel, s.Clave, s.{col}, s.Grupo, s.Dispositivo, s.Sensor, s.Horas_Up, s.Horas_Down,
+                s.Horas_Omitidas, s.Latencia_Suma, s.Latencia_Muestras, s.Segundos_Up, s.Segundos_Down);
+"""
+
+
+def deltas_rollup(s, por_dia):
+    """
+    Convierte los contadores por día de un sensor en aportes a los rollups:
+    {(periodo, nivel, clave, fecha): [grupo, dispositivo, sensor, up, down, omitidas, lat_suma, lat_n,
+                                      seg_up, seg_down]}
+    """
+    niveles = [
+        ("Sensor", str(s.get("objid")), s.get("device"), s.get("sensor")),
+        ("Dispositivo", str(s.get("parentid") or s.get("device")), s.get("device"), None),
+        ("Grupo", s.get("group"), None, None),
+    ]
+
+    deltas = {}
+    for dia, contadores in por_dia.items():
+        for periodo, fecha in (("diario", dia), ("mensual", dia.replace(day=1))):
+            for nivel, clave, dispositivo, sensor in niveles:
+                actual = deltas.setdefault(
+                    (periodo, nivel, clave, fecha),
+                    [s.get("group"), dispositivo, sensor, 0, 0, 0, 0.0, 0, 0, 0]
+                )
+                for i, valor in enumerate(contadores):
+                    actual[3 + i] += valor
+    return deltas
+
+
+def acumular_deltas(destino, origen):
+    for clave, valores in origen.items():
+        actual = destino.get(clave)
+        if actual is None:
+            destino[clave] = list(valores)
+        else:
+            for i in range(3, len(valores)):
+                actual[i] += valores[i]
+    return destino
+
+
+def aplicar_rollups(cursor, deltas):
+    # Orden fijo de claves para que los writers en paralelo tomen los
+    # bloqueos de las filas compartidas (grupo, dispositivo) en el mismo orden.
+    for periodo, (tabla, columna_fecha) in TABLAS_ROLLUP.items():
+        filas = [
+            (nivel, clave, fecha, *valores)
+            for (p, nivel, clave, fecha), valores in sorted(deltas.items(), key=lambda kv: [str(x) for x in kv[0][1:]])
+            if p == periodo
+        ]
+        if filas:
+            cursor.executemany(MERGE_ROLLUP_SQL.format(tabla=tabla, col=columna_fecha), filas)
+
+
+# ==========================
+# Percentiles de latencia por grupo y totales
+# ==========================
+def claves_percentiles(sketches_por_grupo):
+    """(Nivel, Clave, {SensorID: sketch}) por grupo y el total de todos los grupos."""
+    claves = [("Grupo", grupo, sketches) for grupo, sketches in sketches_por_grupo.items()]
+    claves.append(("Total", "TOTAL", {sid: sk for sketches in sketches_por_grupo.values()
+                                      for sid, sk in sketches.items()}))
+    return claves
+
+
+def sketches_insertados(sketches_por_grupo, insertados, fecha_inicio, fecha_fin):
+    """Solo los sketches de sensores cuya fila del período se insertó en esta carga."""
+    filtrados = {}
+    for grupo, sketches in sketches_por_grupo.items():
+        propios = {sid: sk for sid, sk in sketches.items() if (sid, fecha_inicio, fecha_fin) in insertados}
+        if propios:
+            filtrados[grupo] = propios
+    return filtrados
+
+
+def combinar_percentiles(guardado, sketches):
+    """
+    Suma a la fila guardada (Sketch, Sensores, SensorIDs), o a nada, los
+    sketches {SensorID: sketch} de sensores que todavía no aportaron.
+    Devuelve (sketch, sensores, ids) o None si no hay ninguno nuevo.
+    """
+    sketch = SketchLatencia.desde_json(guardado[0]) if guardado and guardado[0] else SketchLatencia()
+    ids = set(json.loads(guardado[2])) if guardado and guardado[2] else set()
+    # Filas anteriores a SensorIDs: se conserva su cuenta de sensores
+    previos = (guardado[1] or 0) if guardado and not guardado[2] else 0
+
+    nuevos = {sid: sk for sid, sk in sketches.items() if sid not in ids}
+    if not nuevos:
+        return None
+    for sk in nuevos.values():
+        sketch.combinar(sk)
+    ids.update(nuevos)
+    return sketch, previos + len(ids), ids
+
+
+def guardar_percentiles(sketches_por_grupo, fecha_inicio, fecha_fin):
+    """
+    Combina los sketches de esta carga con el sketch ya guardado para el
+    mismo grupo y período (si existe) y actualiza la fila. El total sale de
+    combinar los sketches de grupo, sin recorrer muestras. Cada fila guarda
+    qué sensores aportaron: repetir la carga no los vuelve a sumar.
+    """
+    conn = conectar_sql()
+    if not conn:
+        print("No se pudo conectar SQL para guardar percentiles.")
+        return
+
+    cursor = conn.cursor()
+    for nivel, clave, sketches in claves_percentiles(sketches_por_grupo):
+        cursor.execute("""
+            SELECT Sketch, Sensores, SensorIDs FROM Percentiles_Latencia_PRTG WITH (UPDLOCK, HOLDLOCK)
+            WHERE Nivel = ? AND Clave = ? AND Fecha_Inicio = ? AND Fecha_Fin = ?
+        """, (nivel, clave, fecha_inicio, fecha_fin))
+        fila = cursor.fetchone()
+
+        combinado = combinar_percentiles(fila, sketches)
+        if combinado is None:
+            conn.commit()
+            continue
+        sketch, sensores, ids = combinado
+        pct = sketch.percentiles()
+
+        valores = (sensores, sketch.n, pct["p50"], pct["p95"], pct["p99"], sketch.a_json(),
+                   json.dumps(sorted(ids)))
+        if fila:
+            cursor.execute("""
+                UPDATE Percentiles_Latencia_PRTG
+                SET Sensores = ?, Muestras = ?, Latencia_P50 = ?, Latencia_P95 = ?, Latencia_P99 = ?,
+                    Sketch = ?, SensorIDs = ?, FechaActualizacion = GETDATE()
+                WHERE Nivel = ? AND Clave = ? AND Fecha_Inicio = ? AND Fecha_Fin = ?
+            """, valores + (nivel, clave, fecha_inicio, fecha_fin))
+        else:
+            cursor.execute("""
+                INSERT INTO Percentiles_Latencia_PRTG
+                (Sensores, Muestras, Latencia_P50, Latencia_P95, Latencia_P99, Sketch, SensorIDs,
+                 Nivel, Clave, Fecha_Inicio, Fecha_Fin)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, valores + (nivel, clave, fecha_inicio, fecha_fin))
+        conn.commit()
+
+    conn.close()
+    print(f"✔ Percentiles de latencia guardados para {len(sketches_por_grupo)} grupos")
+
+
+# Columnas y tipos de las filas que van a CSV/XLSX/SQLite/SQL Server
+ESQUEMAS_SALIDA = {
+    None: {
+        "Grupo": "texto", "Dispositivo": "texto", "Sensor": "texto", "SensorID": "entero",
+        "Disponibilidad": "real", "Horas Up": "real", "Horas Down": "real",
+        "Horas Omitidas (Warning/Paused/Unknown)": "real", "Horas Mantenimiento": "real",
+        "Total Horas": "real", "Cortes": "entero", "Minutos en Corte": "real",
+        "Fecha Inicio": "texto", "Fecha Fin": "texto", "Latencia Promedio (ms)": "real",
+        "Latencia P50 (ms)": "real", "Latencia P95 (ms)": "real", "Latencia P99 (ms)": "real",
+    },
+    "Percentiles_Latencia": {
+        "Nivel": "texto", "Clave": "texto", "Sensores": "entero", "Muestras": "entero",
+        "Latencia P50 (ms)": "real", "Latencia P95 (ms)": "real", "Latencia P99 (ms)": "real",
+        "Fecha Inicio": "texto", "Fecha Fin": "texto",
+    },
+}
+
+
+def filas_percentiles(sketches_por_grupo, fecha_inicio, fecha_fin):
+    """Las mismas filas de Percentiles_Latencia_PRTG, solo con esta carga, para CSV/XLSX/SQLite."""
+    filas = []
+    for nivel, clave, sketches in claves_percentiles(sketches_por_grupo):
+        sketch = combinar_sketches(sketches.values())
+        pct = sketch.percentiles()
+        filas.append({"Nivel": nivel, "Clave": clave, "Sensores": len(sketches), "Muestras": sketch.n,
+                      "Latencia P50 (ms)": pct["p50"], "Latencia P95 (ms)": pct["p95"],
+                      "Latencia P99 (ms)": pct["p99"], "Fecha Inicio": fecha_inicio, "Fecha Fin": fecha_fin})
+    return filas
+
+
+# ==========================
+# Pool de escritores SQL
+# ==========================
+_FIN = object()
+
+
+class PoolEscritoresSQL:
+    """
+    N workers escritores alimentados desde una cola. Cada worker tiene su
+    propia conexión, agrupa filas en lotes de SQL_BATCH_SIZE y verifica la
+    conexión antes de cada lote, reconectando si se cayó. El resumen, sus
+    aportes a los rollups y sus cortes se confirman en la misma transacción.
+    """
+
+    def __init__(self, n_workers=SQL_WRITERS, batch_size=SQL_BATCH_SIZE):
+        self.cola = queue.Queue(maxsize=n_workers * batch_size * 2)
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.totales = {"insertado": 0, "duplicado": 0, "error": 0}
+        # (SensorID, Fecha Inicio, Fecha Fin) de las filas confirmadas
+        self.insertados = set()
+        self.workers = [
+            threading.Thread(target=self._worker, args=(n,), daemon=True)
+            for n in range(1, n_workers + 1)
+        ]
+
+    def iniciar(self):
+        for w in self.workers:
+            w.start()
+
+    def enviar(self, fila, deltas=None, cortes=None):
+        self.cola.put((fila, deltas, cortes))
+
+    def cerrar(self):
+        for _ in self.workers:
+            self.cola.put(_FIN)
+        for w in self.workers:
+            w.join()
+        return self.totales
+
+    def _contar(self, resultado, filas):
+        with self.lock:
+            self.totales[resultado] += len(filas)
+            if resultado == "insertado":
+                self.insertados.update((f.get("SensorID"), f.get("Fecha Inicio"), f.get("Fecha Fin")) for f in filas)
+
+    def _conexion_sana(self, conn):
+        if conn is not None:
+            try:
+                conn.cursor().execute("SELECT 1").fetchone()
+                return conn
+            except pyodbc.Error:
+                log.warning("Conexión SQL caída, reconectando...")
+                try:
+                    conn.close()
+                except pyodbc.Error:
+                    pass
+
+        for attempt in range(1, SQL_RECONNECT_RETRIES + 1):
+            conn = conectar_sql()
+            if conn:
+                return conn
+            if attempt < SQL_RECONNECT_RETRIES:
+                time.sleep(GET_RETRY_DELAY)
+        return None
+
+    def _escribir_lote(self, conn, items):
+        with perfil.etapa("write"):
+            return self._escribir_lote_sql(conn, items)
+
+    def _escribir_lote_sql(self, conn, items):
+        conn = self._conexion_sana(conn)
+        if conn is None:
+            log.error(f"SQL sin conexión, se pierden {len(items)} filas")
+            self._contar("error", [fila for fila, _, _ in items])
+            return None
+
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(INSERT_RESUMEN_SQL, [parametros_resumen(fila) for fila, _, _ in items])
+            deltas = {}
+            for _, d, _ in items:
+                acumular_deltas(deltas, d or {})
+            aplicar_rollups(cursor, deltas)
+            filas_cortes = [c for fila, _, cortes in items for c in parametros_cortes(fila, cortes)]
+            if filas_cortes:
+                cursor.executemany(INSERT_CORTE_SQL, filas_cortes)
+            conn.commit()
+            self._contar("insertado", [fila for fila, _, _ in items])
+            return conn
+        except pyodbc.Error as e:
+            if not isinstance(e, pyodbc.IntegrityError):
+                log.error(f"Error SQL al insertar lote: {e}")
+            try:
+                conn.rollback()
+            except pyodbc.Error:
+                conn = self._conexion_sana(None)
+                if conn is None:
+                    self._contar("error", [fila for fila, _, _ in items])
+                    return None
+
+        # El lote falló completo: se reintenta fila a fila para aislar duplicados
+        for fila, deltas, cortes in items:
+            if conn is None:
+                self._contar("error", [fila])
+                continue
+            resultado = insertar_resumen(conn, fila, deltas, cortes)
+            self._contar(resultado, [fila])
+            if resultado != "insertado":
+                conn = self._conexion_sana(conn)
+        return conn
+
+    def _worker(self, n):
+        conn = None
+        pendientes = []
+        while True:
+            try:
+                item = self.cola.get(timeout=1)
+            except queue.Empty:
+                item = None
+
+            if item is not None and item is not _FIN:
+                pendientes.append(item)
+
+            if pendientes and (item is None or item is _FIN or len(pendientes) >= self.batch_size):
+                conn = self._escribir_lote(conn, pendientes)
+                pendientes = []
+
+            if item is _FIN:
+                break
+
+        if conn is not None:
+            conn.close()
+
+
+# ==========================
+# MAIN
+# ==========================
+def procesar_sensor(s, start_date, end_date, mantenimiento=None, evaluador=None, periodos=None):
+    """
+    Filas (fila, deltas, cortes, sketch) del sensor: una, o una por período
+    con MULTIPERIODO, todas de la misma descarga. None si no hay canal que evaluar.
+    """
+    sid = s.get("objid")
+    canales = None
+    if evaluador is not None:
+        # Los Ping sin canales resueltos se evalúan como siempre (primer valor numérico)
+        canales = evaluador.de_sensor(s)
+        if canales is None and evaluador.tipo(s) != "ping":
+            return None
+    if periodos is None:
+        disponibilidad, stats = get_historic_data(sid, start_date, end_date, mantenimiento, canales)
+        resultados = [(start_date, end_date, disponibilidad, stats)]
+    else:
+        # Un tramo por grupo de períodos cercanos: los huecos largos no se descargan
+        por_periodo = por_tramos(periodos, lambda inicio, fin, tramo: get_historic_data(
+            sid, inicio, fin, mantenimiento, canales, rangos_ole(tramo)))
+        resultados = [(inicio, fin, disponibilidad, stats)
+                      for (_, inicio, fin), (disponibilidad, stats) in zip(periodos, por_periodo)]
+
+    time.sleep(REQUEST_DELAY)
+
+    # Cada día entra una sola vez en los rollups aunque esté en varios períodos
+    por_dia = {}
+    for _, _, _, stats in resultados:
+        for dia, contadores in stats.get("por_dia", {}).items():
+            por_dia.setdefault(dia, contadores)
+    deltas = deltas_rollup(s, por_dia)
+
+    filas = []
+    for inicio, fin, disponibilidad, stats in resultados:
+        log.debug(
+            f"Sensor ID {sid} — {s.get('device')} / {s.get('sensor')} — {inicio} → {fin} — "
+            f"Estado actual: {s.get('status')} | "
+            f"Disponibilidad: {disponibilidad}% | "
+            f"Latencia promedio: {stats.get('latencia_promedio')} | P50: {stats.get('latencia_p50')} | P95: {stats.get('latencia_p95')} | P99: {stats.get('latencia_p99')} ms | "
+            f"Horas UP: {stats.get('horas_up')} | DOWN: {stats.get('horas_down')} | "
+            f"Omitidas: {stats.get('horas_omitidas')} | Mantenimiento: {stats.get('horas_mantenimiento')} | "
+            f"Total: {stats.get('horas_totales')}",
+            extra={"datos": {"sensor": sid, "dispositivo": s.get("device"), "desde": inicio, "hasta": fin,
+                             "disponibilidad": disponibilidad,
+                             "p50": stats.get("latencia_p50"), "p95": stats.get("latencia_p95"),
+                             "p99": stats.get("latencia_p99"), "up": stats.get("segundos_up"),
+                             "down": stats.get("segundos_down"), "muestras": stats.get("muestras_totales")}}
+        )
+
+        cortes = cortes_a_intervalos(stats.get("cortes", []), RESOLUCION)
+
+        fila = {
+            "Grupo": s.get("group"),
+            "Dispositivo": s.get("device"),
+            "Sensor": s.get("sensor"),
+            "SensorID": sid,
+            "Disponibilidad": disponibilidad,
+            "Horas Up": stats.get("horas_up", 0),
+            "Horas Down": stats.get("horas_down", 0),
+            "Horas Omitidas (Warning/Paused/Unknown)": stats.get("horas_omitidas", 0),
+            "Horas Mantenimiento": stats.get("horas_mantenimiento", 0),
+            "Total Horas": stats.get("horas_totales", 0),
+            "Cortes": len(cortes),
+            "Minutos en Corte": sum(c[2] for c in cortes),
+            "Fecha Inicio": inicio,
+            "Fecha Fin": fin,
+            "Latencia Promedio (ms)": stats.get("latencia_promedio"),
+            "Latencia P50 (ms)": stats.get("latencia_p50"),
+            "Latencia P95 (ms)": stats.get("latencia_p95"),
+            "Latencia P99 (ms)": stats.get("latencia_p99")
+        }
+        # Los aportes a los rollups viajan solo con la primera fila del sensor
+        filas.append((fila, None if filas else deltas, cortes, stats.get("sketch")))
+    return filas
+
+
+def main():
+
+    print("\n=== DISPONIBILIDAD PRTG — Basado SOLO en latencia (value_raw) ===\n")
+
+    usar_sql = "sql" in SALIDAS
+    archivos = [s for s in SALIDAS if s != "sql"]
+    if not usar_sql and not archivos:
+        print("No hay salidas configuradas (SALIDAS).")
+        return
+    if usar_sql and pyodbc is None:
+        print("Falta pyodbc para la salida sql: instálelo o quite \"sql\" de SALIDAS.")
+        return
+
+    if USAR_ARBOL:
+        print("Descargando árbol de grupos y dispositivos...")
+        try:
+            with perfil.etapa("inventario"):
+                arbol = descargar_arbol(consultar_tabla)
+        except RuntimeError as e:
+            print(f"Error conectando a PRTG: {e}")
+            return
+        grupos = arbol.resolver(input("Ingrese los ID o nombres de grupo separados por coma (admite *, p. ej. Sucursal*): "))
+    else:
+        grupos_input = input("Ingrese los ID de los grupos separados por coma: ")
+        grupos = [g.strip() for g in grupos_input.split(",") if g.strip().isdigit()]
+    if not grupos:
+        print("No ingresó grupos válidos.")
+        return
+
+    if MULTIPERIODO:
+        try:
+            periodos = leer_periodos(input("Períodos separados por coma "
+                                           "(p. ej. 2024-01, 2024-T1, 2024, ytd, 2024/01/01~2024/01/15): "))
+        except ValueError as e:
+            print(e)
+            return
+        if not periodos:
+            print("No ingresó períodos válidos.")
+            return
+        start_date, end_date = union(periodos)
+        rangos_descarga = ", ".join(f"{inicio} → {fin}" for inicio, fin, _ in tramos(periodos))
+        print(f"{len(periodos)} períodos; descargas por sensor: {rangos_descarga}")
+    else:
+        start_date = input("Fecha inicio: ").strip()
+        end_date = input("Fecha fin: ").strip()
+        periodos = [(None, start_date, end_date)]
+
+    # Con el árbol, su descarga ya verificó la conexión
+    if not USAR_ARBOL:
+        test_url = f"{PRTG_URL}table.json"
+        params = {"content": "sensors", "columns": "objid", "id": grupos[0], "username": USERNAME, "passhash": PASSHASH}
+        if not get_data_with_retry(test_url, params=params, max_retries=2, timeout=10):
+            print("Error conectando a PRTG.")
+            return
+    print("✔ Conexión a PRTG verificada")
+
+    if usar_sql:
+        conn = conectar_sql()
+        if not conn:
+            print("No se pudo conectar SQL.")
+            return
+        crear_tabla_si_no_existe(conn)
+
+    print("\nConsultando sensores...\n")
+    with perfil.etapa("inventario"):
+        if USAR_ARBOL:
+            todos_sensores, referencias = arbol.sensores_unicos(grupos, get_sensors_by_devices)
+        else:
+            todos_sensores, referencias = sensores_unicos(grupos, get_sensors_by_group)
+
+    print(f"✔ Total sensores: {len(referencias)} ({len(todos_sensores)} únicos)\n")
+
+    # ===============================================================
+    # VALIDAR SI EL RANGO YA EXISTE EN LA BD (EVITA DATOS DUPLICADOS)
+    # ===============================================================
+    # Con MULTIPERIODO se valida la unión: los rollups no pueden sumar dos veces un día.
+    # Sin SQL los archivos se generan de nuevo: no hay nada que validar
+    existentes = set()
+    if usar_sql:
+        existentes = sensores_con_rango_en_bd(conn, start_date, end_date)
+        conn.close()
+
+    pendientes = [s for s in todos_sensores if s.get("objid") not in existentes]
+    omitidos = len(todos_sensores) - len(pendientes)
+    if omitidos:
+        print(f"⚠ Omitidos {omitidos} sensores: ya existe información en un rango de fechas que se cruza")
+
+    # Por período (Fecha Inicio, Fecha Fin): resultados por sensor y sketches por grupo
+    resultados_por_id = {(inicio, fin): {} for _, inicio, fin in periodos}
+    sketches_por_grupo = {(inicio, fin): {} for _, inicio, fin in periodos}
+    pool = PoolEscritoresSQL() if usar_sql else None
+    if pool:
+        pool.iniciar()
+
+    # Ventanas de mantenimiento planificado: esas horas no cuentan como caída
+    mantenimientos = cargar_mantenimientos(*rango_fechas(start_date, end_date))
+    # Con el árbol, una ventana de grupo alcanza a todos sus subgrupos aunque no se hayan elegido
+    grupos_de = arbol.grupos_por_sensor(todos_sensores) if USAR_ARBOL else grupos_por_sensor(referencias)
+
+    # Con el almacén local los índices de canal también se recuerdan entre ejecuciones
+    evaluador = EvaluadorCanales(consultar_tabla, TIPOS_SENSOR,
+                                 archivo=os.path.join(ALMACEN_DIR, CANALES_ARCHIVO) if USAR_ALMACEN_LOCAL else None)
+
+    progreso = registro.Progreso(len(pendientes), log=log)
+    with ThreadPoolExecutor(max_workers=PRTG_WORKERS) as executor:
+        futuros = [executor.submit(procesar_sensor, s, start_date, end_date,
+                                   mantenimientos.ventanas_de(s, grupos_de.get(s.get("objid"), ())), evaluador,
+                                   periodos if MULTIPERIODO else None)
+                   for s in pendientes]
+        for futuro in as_completed(futuros):
+            resultado = futuro.result()
+            if resultado is None:   # Sin canal que evaluar
+                progreso.avanzar()
+                continue
+            for fila, deltas, cortes, sketch in resultado:
+                if pool:
+                    pool.enviar(fila, deltas, cortes)
+                periodo = (fila["Fecha Inicio"], fila["Fecha Fin"])
+                resultados_por_id[periodo][fila["SensorID"]] = fila
+                if sketch is not None:
+                    sketches_por_grupo[periodo].setdefault(fila["Grupo"], {})[fila["SensorID"]] = sketch
+            progreso.avanzar()
+
+    totales = pool.cerrar() if pool else None
+    progreso.terminar()
+    evaluador.guardar()
+
+    if usar_sql:
+        # Solo aportan los sensores insertados ahora: un duplicado o un error ya no suma al sketch
+        for (inicio, fin), por_grupo in sketches_por_grupo.items():
+            por_grupo = sketches_insertados(por_grupo, pool.insertados, inicio, fin)
+            if por_grupo:
+                with perfil.etapa("write"):
+                    guardar_percentiles(por_grupo, inicio, fin)
+
+    # Cada sensor se insertó una vez por período; sus repeticiones en otros grupos solo van a los archivos
+    resultados = [fila for por_id in resultados_por_id.values() for fila in repartir_resultados(referencias, por_id)]
+    repetidos = len(resultados) - sum(len(por_id) for por_id in resultados_por_id.values())
+
+    if archivos:
+        cola = ColaEscritura(crear_salidas(archivos, os.path.splitext(OUTPUT_FILE)[0], "Disponibilidad_Detalle_PRTG",
+                                           hoja="Disponibilidad", esquemas=ESQUEMAS_SALIDA))
+        cola.iniciar()
+        cola.enviar(resultados)
+        percentiles = [fila for (inicio, fin), por_grupo in sketches_por_grupo.items()
+                       for fila in filas_percentiles(por_grupo, inicio, fin)]
+        cola.enviar(percentiles, tabla="Percentiles_Latencia")
+        cola.cerrar()
+        if cola.errores:
+            print(f"\nNo se pudo generar: {', '.join(archivos)}")
+        else:
+            print(f"\n✔ Generado: {', '.join(archivos)} ({os.path.splitext(OUTPUT_FILE)[0]})")
+
+    latencias_prtg.reporte()
+    transferencia.reporte()
+
+    print(f"\n=== PROCESO COMPLETADO ===")
+    if totales:
+        print(f"Insertados: {totales['insertado']}")
+        print(f"Duplicados: {totales['duplicado'] + omitidos + repetidos}")
+        print(f"Errores: {totales['error']}")
+    else:
+        print(f"Calculados: {sum(len(por_id) for por_id in resultados_por_id.values())}")
+        print(f"Exportados: {len(resultados)}")
+
+
+if __name__ == "__main__":
+    with perfil.sesion():
+        main()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import requests
+import os
+import time
+import heapq
+import random
+import threading
+import urllib3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from requests.adapters import HTTPAdapter
+import perfil_prtg as perfil
+import transferencia_prtg as transferencia
+from salidas_prtg import ColaEscritura, crear_salidas
+import registro_prtg as registro
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+log = registro.obtener("monitoreo")
+
+# =============== CONFIGURACIÓN =================
+PRTG_URL = "https://TU.URL.com/api/"
+USERNAME = "tu_user"
+PASSHASH = "tupasshash"
+OUTPUT_FILE = "deltas_canales.csv"
+SALIDAS = ["csv"]       # csv, sqlite, sqlserver (se anexa; mismo nombre base que OUTPUT_FILE)
+
+INTERVALO_SONDEO = 60   # Segundos entre dos sondeos del mismo dispositivo
+JITTER = 0.25           # Fracción del hueco entre dispositivos usada como jitter
+MAX_WORKERS = 8         # Sondeos simultáneos (una conexión keep-alive por worker)
+PAGE_SIZE = 500
+MAX_RETRIES = 2
+RETRY_DELAY = 3
+
+
+# =============== CONEXIONES =================
+_hilo_local = threading.local()
+
+
+def get_session():
+    """Devuelve la sesión HTTP del hilo actual, reutilizando su conexión."""
+    session = getattr(_hilo_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.verify = False
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        _hilo_local.session = session
+    return session
+
+
+def get_data_with_retry(params):
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            r = get_session().get(PRTG_URL + "table.json", params=params, timeout=30,
+                                  headers=transferencia.CABECERAS)
+            r.raise_for_status()
+            transferencia.registrar(r)
+            return r.json()
+        except Exception as e:
+            log.warning(f"Intento {attempt}/{MAX_RETRIES}: {e}")
+            if attempt < MAX_RETRIES:
+                time.sleep(RETRY_DELAY)
+            else:
+                return None
+
+
+# Columnas de los deltas; LastValue es texto porque según el canal llega número o texto
+ESQUEMA_DELTAS = {
+    "Timestamp": "texto", "Group": "texto", "Device": "texto", "Sensor": "texto", "Host": "texto",
+    "SensorID": "entero", "Channel": "texto", "LastValue": "texto", "Unit": "texto",
+}
+
+
+# =============== CONSULTAS PRTG =================
+def get_sensors_by_device(device_id):
+    sensors = []
+    seen_ids = set()
+    start = 0
+
+    while True:
+        params = {
+            "content": "sensors",
+            "output": "json",
+            "columns": "objid,group,device,sensor,host,lastvalue",
+            "filter_parentid": device_id,
+            "count": PAGE_SIZE,
+            "start": start,
+            "username": USERNAME,
+            "passhash": PASSHASH
+        }
+
+        data = get_data_with_retry(params)
+        if not data or "sensors" not in data:
+            return None if start == 0 else sensors
+
+        new_items = 0
+        for s in data["sensors"]:
+            if s["objid"] not in seen_ids:
+                seen_ids.add(s["objid"])
+                sensors.append(s)
+                new_items += 1
+
+        if new_items < PAGE_SIZE:
+            break
+
+        start += PAGE_SIZE
+
+    return sensors
+
+
+def get_channels(sensor_id):
+    params = {
+        "content": "channels",
+        "output": "json",
+        "id": sensor_id,
+        "columns": "name,lastvalue,unit",
+        "username": USERNAME,
+        "passhash": PASSHASH
+    }
+
+    data = get_data_with_retry(params)
+    if not data or "channels" not in data:
+        return None
+
+    return data["channels"]
+
+
+# =============== SONDEO DE UN DISPOSITIVO =================
+# Último valor conocido por sensor (lastvalue del canal primario) y por canal.
+ultimo_valor_sensor = {}
+ultimo_valor_canal = {}
+
+
+def sondear_dispositivo(device_id):
+    """
+    Sondea un dispositivo y devuelve solo los canales cuyo valor cambió.
+    Los sensores cuyo lastvalue no cambió desde el sondeo anterior se
+    omiten sin consultar sus canales.
+    """
+    sensors = get_sensors_by_device(device_id)
+    if sensors is None:
+        raise RuntimeError(f"Sin respuesta para el Device ID {device_id}")
+
+    filas = []
+    cambiados = 0
+    timestamp = datetime.now().isoformat(timespec="seconds")
+
+    for sensor in sensors:
+        sid = sensor["objid"]
+        valor_sensor = sensor.get("lastvalue_raw", sensor.get("lastvalue"))
+        if sid in ultimo_valor_sensor and ultimo_valor_sensor[sid] == valor_sensor:
+            continue
+
+        channels = get_channels(sid)
+        if channels is None:
+            continue
+
+        ultimo_valor_sensor[sid] = valor_sensor
+        cambiados += 1
+
+        for ch in channels:
+            clave = (sid, ch.get("name"))
+            valor = ch.get("lastvalue_raw", ch.get("lastvalue"))
+            if ultimo_valor_canal.get(clave) == valor:
+                continue
+            ultimo_valor_canal[clave] = valor
+            filas.append({
+                "Timestamp": timestamp,
+                "Group": sensor["group"],
+                "Device": sensor["device"],
+                "Sensor": sensor["sensor"],
+                "Host": sensor["host"],
+                "SensorID": sid,
+                "Channel": ch.get("name"),
+                "LastValue": valor,
+                "Unit": ch.get("unit", "")
+            })
+
+    return filas, len(sensors), cambiados
+
+
+def sondear_perfilado(device_id):
+    with perfil.etapa("fetch", device_id):
+        return sondear_dispositivo(device_id)
+
+
+# =============== ESTADÍSTICAS POR CICLO =================
+def nuevo_ciclo(numero):
+    return {
+        "numero": numero,
+        "sondeos": 0,
+        "errores": 0,
+        "solapados": 0,
+        "duraciones": [],
+        "retraso_max": 0.0,
+        "sensores": 0,
+        "cambiados": 0,
+        "deltas": 0
+    }
+
+
+def imprimir_ciclo(ciclo, hueco):
+    duraciones = ciclo["duraciones"]
+    media = sum(duraciones) / len(duraciones) if duraciones else 0.0
+    maxima = max(duraciones) if duraciones else 0.0
+    ocupacion = 100 * sum(duraciones) / (INTERVALO_SONDEO * MAX_WORKERS)
+
+    entra = ocupacion < 100 and ciclo["solapados"] == 0 and ciclo["retraso_max"] < hueco
+
+    print(
+        f"[Ciclo {ciclo['numero']}] {ciclo['sondeos']} sondeos | {ciclo['errores']} errores | "
+        f"{ciclo['solapados']} solapados | dur. media {media:.2f}s / max {maxima:.2f}s | "
+        f"retraso max {ciclo['retraso_max']:.2f}s | ocupación {ocupacion:.0f}% | "
+        f"sensores cambiados {ciclo['cambiados']}/{ciclo['sensores']} | deltas {ciclo['deltas']} | "
+        f"{'ENTRA en el intervalo' if entra else 'NO ENTRA en el intervalo'}"
+    )
+
+
+# =============== PLANIFICADOR =================
+def leer_dispositivos(texto):
+    if os.path.isfile(texto):
+        with open(texto, encoding="utf-8") as f:
+            texto = f.read()
+
+    # dict en lugar de lista: quita repetidos sin recorrer lo ya leído y conserva el orden
+    ids = {}
+    for token in texto.replace("\n", ",").split(","):
+        token = token.strip()
+        if token.isdigit():
+            ids.setdefault(token, None)
+    return list(ids)
+
+
+def monitorear(device_ids):
+    """
+    Reparte los sondeos de forma uniforme dentro de INTERVALO_SONDEO, con
+    jitter para no sincronizar las peticiones contra PRTG, y escribe solo
+    los deltas en SALIDAS a través de una cola de escritura en segundo plano.
+    """
+    hueco = INTERVALO_SONDEO / len(device_ids)
+    inicio = time.monotonic()
+
+    # (instante programado, base del dispositivo, nº de ciclo, device_id)
+    agenda = []
+    for i, device_id in enumerate(device_ids):
+        base = inicio + i * hueco
+        heapq.heappush(agenda, (base + random.uniform(0, hueco * JITTER), base, 0, device_id))
+
+    cola = ColaEscritura(crear_salidas(SALIDAS, os.path.splitext(OUTPUT_FILE)[0], "Deltas_Canales_PRTG",
+                                       anexar=True, esquemas={None: ESQUEMA_DELTAS}))
+    cola.iniciar()
+
+    lock = threading.Lock()
+    en_curso = set()
+    ciclo = nuevo_ciclo(1)
+    fin_ciclo = inicio + INTERVALO_SONDEO
+
+    def al_terminar(device_id, t_inicio, futuro):
+        duracion = time.monotonic() - t_inicio
+        try:
+            filas, n_sensores, n_cambiados = futuro.result()
+        except Exception as e:
+            with lock:
+                en_curso.discard(device_id)
+                ciclo["duraciones"].append(duracion)
+                ciclo["errores"] += 1
+            log.error(f"Device {device_id}: {e}", extra={"datos": {"dispositivo": device_id}})
+            return
+        with lock:
+            en_curso.discard(device_id)
+            ciclo["duraciones"].append(duracion)
+            ciclo["sensores"] += n_sensores
+            ciclo["cambiados"] += n_cambiados
+            ciclo["deltas"] += len(filas)
+        # Fuera del lock: con la cola llena, enviar espera sin frenar al planificador ni a otros workers
+        cola.enviar(filas)
+
+    executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    try:
+        while True:
+            programado, base, n, device_id = heapq.heappop(agenda)
+
+            espera = programado - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+
+            ahora = time.monotonic()
+            with lock:
+                if ahora >= fin_ciclo:
+                    imprimir_ciclo(ciclo, hueco)
+                    ciclo = nuevo_ciclo(ciclo["numero"] + 1)
+                    fin_ciclo += INTERVALO_SONDEO * (1 + int((ahora - fin_ciclo) // INTERVALO_SONDEO))
+
+                if device_id in en_curso:
+                    ciclo["solapados"] += 1
+                else:
+                    en_curso.add(device_id)
+                    ciclo["sondeos"] += 1
+                    ciclo["retraso_max"] = max(ciclo["retraso_max"], ahora - programado)
+                    futuro = executor.submit(sondear_perfilado, device_id)
+                    futuro.add_done_callback(
+                        lambda f, d=device_id, t=ahora: al_terminar(d, t, f)
+                    )
+
+            siguiente = base + (n + 1) * INTERVALO_SONDEO
+            heapq.heappush(agenda, (siguiente + random.uniform(0, hueco * JITTER), base, n + 1, device_id))
+    finally:
+        executor.shutdown(wait=True)
+        cola.cerrar()
+
+
+# =============== MAIN =================
+def main():
+    entrada = input("Ingresa los Device ID separados por coma o la ruta de un archivo con IDs: ").strip()
+
+    device_ids = leer_dispositivos(entrada)
+    if not device_ids:
+        print("No se ingresaron Device ID válidos")
+        return
+
+    print(f"\nMonitoreando {len(device_ids)} dispositivos cada {INTERVALO_SONDEO}s "
+          f"con {MAX_WORKERS} workers. Deltas en {OUTPUT_FILE} (Ctrl+C para detener)\n")
+
+    try:
+        monitorear(device_ids)
+    except KeyboardInterrupt:
+        print("\nMonitoreo detenido por el usuario.")
+        transferencia.reporte()
+
+
+if __name__ == "__main__":
+    with perfil.sesion():
+        main()
@@ -1,149 +1,212 @@
-import requests
-import csv
-import time
-import urllib3
-
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-# =============== CONFIGURACIÓN =================
-PRTG_URL = "https://TU.URL.com/api/"
-USERNAME = "tu_user"
-PASSHASH = "tupasshash"
-OUTPUT_FILE = "canales_por_dispositivo.csv"
-MAX_RETRIES = 3
-RETRY_DELAY = 5
-
-# =============== FUNCIONES =================
-def get_data_with_retry(params):
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            r = requests.get(
-                PRTG_URL + "table.json",
-                params=params,
-                verify=False,
-                timeout=30
-            )
-            r.raise_for_status()
-            return r.json()
-        except Exception as e:
-            print(f"[ERROR] Intento {attempt}: {e}")
-            if attempt < MAX_RETRIES:
-                time.sleep(RETRY_DELAY)
-            else:
-                return None
-
-def get_sensors_by_device(device_id):
-    print(f"\nObteniendo sensores del Device ID {device_id} ...")
-
-    sensors = []
-    seen_ids = set()
-    start = 0
-    PAGE_SIZE = 500  # Límite real de PRTG
-
-    while True:
-        params = {
-            "content": "sensors",
-            "output": "json",
-            "columns": "objid,group,device,sensor,host",
-            "filter_parentid": device_id,
-            "count": PAGE_SIZE,
-            "start": start,
-            "username": USERNAME,
-            "passhash": PASSHASH
-        }
-
-        data = get_data_with_retry(params)
-        if not data or "sensors" not in data:
-            break
-
-        batch = data["sensors"]
-
-        new_items = 0
-        for s in batch:
-            if s["objid"] not in seen_ids:
-                seen_ids.add(s["objid"])
-                sensors.append(s)
-                new_items += 1
-
-        print(f"   ↳ Lote desde {start}: {new_items} sensores nuevos")
-
-        # 🔑 condición de salida REAL
-        if new_items == 0:
-            break
-
-        start += PAGE_SIZE
-
-    print(f"Total sensores obtenidos: {len(sensors)}")
-    return sensors
-
-
-def get_channels(sensor_id):
-    params = {
-        "content": "channels",
-        "output": "json",
-        "id": sensor_id,
-        "columns": "name,lastvalue,unit",
-        "username": USERNAME,
-        "passhash": PASSHASH
-    }
-
-    data = get_data_with_retry(params)
-    if not data or "channels" not in data:
-        return []
-
-    return [
-        {
-            "Channel": ch.get("name"),
-            "LastValue": ch.get("lastvalue"),
-            "Unit": ch.get("unit", "")
-        }
-        for ch in data["channels"]
-    ]
-
-# =============== MAIN =================
-def main():
-    device_id = input("Ingresa el Device ID de PRTG: ").strip()
-
-    if not device_id.isdigit():
-        print("Device ID inválido")
-        return
-
-    sensors = get_sensors_by_device(device_id)
-    if not sensors:
-        print("No se encontraron sensores")
-        return
-
-    all_rows = []
-
-    print("\nObteniendo canales...")
-    for i, sensor in enumerate(sensors, 1):
-        channels = get_channels(sensor["objid"])
-
-        for ch in channels:
-            all_rows.append({
-                "Group": sensor["group"],
-                "Device": sensor["device"],
-                "Sensor": sensor["sensor"],
-                "Host": sensor["host"],
-                "SensorID": sensor["objid"],
-                "Channel": ch["Channel"],
-                "LastValue": ch["LastValue"],
-                "Unit": ch["Unit"]
-            })
-
-        print(f"{i}/{len(sensors)} sensores procesados")
-
-    print(f"\nExportando a {OUTPUT_FILE} ...")
-    with open(OUTPUT_FILE, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=["Group", "Device", "Sensor", "Host", "SensorID", "Channel", "LastValue", "Unit"]
-        )
-        writer.writeheader()
-        writer.writerows(all_rows)
-
-    print(f"Exportación completada | Registros: {len(all_rows)}")
-
-if __name__ == "__main__":
-    main()
-
+import requests
+import os
+import time
+import threading
+import urllib3
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+import perfil_prtg as perfil
+import transferencia_prtg as transferencia
+from salidas_prtg import ColaEscritura, crear_salidas
+import registro_prtg as registro
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+log = registro.obtener("canales_v2")
+
+# =============== CONFIGURACIÓN =================
+PRTG_URL = "https://TU.URL.com/api/"
+USERNAME = "tu_user"
+PASSHASH = "tupasshash"
+OUTPUT_FILE = "canales_por_dispositivo.csv"
+SALIDAS = ["csv"]          # csv, xlsx, sqlite, sqlserver (mismo nombre base que OUTPUT_FILE)
+MAX_RETRIES = 3
+RETRY_DELAY = 5
+PAGE_SIZE = 500            # Límite real de PRTG
+PADRES_POR_CONSULTA = 50   # Device IDs por consulta de sensores (filter_parentid repetido)
+MAX_WORKERS = 8            # Consultas de canales simultáneas, compartidas por todos los dispositivos
+
+# =============== FUNCIONES =================
+_hilo_local = threading.local()
+
+
+def get_session():
+    """Devuelve la sesión HTTP del hilo actual, reutilizando su conexión."""
+    session = getattr(_hilo_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        _hilo_local.session = session
+    return session
+
+
+def get_data_with_retry(params):
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            r = get_session().get(
+                PRTG_URL + "table.json",
+                params=params,
+                verify=False,
+                timeout=30,
+                headers=transferencia.CABECERAS
+            )
+            r.raise_for_status()
+            transferencia.registrar(r)
+            return r.json()
+        except Exception as e:
+            log.warning(f"Intento {attempt}/{MAX_RETRIES}: {e}")
+            if attempt < MAX_RETRIES:
+                time.sleep(RETRY_DELAY)
+            else:
+                return None
+
+def get_sensors_by_devices(device_ids):
+    """
+    Sensores de un lote de dispositivos en una sola consulta paginada:
+    PRTG combina con OR los valores repetidos de filter_parentid.
+    """
+    sensors = []
+    seen_ids = set()
+    start = 0
+
+    while True:
+        params = {
+            "content": "sensors",
+            "output": "json",
+            "columns": "objid,group,device,sensor,host",
+            "filter_parentid": list(device_ids),
+            "count": PAGE_SIZE,
+            "start": start,
+            "username": USERNAME,
+            "passhash": PASSHASH
+        }
+
+        data = get_data_with_retry(params)
+        if not data or "sensors" not in data:
+            break
+
+        batch = data["sensors"]
+
+        new_items = 0
+        for s in batch:
+            if s["objid"] not in seen_ids:
+                seen_ids.add(s["objid"])
+                sensors.append(s)
+                new_items += 1
+
+        # 🔑 condición de salida REAL
+        if new_items == 0 or len(batch) < PAGE_SIZE:
+            break
+
+        start += PAGE_SIZE
+
+    return sensors
+
+
+def get_all_sensors(device_ids):
+    print(f"\nObteniendo sensores de {len(device_ids)} dispositivos "
+          f"({PADRES_POR_CONSULTA} por consulta)...")
+
+    sensors = []
+    for i in range(0, len(device_ids), PADRES_POR_CONSULTA):
+        lote = device_ids[i:i + PADRES_POR_CONSULTA]
+        encontrados = get_sensors_by_devices(lote)
+        sensors.extend(encontrados)
+        print(f"   ↳ Dispositivos {i + 1}-{i + len(lote)}: {len(encontrados)} sensores")
+
+    print(f"Total sensores obtenidos: {len(sensors)}")
+    return sensors
+
+
+def get_channels(sensor_id):
+    params = {
+        "content": "channels",
+        "output": "json",
+        "id": sensor_id,
+        "columns": "name,lastvalue,unit",
+        "username": USERNAME,
+        "passhash": PASSHASH
+    }
+
+    data = get_data_with_retry(params)
+    if not data or "channels" not in data:
+        return []
+
+    return [
+        {
+            "Channel": ch.get("name"),
+            "LastValue": ch.get("lastvalue_raw", ch.get("lastvalue")),
+            "Unit": ch.get("unit", "")
+        }
+        for ch in data["channels"]
+    ]
+
+def canales_de(sensor):
+    with perfil.etapa("fetch", sensor["objid"]):
+        channels = get_channels(sensor["objid"])
+
+    return [{
+        "Group": sensor["group"],
+        "Device": sensor["device"],
+        "Sensor": sensor["sensor"],
+        "Host": sensor["host"],
+        "SensorID": sensor["objid"],
+        "Channel": ch["Channel"],
+        "LastValue": ch["LastValue"],
+        "Unit": ch["Unit"]
+    } for ch in channels]
+
+
+def leer_dispositivos(texto):
+    if os.path.isfile(texto):
+        with open(texto, encoding="utf-8") as f:
+            texto = f.read()
+
+    ids = []
+    vistos = set()
+    for token in texto.replace("\n", ",").split(","):
+        token = token.strip()
+        if token.isdigit() and token not in vistos:
+            vistos.add(token)
+            ids.append(token)
+    return ids
+
+
+# =============== MAIN =================
+def main():
+    entrada = input("Ingresa los Device ID separados por coma o la ruta de un archivo con IDs: ").strip()
+
+    device_ids = leer_dispositivos(entrada)
+    if not device_ids:
+        print("Device ID inválido")
+        return
+
+    with perfil.etapa("inventario"):
+        sensors = get_all_sensors(device_ids)
+    if not sensors:
+        print("No se encontraron sensores")
+        return
+
+    total_filas = 0
+
+    # Las consultas de canales de todos los dispositivos comparten un mismo pool;
+    # map conserva el orden y la cola escribe en segundo plano a medida que llegan.
+    print(f"\nObteniendo canales con {MAX_WORKERS} workers y exportando a {', '.join(SALIDAS)} ...")
+    cola = ColaEscritura(crear_salidas(SALIDAS, os.path.splitext(OUTPUT_FILE)[0], "Canales_PRTG", hoja="Canales"))
+    cola.iniciar()
+    progreso = registro.Progreso(len(sensors), log=log)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for filas in executor.map(canales_de, sensors):
+            cola.enviar(filas)
+            total_filas += len(filas)
+            progreso.avanzar()
+
+    cola.cerrar()
+    progreso.terminar()
+    print(f"Exportación completada | Dispositivos: {len(device_ids)} | Registros: {total_filas}")
+    transferencia.reporte()
+
+if __name__ == "__main__":
+    with perfil.sesion():
+        main()
+
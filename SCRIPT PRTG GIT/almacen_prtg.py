@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Almacén local de históricos PRTG en archivos memory-mapped.
+#
+# Por sensor e intervalo (avg) hay tres archivos en ALMACEN_DIR:
+#   <sensor>_<avg>.est   1 byte por slot: estado del slot (ver constantes)
+#   <sensor>_<avg>.val   4 float32 por slot: los cuatro primeros value_raw (NaN si vacío)
+#   <sensor>_<avg>.idx   índice de tiempo: primer slot y cantidad de slots
+#
+# Un slot es un intervalo de `avg` segundos contado desde la época OLE de
+# PRTG, así que el offset de cualquier fecha se calcula sin búsquedas y un
+# rango de fechas es un slice (memoryview) de los archivos mapeados.
+# Los slots están en UTC, como datetime_raw: sdate/edate (en ZONA_HORARIA,
+# ver historicos_prtg) se convierten antes de calcularlos, y la hora en
+# curso se toma del reloj UTC.
+# Se guardan los valores crudos y no la clasificación, para que cada script
+# aplique su propio criterio (latencia_max) al leer.
+
+import json
+import math
+import mmap
+import os
+import time
+from datetime import datetime, timedelta
+
+import historicos_prtg as hist
+import perfil_prtg as perfil
+import transferencia_prtg as transferencia
+import registro_prtg as registro
+
+ALMACEN_DIR = "almacen_prtg"
+VALORES_POR_SLOT = 4
+
+NO_DESCARGADO = 0   # Nunca se pidió a PRTG
+SIN_DATO = 1        # Se pidió y PRTG no devolvió registro
+OMITIDA = 2         # Registro con cobertura incompleta
+CON_DATOS = 3       # Registro completo, valores en .val
+
+FORMATO_FECHA_PRTG = "%Y-%m-%d-%H-%M-%S"
+
+log = registro.obtener("almacen")
+
+
+def slot_de(fecha, intervalo):
+    """Slot de un datetime UTC."""
+    return int((fecha - hist.EPOCA_OLE).total_seconds() // intervalo)
+
+
+def fecha_de_slot(slot, intervalo):
+    """datetime UTC del inicio de un slot."""
+    return hist.EPOCA_OLE + timedelta(seconds=slot * intervalo)
+
+
+def fecha_prtg(fecha_utc):
+    """sdate/edate para PRTG (en ZONA_HORARIA) a partir de un datetime UTC."""
+    return hist.utc_a_local(fecha_utc).strftime(FORMATO_FECHA_PRTG)
+
+
+class AlmacenSensor:
+    def __init__(self, sensor_id, intervalo, directorio=ALMACEN_DIR):
+        os.makedirs(directorio, exist_ok=True)
+        self.intervalo = intervalo
+        self.ruta = os.path.join(directorio, f"{sensor_id}_{intervalo}")
+        self.slot_inicio = 0
+        self.slots = 0
+        self._mapas = []
+
+        if os.path.exists(self.ruta + ".idx"):
+            with open(self.ruta + ".idx", encoding="utf-8") as f:
+                indice = json.load(f)
+            self.slot_inicio = indice["slot_inicio"]
+            self.slots = indice["slots"]
+            self._mapear()
+
+    # ---------- archivos ----------
+    def _mapear(self):
+        self._archivos = [open(self.ruta + ext, "r+b") for ext in (".est", ".val")]
+        self._mapas = [mmap.mmap(f.fileno(), 0) for f in self._archivos]
+        self.estados = memoryview(self._mapas[0])
+        self.valores = memoryview(self._mapas[1]).cast("f")
+
+    def _desmapear(self):
+        if not self._mapas:
+            return
+        self.estados.release()
+        self.valores.release()
+        for m in self._mapas:
+            m.close()
+        for f in self._archivos:
+            f.close()
+        self._mapas = []
+
+    def cerrar(self):
+        self._desmapear()
+
+    def _extender(self, a, b):
+        """Amplía los archivos para cubrir los slots [a, b), conservando lo ya guardado."""
+        if self.slots and a >= self.slot_inicio and b <= self.slot_inicio + self.slots:
+            return
+
+        nuevo_inicio = min(a, self.slot_inicio) if self.slots else a
+        nuevo_fin = max(b, self.slot_inicio + self.slots) if self.slots else b
+        nuevos = nuevo_fin - nuevo_inicio
+        delante = self.slot_inicio - nuevo_inicio if self.slots else 0
+
+        anteriores = []
+        if self.slots:
+            anteriores = [self._mapas[0][:], self._mapas[1][:]]
+        self._desmapear()
+
+        for ext, ancho, previo in ((".est", 1, 0), (".val", 4 * VALORES_POR_SLOT, 1)):
+            with open(self.ruta + ext + ".tmp", "wb") as f:
+                f.truncate(nuevos * ancho)
+                if anteriores:
+                    f.seek(delante * ancho)
+                    f.write(anteriores[previo])
+            os.replace(self.ruta + ext + ".tmp", self.ruta + ext)
+
+        self.slot_inicio = nuevo_inicio
+        self.slots = nuevos
+        with open(self.ruta + ".idx", "w", encoding="utf-8") as f:
+            json.dump({"slot_inicio": self.slot_inicio, "slots": self.slots, "intervalo": self.intervalo}, f)
+        self._mapear()
+
+    # ---------- escritura ----------
+    def marcar(self, a, b, estado):
+        self._extender(a, b)
+        i = a - self.slot_inicio
+        self.estados[i:i + (b - a)] = bytes([estado]) * (b - a)
+
+    def guardar(self, slot, estado, valores=()):
+        if not (self.slot_inicio <= slot < self.slot_inicio + self.slots):
+            return
+        i = slot - self.slot_inicio
+        self.estados[i] = estado
+        base = i * VALORES_POR_SLOT
+        for k in range(VALORES_POR_SLOT):
+            v = valores[k] if k < len(valores) and valores[k] is not None else math.nan
+            self.valores[base + k] = v
+
+    def vaciar(self):
+        for m in self._mapas:
+            m.flush()
+
+    # ---------- lectura ----------
+    def huecos(self, a, b):
+        """Rangos [x, y) de slots dentro de [a, b) que nunca se pidieron a PRTG."""
+        huecos = []
+        inicio = None
+        for slot in range(a, b):
+            i = slot - self.slot_inicio
+            descargado = 0 <= i < self.slots and self.estados[i] != NO_DESCARGADO
+            if not descargado and inicio is None:
+                inicio = slot
+            elif descargado and inicio is not None:
+                huecos.append((inicio, slot))
+                inicio = None
+        if inicio is not None:
+            huecos.append((inicio, b))
+        return huecos
+
+    def vista(self, a, b):
+        """Slices sin copia de estados y valores para los slots [a, b)."""
+        i = a - self.slot_inicio
+        j = b - self.slot_inicio
+        return self.estados[i:j], self.valores[i * VALORES_POR_SLOT:j * VALORES_POR_SLOT]
+
+    def muestras(self, a, b, latencia_max=None, canales=None):
+        """Recorre los slots [a, b) como muestras clasificadas (estado, latencia, datetime_raw)."""
+        estados, valores = self.vista(a, b)
+        paso = self.intervalo / 86400
+        for i, estado in enumerate(estados):
+            if estado <= SIN_DATO:
+                continue
+            fecha_raw = (a + i) * paso
+            if estado == OMITIDA:
+                yield "omitida", None, fecha_raw
+            else:
+                base = i * VALORES_POR_SLOT
+                if canales is not None:
+                    resultado, latencia = canales.evaluar(valores[base:base + VALORES_POR_SLOT], latencia_max)
+                else:
+                    resultado, latencia = hist.estado_por_valores(valores[base:base + VALORES_POR_SLOT], latencia_max)
+                yield resultado, latencia, fecha_raw
+
+
+# ==========================
+# DESCARGA SOLO DE LOS HUECOS
+# ==========================
+def _descargar_hueco(almacen, url, params, a, b, cliente, max_retries, retry_delay, timeout):
+    params = dict(params,
+                  sdate=fecha_prtg(fecha_de_slot(a, almacen.intervalo)),
+                  edate=fecha_prtg(fecha_de_slot(b, almacen.intervalo) - timedelta(seconds=1)))
+    sensor = params.get("id")
+
+    for attempt in range(1, max_retries + 1):
+        try:
+            with perfil.etapa("fetch", sensor):
+                resp = hist.pedir_historico(cliente, url, params, timeout)
+            with resp:
+                almacen.marcar(a, b, SIN_DATO)
+                for registro in perfil.cronometrar_bucle(hist.iterar_histdata(resp), "parse", "store", sensor):
+                    completa, fecha_raw, valores = hist.extraer_muestra(registro)
+                    if fecha_raw is None:
+                        continue
+                    slot = int(round(fecha_raw * 86400) // almacen.intervalo)
+                    if a <= slot < b:
+                        almacen.guardar(slot, CON_DATOS if completa else OMITIDA, valores)
+                almacen.vaciar()
+                transferencia.registrar(resp, stream=True)
+                return True
+        except Exception as e:
+            if almacen.slots:
+                almacen.marcar(a, b, NO_DESCARGADO)   # Lo guardado a medias se vuelve a pedir
+            log.warning(f"Error al consultar historicdata (intento {attempt}/{max_retries}): {e}")
+            if attempt < max_retries:
+                time.sleep(retry_delay)
+    return False
+
+
+def resumir_con_almacen(url, params, max_retries=3, retry_delay=5, latencia_max=None, timeout=60,
+                        session=None, directorio=ALMACEN_DIR, mantenimiento=None, canales=None, periodos=None):
+    """
+    Igual que historicos_prtg.resumir_historico, pero solo pide a PRTG los
+    tramos del rango que no están en el almacén local y calcula el resumen
+    desde los archivos mapeados. Los slots de la hora en curso (o futuros)
+    no se guardan ni se cuentan, porque todavía pueden cambiar. Los datos
+    crudos (avg=0) no tienen slots fijos, y los sensores cuyo canal está
+    más allá de los VALORES_POR_SLOT guardados tampoco se pueden evaluar
+    desde el almacén: en esos casos se pide siempre a PRTG.
+    """
+    import requests
+    cliente = session or requests
+
+    intervalo = int(params.get("avg", 3600))
+    if not intervalo or (canales is not None and canales.cantidad > VALORES_POR_SLOT):
+        return hist.resumir_historico(url, params, max_retries, retry_delay, latencia_max, timeout,
+                                      session, mantenimiento, canales, periodos)
+    inicio = hist.local_a_utc(datetime.strptime(params["sdate"], FORMATO_FECHA_PRTG))
+    fin = hist.local_a_utc(datetime.strptime(params["edate"], FORMATO_FECHA_PRTG))
+
+    a = slot_de(inicio, intervalo)
+    b = min(slot_de(fin, intervalo) + 1, slot_de(hist.ahora_utc(), intervalo))
+    if b <= a:
+        if periodos is not None:
+            return [hist.resumir_muestras(iter(()), intervalo) for _ in periodos]
+        return hist.resumir_muestras(iter(()), intervalo)
+
+    almacen = AlmacenSensor(params["id"], intervalo, directorio)
+    try:
+        huecos = almacen.huecos(a, b)
+        if huecos:
+            log.debug(f"Almacén local: descargando {len(huecos)} tramo(s) faltante(s)")
+        for x, y in huecos:
+            if not _descargar_hueco(almacen, url, params, x, y, cliente, max_retries, retry_delay, timeout):
+                return None
+
+        with perfil.etapa("compute", params.get("id")):
+            muestras = almacen.muestras(a, b, latencia_max, canales)
+            if periodos is not None:
+                return hist.resumir_periodos(muestras, periodos, intervalo, mantenimiento)
+            return hist.resumir_muestras(muestras, intervalo, mantenimiento)
+    finally:
+        almacen.cerrar()
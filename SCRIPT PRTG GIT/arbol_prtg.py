@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Árbol de probes, grupos y dispositivos de PRTG en memoria.
+#
+#   arbol = descargar_arbol(consultar_tabla)        # pocas consultas paginadas
+#   grupos = arbol.resolver("1234, Sucursal*, Region1/Core*")
+#   sensores, referencias = arbol.sensores_unicos(grupos, obtener_sensores)
+#
+# consultar_tabla(params) la pone cada script: llama a table.json con sus
+# credenciales y reintentos y devuelve el JSON (o None).
+#
+# Cada nodo guarda su posición de entrada y salida en un recorrido en
+# profundidad: un nodo está en el subárbol de g si su entrada cae en
+# [entrada(g), salida(g)). Los dispositivos quedan ordenados por entrada,
+# así los de cualquier subárbol son un slice (dos búsquedas binarias).
+
+from bisect import bisect_left
+from fnmatch import fnmatchcase
+import registro_prtg as registro
+
+PAGINA = 2500               # Filas por página de table.json
+PADRES_POR_CONSULTA = 50    # Dispositivos por consulta de sensores (filter_parentid repetido)
+
+log = registro.obtener("arbol")
+
+
+# ==========================
+# CONSULTAS
+# ==========================
+def paginar(consultar_tabla, content, columnas, **filtros):
+    """Todas las filas de un content de table.json, página a página, sin repetidos."""
+    filas = []
+    vistos = set()
+    inicio = 0
+    while True:
+        data = consultar_tabla(dict(filtros, content=content, columns=columnas, count=PAGINA, start=inicio))
+        if data is None:
+            raise RuntimeError(f"No se pudo consultar {content} (start={inicio})")
+        lote = data.get(content, [])
+        nuevas = [f for f in lote if f.get("objid") not in vistos]
+        for f in nuevas:
+            vistos.add(f.get("objid"))
+        filas.extend(nuevas)
+        if not nuevas or len(lote) < PAGINA:
+            return filas
+        inicio += PAGINA
+
+
+def sensores_de_dispositivos(consultar_tabla, dispositivos, columnas):
+    """Sensores de una lista de dispositivos, de a PADRES_POR_CONSULTA por consulta."""
+    dispositivos = list(dispositivos)
+    sensores = []
+    for i in range(0, len(dispositivos), PADRES_POR_CONSULTA):
+        sensores.extend(paginar(consultar_tabla, "sensors", columnas,
+                                filter_parentid=dispositivos[i:i + PADRES_POR_CONSULTA]))
+    return sensores
+
+
+def descargar_arbol(consultar_tabla):
+    grupos = paginar(consultar_tabla, "groups", "objid,name,parentid,probe")
+    dispositivos = paginar(consultar_tabla, "devices", "objid,name,parentid,probe,host")
+    arbol = ArbolPRTG(grupos, dispositivos)
+    print(f"Árbol PRTG: {arbol.cantidad('probe')} probes, {arbol.cantidad('grupo')} grupos, "
+          f"{arbol.cantidad('dispositivo')} dispositivos")
+    return arbol
+
+
+# ==========================
+# ÍNDICE DEL ÁRBOL
+# ==========================
+class ArbolPRTG:
+    """
+    nodos: objid -> {"nombre", "tipo" (probe, grupo, dispositivo), "padre"}.
+    Los grupos colgados de la raíz (ID 0) son probes; si un probe no vino
+    en content=groups se agrega a partir de la columna "probe" de sus hijos.
+    """
+
+    def __init__(self, grupos, dispositivos):
+        self.nodos = {}
+        for g in grupos:
+            self.nodos[int(g["objid"])] = {"nombre": g.get("name", ""), "tipo": "grupo",
+                                           "padre": _id(g.get("parentid"))}
+        for g in grupos:
+            padre = _id(g.get("parentid"))
+            if padre and padre not in self.nodos and g.get("probe"):
+                self.nodos[padre] = {"nombre": g["probe"], "tipo": "probe", "padre": None}
+        for d in dispositivos:
+            self.nodos[int(d["objid"])] = {"nombre": d.get("name", ""), "tipo": "dispositivo",
+                                           "padre": _id(d.get("parentid")), "host": d.get("host")}
+        # Los grupos colgados de la raíz (ID 0) son probes
+        for nodo in self.nodos.values():
+            if nodo["tipo"] == "grupo" and nodo["padre"] == 0:
+                nodo["tipo"] = "probe"
+
+        self.hijos = {}
+        raices = []
+        for objid, nodo in self.nodos.items():
+            if nodo["padre"] in self.nodos:
+                self.hijos.setdefault(nodo["padre"], []).append(objid)
+            else:
+                raices.append(objid)
+        self._numerar(raices)
+
+    def _numerar(self, raices):
+        """Recorrido en profundidad iterativo: entrada/salida de cada nodo y dispositivos en orden."""
+        self.entrada = {}
+        self.salida = {}
+        self._dispositivos = []
+        self._entradas_dispositivos = []
+        contador = 0
+        pila = [(objid, False) for objid in reversed(raices)]
+        while pila:
+            objid, cerrar = pila.pop()
+            if cerrar:
+                self.salida[objid] = contador
+                continue
+            self.entrada[objid] = contador
+            if self.nodos[objid]["tipo"] == "dispositivo":
+                self._dispositivos.append(objid)
+                self._entradas_dispositivos.append(contador)
+            contador += 1
+            pila.append((objid, True))
+            pila.extend((hijo, False) for hijo in reversed(self.hijos.get(objid, ())))
+
+    def cantidad(self, tipo):
+        return sum(1 for n in self.nodos.values() if n["tipo"] == tipo)
+
+    def contiene(self, grupo, objid):
+        return self.entrada[grupo] <= self.entrada[objid] < self.salida[grupo]
+
+    def dispositivos_de(self, objid):
+        """IDs de los dispositivos del subárbol de objid (incluido él mismo si es un dispositivo)."""
+        lo = bisect_left(self._entradas_dispositivos, self.entrada[objid])
+        hi = bisect_left(self._entradas_dispositivos, self.salida[objid])
+        return self._dispositivos[lo:hi]
+
+    def ancestros(self, objid):
+        """IDs de los grupos y probes por encima de objid, del más cercano a la raíz."""
+        resultado = []
+        padre = self.nodos[objid]["padre"]
+        while padre in self.nodos:
+            resultado.append(padre)
+            padre = self.nodos[padre]["padre"]
+        return resultado
+
+    def ruta(self, objid):
+        nombres = [self.nodos[a]["nombre"] for a in reversed(self.ancestros(objid))]
+        return "/".join(nombres + [self.nodos[objid]["nombre"]])
+
+    def buscar(self, patron, tipos=("probe", "grupo")):
+        """
+        Nodos cuyo nombre cumple el patrón (comodines * y ?, sin distinguir
+        mayúsculas). Con "/" el patrón se compara con el final de la ruta,
+        p. ej. "Region1/Sucursal*".
+        """
+        patron = patron.lower()
+        if "/" not in patron:
+            return [objid for objid, nodo in self.nodos.items()
+                    if nodo["tipo"] in tipos and fnmatchcase(nodo["nombre"].lower(), patron)]
+        patrones = (patron, "*/" + patron.lstrip("/"))
+        return [
+            objid for objid, nodo in self.nodos.items()
+            if nodo["tipo"] in tipos
+            and any(fnmatchcase(self.ruta(objid).lower(), p) for p in patrones)
+        ]
+
+    def resolver(self, texto):
+        """Lista separada por comas de IDs y patrones de nombre -> IDs de grupo/probe, sin repetir."""
+        seleccion = []
+        for token in texto.split(","):
+            token = token.strip()
+            if not token:
+                continue
+            if token.isdigit():
+                encontrados = [int(token)] if int(token) in self.nodos else []
+            else:
+                encontrados = self.buscar(token)
+            if not encontrados:
+                log.warning(f"Sin coincidencias en el árbol para '{token}'")
+            for objid in encontrados:
+                log.info(f"  {token} → {self.ruta(objid)} ({objid}, {len(self.dispositivos_de(objid))} dispositivos)")
+            for objid in encontrados:
+                if objid not in seleccion:
+                    seleccion.append(objid)
+        return seleccion
+
+    def sensores_unicos(self, grupos, obtener_sensores):
+        """
+        Como historicos_prtg.sensores_unicos, pero con una sola tanda de
+        consultas para los dispositivos de todos los subárboles elegidos:
+        obtener_sensores(ids de dispositivo) devuelve sensores con parentid.
+        """
+        dispositivos = sorted({d for g in grupos for d in self.dispositivos_de(g)})
+        por_dispositivo = {}
+        for s in obtener_sensores(dispositivos):
+            por_dispositivo.setdefault(_id(s.get("parentid")), []).append(s)
+
+        unicos = {}
+        referencias = []
+        for g in grupos:
+            for d in self.dispositivos_de(g):
+                for s in por_dispositivo.get(d, ()):
+                    unicos.setdefault(s["objid"], s)
+                    referencias.append((g, s["objid"]))
+        return list(unicos.values()), referencias
+
+    def grupos_por_sensor(self, sensores):
+        """objid del sensor -> todos los grupos y probes por encima de su dispositivo."""
+        return {
+            s["objid"]: self.ancestros(_id(s.get("parentid")))
+            for s in sensores if _id(s.get("parentid")) in self.nodos
+        }
+
+
+def _id(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Evaluación de disponibilidad por canal, para sensores que no son Ping.
+#
+# Cada tipo de sensor tiene un mapa de canales (MAPAS_CANALES): el canal
+# que decide si la muestra está up (tiene valor numérico) y el canal que se
+# toma como latencia en ms (puede no haber). Los nombres admiten comodines
+# y se prueban en orden; se comparan sin distinguir mayúsculas.
+#
+# historicdata.json trae un value_raw por canal, en el orden de los IDs de
+# canal (sin los canales internos de ID negativo, como Downtime). Por eso
+# los índices de cada sensor se resuelven una sola vez desde su
+# content=channels, y después cada registro se evalúa por posición:
+#
+#   evaluador = EvaluadorCanales(consultar_tabla, ["ping", "http"], archivo="almacen_prtg/canales.json")
+#   canales = evaluador.de_sensor(sensor)     # CanalesSensor o None
+#   estado, latencia = canales.evaluar(valores, latencia_max)
+#   evaluador.guardar()                       # índices resueltos para la próxima ejecución
+#
+# Los tipos con orden de canales fijo ("fijo" en el mapa, como Ping: Ping
+# Time es siempre el canal 0) no consultan content=channels. Los demás se
+# consultan una vez por sensor y, con `archivo`, se recuerdan entre
+# ejecuciones: un informe repetido no vuelve a pedirlos a PRTG.
+
+import json
+import os
+import threading
+from fnmatch import fnmatchcase
+import registro_prtg as registro
+
+MAPAS_CANALES = {
+    "ping": {
+        "tipos": ("ping",),
+        "estado": ("ping time", "tiempo de ping"),
+        "latencia": ("ping time", "tiempo de ping"),
+        "fijo": (0, 0)   # (estado, latencia): Ping Time es el canal 0 en todos los Ping
+    },
+    "http": {
+        "tipos": ("http",),
+        "estado": ("loading time", "tiempo de carga", "response time", "tiempo de respuesta"),
+        "latencia": ("loading time", "tiempo de carga", "response time", "tiempo de respuesta")
+    },
+    "port": {
+        "tipos": ("port",),
+        "estado": ("response time", "tiempo de respuesta", "available", "disponible"),
+        "latencia": ("response time", "tiempo de respuesta")
+    },
+    "snmp": {
+        "tipos": ("snmp",),
+        "estado": ("traffic total", "tráfico total", "system uptime", "tiempo de actividad*",
+                   "response time", "tiempo de respuesta", "*"),
+        "latencia": ("response time", "tiempo de respuesta")
+    }
+}
+
+CANALES_ARCHIVO = "canales.json"   # Índices resueltos, dentro de la carpeta del almacén local
+
+log = registro.obtener("canales")
+
+
+# ==========================
+# EVALUACIÓN POR ÍNDICE
+# ==========================
+class CanalesSensor:
+    """
+    Posiciones, dentro de los value_raw de un registro de histdata, del
+    canal de estado y del de latencia (None si el tipo no tiene).
+    `cantidad` es cuántos value_raw hay que leer de cada registro.
+    """
+
+    def __init__(self, estado, latencia=None):
+        self.estado = estado
+        self.latencia = latencia
+        self.cantidad = max(estado, -1 if latencia is None else latencia) + 1
+
+    def evaluar(self, valores, latencia_max=None):
+        """('up' | 'down', latencia en ms o None) a partir de los value_raw ya convertidos a float."""
+        if self.estado >= len(valores):
+            return "down", None
+        valor = valores[self.estado]
+        if valor is None or valor != valor:   # None o NaN
+            return "down", None
+        if self.latencia is None or self.latencia >= len(valores):
+            return "up", None
+
+        latencia = valores[self.latencia]
+        if latencia is None or latencia != latencia:
+            return "up", None
+        if latencia_max is not None and not (0 <= latencia < latencia_max):
+            return "down", None
+        return "up", latencia
+
+
+def _indice(nombres, patrones):
+    for patron in patrones:
+        for i, nombre in enumerate(nombres):
+            if fnmatchcase(nombre, patron):
+                return i
+    return None
+
+
+def resolver_canales(canales, mapa):
+    """
+    CanalesSensor para las filas de content=channels (objid, name) de un
+    sensor, o None si ningún canal cumple el mapa.
+    """
+    ordenados = sorted((int(c["objid"]), str(c.get("name", "")).strip().lower())
+                       for c in canales if str(c.get("objid", "")).lstrip("-").isdigit())
+    nombres = [nombre for objid, nombre in ordenados if objid >= 0]
+    estado = _indice(nombres, mapa["estado"])
+    if estado is None:
+        return None
+    return CanalesSensor(estado, _indice(nombres, mapa["latencia"]))
+
+
+# ==========================
+# TIPOS Y CACHÉ POR SENSOR
+# ==========================
+def tipo_de_sensor(sensor, tipos=MAPAS_CANALES):
+    """
+    Clave de MAPAS_CANALES que corresponde al sensor, según su columna
+    type (o, si no vino, su nombre); None si no es de ningún tipo mapeado.
+    """
+    texto = str(sensor.get("type_raw") or sensor.get("type") or sensor.get("sensor") or "").lower()
+    for tipo in tipos:
+        if any(t in texto for t in MAPAS_CANALES[tipo]["tipos"]):
+            return tipo
+    return None
+
+
+class EvaluadorCanales:
+    """
+    Resuelve y guarda los índices de canal de cada sensor; se consulta
+    content=channels una sola vez por sensor aunque se pidan varios rangos,
+    y con `archivo` una sola vez entre ejecuciones. Es seguro entre hilos.
+    """
+
+    def __init__(self, consultar_tabla, tipos=("ping",), archivo=None):
+        desconocidos = [t for t in tipos if t not in MAPAS_CANALES]
+        if desconocidos:
+            raise ValueError(f"Tipos de sensor sin mapa de canales: {', '.join(desconocidos)} "
+                             f"(válidos: {', '.join(MAPAS_CANALES)})")
+        self.consultar_tabla = consultar_tabla
+        self.tipos = tuple(tipos)
+        self.archivo = archivo
+        self._cache = {}
+        self._guardados = self._leer_archivo()
+        self._nuevos = 0
+        self._lock = threading.Lock()
+
+    def tipo(self, sensor):
+        return tipo_de_sensor(sensor, self.tipos)
+
+    def de_sensor(self, sensor):
+        sid = sensor.get("objid")
+        with self._lock:
+            if sid in self._cache:
+                return self._cache[sid]
+
+        tipo = self.tipo(sensor)
+        canales = None
+        if tipo is not None:
+            canales = self._conocidos(str(sid), tipo)
+        if tipo is not None and canales is None:
+            data = self.consultar_tabla({"content": "channels", "columns": "objid,name", "id": sid})
+            if data is None:
+                log.warning(f"Sensor {sid}: no se pudieron leer sus canales")
+                return None   # No se guarda: se reintenta en el próximo rango
+            canales = resolver_canales(data.get("channels", []), MAPAS_CANALES[tipo])
+            if canales is None:
+                log.warning(f"Sensor {sid} ({tipo}): ningún canal coincide con el mapa, se omite")
+            else:
+                with self._lock:
+                    self._guardados[str(sid)] = {"tipo": tipo, "estado": canales.estado,
+                                                 "latencia": canales.latencia}
+                    self._nuevos += 1
+
+        with self._lock:
+            self._cache[sid] = canales
+        return canales
+
+    def _conocidos(self, sid, tipo):
+        """Índices sin consultar a PRTG: los fijos del tipo o los guardados en `archivo`."""
+        fijo = MAPAS_CANALES[tipo].get("fijo")
+        if fijo is not None:
+            return CanalesSensor(*fijo)
+        guardado = self._guardados.get(sid)
+        if guardado and guardado.get("tipo") == tipo:
+            return CanalesSensor(guardado["estado"], guardado.get("latencia"))
+        return None
+
+    # ---------- persistencia ----------
+    def _leer_archivo(self):
+        if not self.archivo or not os.path.exists(self.archivo):
+            return {}
+        try:
+            with open(self.archivo, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning(f"No se pudo leer {self.archivo}: {e} (se vuelven a consultar los canales)")
+            return {}
+
+    def guardar(self):
+        """Escribe en `archivo` los índices resueltos en esta ejecución (si hubo nuevos)."""
+        if not self.archivo or not self._nuevos:
+            return
+        with self._lock:
+            datos = dict(self._guardados)
+            self._nuevos = 0
+        directorio = os.path.dirname(self.archivo)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        temporal = self.archivo + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(datos, f)
+        os.replace(temporal, self.archivo)
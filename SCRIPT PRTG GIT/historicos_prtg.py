@@ -0,0 +1,935 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Funciones compartidas por los scripts de disponibilidad: selección de
+# sensores y lectura incremental de historicdata.json.
+#
+# PRTG repite las claves "value" / "value_raw" una vez por canal dentro de
+# cada registro de histdata, por eso los registros se entregan como listas
+# de pares (clave, valor) y no como dict: así no se pierden canales.
+#
+# Reloj: datetime_raw (y todo índice en días o segundos OLE: slots del
+# almacén, períodos, ventanas de mantenimiento) está en UTC. Las fechas
+# legibles (sdate/edate, Fecha inicio/fin, el CSV de mantenimientos, los
+# días de los rollups y los cortes guardados) están en ZONA_HORARIA, que
+# debe ser la zona de la cuenta de PRTG.
+
+import codecs
+import json
+import math
+import re
+import time
+from bisect import bisect_left
+from functools import lru_cache
+import threading
+import requests
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+import perfil_prtg as perfil
+import transferencia_prtg as transferencia
+import registro_prtg as registro
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+CHUNK_SIZE = 64 * 1024
+COBERTURA_MINIMA = 10000   # coverage_raw de una hora completa
+EPOCA_OLE = datetime(1899, 12, 30)
+ZONA_HORARIA = None         # Zona de las fechas legibles, p. ej. "America/Bogota"; None = la de este equipo
+SKETCH_ALPHA = 0.01         # Error relativo máximo de los percentiles de latencia
+
+DUPLICAR_LENTAS = True      # Envía una copia de las peticiones más lentas que HEDGE_PERCENTIL
+HEDGE_PERCENTIL = 0.95
+HEDGE_MIN_MUESTRAS = 20     # Hasta tener estas respuestas se usa HEDGE_UMBRAL_INICIAL
+HEDGE_UMBRAL_INICIAL = 10.0 # Segundos
+CIRCUITO_VENTANA = 20       # Últimas llamadas que cuentan para la tasa de error
+CIRCUITO_TASA_ERROR = 0.5   # Con más errores que esto el circuito se abre
+CIRCUITO_ENFRIAMIENTO = 30  # Segundos sin llamar a PRTG antes de volver a probar
+
+HUECO_MAX_CRUDO = 900       # avg=0: un escaneo pesa hasta el siguiente, como mucho estos segundos
+TRAMO_CRUDO_DIAS = 30       # avg=0: el rango se pide en tramos de estos días (PRTG limita los datos crudos)
+
+log = registro.obtener("historicos")
+
+
+# ==========================
+# SELECCIÓN DE SENSORES
+# ==========================
+def sensores_unicos(grupos, obtener_sensores):
+    """
+    Consulta los sensores de cada grupo y los deduplica por objid, para no
+    descargar dos veces el histórico de un sensor que aparece en grupos
+    solapados (o en un grupo y su subgrupo). Devuelve los sensores únicos y
+    la lista ordenada de referencias (grupo, objid) para repartir después
+    cada resultado a todas las filas de grupo que lo incluyen.
+    """
+    unicos = {}
+    referencias = []
+    for gid in grupos:
+        for s in obtener_sensores(gid):
+            unicos.setdefault(s["objid"], s)
+            referencias.append((gid, s["objid"]))
+    return list(unicos.values()), referencias
+
+
+def repartir_resultados(referencias, resultados_por_id):
+    """Una fila por referencia (grupo, objid), reutilizando el resultado calculado una sola vez."""
+    return [resultados_por_id[oid] for _, oid in referencias if oid in resultados_por_id]
+
+
+# ==========================
+# DECODIFICACIÓN INCREMENTAL
+# ==========================
+def _iterar_con_ijson(response):
+    response.raw.decode_content = True
+    registro = None
+    clave = None
+
+    for prefijo, evento, valor in ijson.parse(response.raw, use_float=True):
+        if prefijo == "histdata.item":
+            if evento == "start_map":
+                registro = []
+            elif evento == "map_key":
+                clave = valor
+            elif evento == "end_map":
+                yield registro
+                registro = None
+        elif registro is not None and evento in ("string", "number", "boolean", "null"):
+            registro.append((clave, valor))
+
+
+def _iterar_por_bloques(response):
+    decoder = json.JSONDecoder(object_pairs_hook=list)
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    dentro = False
+
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        buffer += utf8.decode(chunk)
+
+        if not dentro:
+            inicio = buffer.find('"histdata"')
+            if inicio == -1:
+                buffer = buffer[-len('"histdata"'):]
+                continue
+            corchete = buffer.find("[", inicio)
+            if corchete == -1:
+                buffer = buffer[inicio:]
+                continue
+            buffer = buffer[corchete + 1:]
+            dentro = True
+
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == "]":
+                return
+            try:
+                registro, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # Registro incompleto: esperar el siguiente bloque
+            yield registro
+
+        buffer = buffer[pos:]
+
+
+def iterar_histdata(response):
+    """
+    Recorre los registros de histdata de una respuesta abierta con
+    stream=True sin cargar el documento completo. Usa ijson si está
+    instalado; si no, un parser por bloques con la librería json.
+    """
+    if ijson is not None:
+        return _iterar_con_ijson(response)
+    return _iterar_por_bloques(response)
+
+
+# ==========================
+# PERCENTILES DE LATENCIA (DDSketch)
+# ==========================
+class SketchLatencia:
+    """
+    Sketch de cuantiles tipo DDSketch: agrupa cada latencia en un bin
+    logarítmico, así p50/p95/p99 tienen un error relativo de a lo sumo
+    SKETCH_ALPHA con unos cientos de bins por sensor. Dos sketches se
+    combinan sumando bins, por eso los percentiles de grupo y totales
+    salen de combinar sketches, sin volver a recorrer muestras.
+    """
+
+    def __init__(self, alpha=SKETCH_ALPHA):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.ceros = 0
+        self.n = 0
+
+    def agregar(self, valor):
+        if valor <= 0:
+            self.ceros += 1
+        else:
+            k = math.ceil(math.log(valor) / self.log_gamma)
+            self.bins[k] = self.bins.get(k, 0) + 1
+        self.n += 1
+
+    def combinar(self, otro):
+        if otro.alpha != self.alpha:
+            raise ValueError("No se pueden combinar sketches con distinto alpha")
+        for k, cantidad in otro.bins.items():
+            self.bins[k] = self.bins.get(k, 0) + cantidad
+        self.ceros += otro.ceros
+        self.n += otro.n
+        return self
+
+    def cuantil(self, q):
+        if not self.n:
+            return None
+        rango = q * (self.n - 1)
+        acumulado = self.ceros
+        if rango < acumulado:
+            return 0.0
+        for k in sorted(self.bins):
+            acumulado += self.bins[k]
+            if acumulado > rango:
+                return round(2 * self.gamma ** k / (self.gamma + 1), 2)
+        return None
+
+    def percentiles(self):
+        return {"p50": self.cuantil(0.50), "p95": self.cuantil(0.95), "p99": self.cuantil(0.99)}
+
+    def a_json(self):
+        return json.dumps({"alpha": self.alpha, "ceros": self.ceros, "bins": self.bins}, separators=(",", ":"))
+
+    @classmethod
+    def desde_json(cls, texto):
+        datos = json.loads(texto)
+        sketch = cls(datos["alpha"])
+        sketch.bins = {int(k): v for k, v in datos["bins"].items()}
+        sketch.ceros = datos["ceros"]
+        sketch.n = sketch.ceros + sum(sketch.bins.values())
+        return sketch
+
+
+def combinar_sketches(sketches):
+    total = SketchLatencia()
+    for sketch in sketches:
+        if sketch is not None:
+            total.combinar(sketch)
+    return total
+
+
+# ==========================
+# CLASIFICACIÓN DE MUESTRAS
+# ==========================
+def _a_float(valor):
+    if isinstance(valor, str):
+        valor = valor.strip()
+        if valor == "":
+            return None
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+# ==========================
+# RELOJ (UTC / ZONA_HORARIA)
+# ==========================
+def local_a_utc(fecha):
+    """datetime sin zona en ZONA_HORARIA -> datetime sin zona en UTC."""
+    con_zona = fecha.replace(tzinfo=ZoneInfo(ZONA_HORARIA)) if ZONA_HORARIA else fecha.astimezone()
+    return con_zona.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def utc_a_local(fecha):
+    """datetime sin zona en UTC -> datetime sin zona en ZONA_HORARIA."""
+    zona = ZoneInfo(ZONA_HORARIA) if ZONA_HORARIA else None
+    return fecha.replace(tzinfo=timezone.utc).astimezone(zona).replace(tzinfo=None)
+
+
+def ahora_utc():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def ole_de_local(fecha):
+    """Días OLE (la unidad de datetime_raw) de una fecha legible."""
+    return (local_a_utc(fecha) - EPOCA_OLE).total_seconds() / 86400
+
+
+def fecha_ole(fecha_raw):
+    """Convierte datetime_raw de PRTG (días desde 1899-12-30, UTC) a datetime UTC."""
+    return EPOCA_OLE + timedelta(seconds=round(fecha_raw * 86400))
+
+
+def fecha_local_ole(fecha_raw):
+    """datetime_raw -> datetime en ZONA_HORARIA, para guardar o mostrar."""
+    return utc_a_local(fecha_ole(fecha_raw))
+
+
+@lru_cache(maxsize=65536)
+def _dia_de_hora(hora, zona):
+    return utc_a_local(EPOCA_OLE + timedelta(hours=hora)).date()
+
+
+def dia_local(segundos):
+    """
+    Día en ZONA_HORARIA de un instante en segundos OLE. El desfase solo
+    cambia en horas enteras, así que se calcula una vez por hora.
+    """
+    return _dia_de_hora(int(segundos // 3600), ZONA_HORARIA)
+
+
+def extraer_muestra(registro, cantidad=4):
+    """
+    Devuelve (cobertura_completa, datetime_raw, valores) de un registro de
+    histdata, con los `cantidad` primeros value_raw convertidos a float
+    (None si vienen vacíos).
+    """
+    cobertura = 0
+    fecha = None
+    fecha_raw = None
+    valores = []
+
+    for clave, valor in registro:
+        if clave == "value_raw":
+            if len(valores) < cantidad:
+                valores.append(_a_float(valor))
+        elif clave == "coverage_raw":
+            cobertura = valor or 0
+        elif clave == "datetime":
+            fecha = valor
+        elif clave == "datetime_raw":
+            fecha_raw = _a_float(valor)
+
+    return cobertura >= COBERTURA_MINIMA and bool(fecha), fecha_raw, valores
+
+
+def estado_por_valores(valores, latencia_max=None):
+    """
+    'up' si alguno de los valores es un número (y está por debajo de
+    latencia_max, si se indica); ese valor se devuelve como latencia en ms.
+    """
+    for latencia in valores:
+        if latencia is None or latencia != latencia:   # None o NaN
+            continue
+        if latencia_max is not None and not (0 <= latencia < latencia_max):
+            continue
+        return "up", latencia
+    return "down", None
+
+
+def clasificar_muestra(registro, latencia_max=None, canales=None):
+    """
+    Clasifica un registro de histdata: ('omitida' | 'up' | 'down', latencia,
+    datetime_raw). Con `canales` (canales_prtg.CanalesSensor) se leen solo
+    los canales del mapa del sensor, por posición; sin él, los cuatro
+    primeros valores como en los sensores Ping.
+    """
+    completa, fecha_raw, valores = extraer_muestra(registro, canales.cantidad if canales else 4)
+    if not completa:
+        return "omitida", None, fecha_raw
+
+    if canales is not None:
+        estado, latencia = canales.evaluar(valores, latencia_max)
+    else:
+        estado, latencia = estado_por_valores(valores, latencia_max)
+    return estado, latencia, fecha_raw
+
+
+def cortes_a_intervalos(cortes, intervalo):
+    """
+    Expande los cortes RLE [inicio_raw, muestras] a (inicio, fin, duración
+    en minutos, muestras). Los cortes de datos crudos traen la duración en
+    segundos como tercer elemento.
+    """
+    intervalos = []
+    for corte in cortes:
+        inicio_raw, muestras = corte[0], corte[1]
+        inicio = fecha_local_ole(inicio_raw)
+        duracion = timedelta(seconds=corte[2] if len(corte) > 2 else muestras * intervalo)
+        intervalos.append((inicio, inicio + duracion, int(duracion.total_seconds() // 60), muestras))
+    return intervalos
+
+
+def resumir_histdata(registros, latencia_max=None, intervalo=3600, mantenimiento=None, canales=None,
+                     periodos=None):
+    """Clasifica y resume registros de histdata (ver resumir_muestras y resumir_periodos)."""
+    muestras = (clasificar_muestra(r, latencia_max, canales) for r in registros)
+    if periodos is not None:
+        return resumir_periodos(muestras, periodos, intervalo, mantenimiento)
+    return resumir_muestras(muestras, intervalo, mantenimiento)
+
+
+def resumir_periodos(muestras, periodos, intervalo=3600, mantenimiento=None):
+    """
+    Un resumen por período (desde, hasta) en días OLE, con desde <= t < hasta;
+    los períodos pueden solaparse (mes, trimestre, año). Las muestras se
+    clasifican una sola vez y quedan ordenadas por fecha, así cada período
+    es un slice (dos búsquedas binarias) y no se vuelve a recorrer el resto.
+    """
+    ordenadas = sorted((m for m in muestras if m[2] is not None), key=lambda m: m[2])
+    fechas = [m[2] for m in ordenadas]
+    return [
+        resumir_muestras(ordenadas[bisect_left(fechas, desde):bisect_left(fechas, hasta)], intervalo, mantenimiento)
+        for desde, hasta in periodos
+    ]
+
+
+def resumir_muestras(muestras, intervalo=3600, mantenimiento=None):
+    """
+    Resume muestras ya clasificadas (estado, latencia, datetime_raw) en
+    contadores globales y por día. "por_dia" mapea
+    date -> [up, down, omitidas, suma de latencias, muestras con latencia,
+    segundos up, segundos down];
+    "sketch" guarda la distribución de latencias para los percentiles y
+    "cortes" los intervalos de caída codificados por longitud de racha:
+    [inicio_raw, nº de muestras down consecutivas de `intervalo` segundos].
+
+    Con `mantenimiento` (mantenimiento_prtg.Ventanas) las muestras que se
+    cruzan con una ventana no cuentan como up ni down ni entran en la
+    latencia: se suman en "muestras_mantenimiento" (y como omitidas en
+    por_dia, cuyos rollups no tienen columna propia).
+    """
+    estadisticas = {
+        "muestras_totales": 0,
+        "muestras_validas": 0,
+        "muestras_up": 0,
+        "muestras_down": 0,
+        "muestras_omitidas": 0,
+        "muestras_mantenimiento": 0
+    }
+    latencia_suma = 0.0
+    latencia_n = 0
+    por_dia = {}
+    sketch = SketchLatencia()
+    cortes = []
+    corte = None
+    paso = intervalo / 86400   # intervalo en días, la unidad de datetime_raw
+
+    for estado, latencia, fecha_raw in muestras:
+        estadisticas["muestras_totales"] += 1
+
+        dia = None
+        if fecha_raw is not None:
+            dia = por_dia.setdefault(dia_local(fecha_raw * 86400), [0, 0, 0, 0.0, 0, 0, 0])
+            if mantenimiento is not None:
+                inicio = round(fecha_raw * 86400)
+                if mantenimiento.cubre(inicio, inicio + intervalo):
+                    estado = "mantenimiento"
+
+        # Una racha de caída sigue abierta solo con muestras down contiguas
+        if estado == "down" and fecha_raw is not None:
+            if corte is None or abs(fecha_raw - (corte[0] + corte[1] * paso)) > paso / 2:
+                corte = [fecha_raw, 0]
+                cortes.append(corte)
+            corte[1] += 1
+        else:
+            corte = None
+
+        if estado == "mantenimiento":
+            estadisticas["muestras_mantenimiento"] += 1
+            dia[2] += 1
+            continue
+
+        if estado == "omitida":
+            estadisticas["muestras_omitidas"] += 1
+            if dia:
+                dia[2] += 1
+            continue
+
+        estadisticas["muestras_validas"] += 1
+        if estado == "up":
+            estadisticas["muestras_up"] += 1
+            if latencia is not None:   # Los canales sin latencia (p. ej. SNMP) solo cuentan como up
+                latencia_suma += latencia
+                latencia_n += 1
+                sketch.agregar(latencia)
+            if dia:
+                dia[0] += 1
+                dia[5] += intervalo
+                if latencia is not None:
+                    dia[3] += latencia
+                    dia[4] += 1
+        else:
+            estadisticas["muestras_down"] += 1
+            if dia:
+                dia[1] += 1
+                dia[6] += intervalo
+
+    segundos = {estado: estadisticas["muestras_" + clave] * intervalo
+                for estado, clave in (("up", "up"), ("down", "down"), ("omitida", "omitidas"),
+                                      ("mantenimiento", "mantenimiento"))}
+    return _completar(estadisticas, segundos, latencia_suma, latencia_n, por_dia, sketch, cortes)
+
+
+def _horas(segundos):
+    horas = round(segundos / 3600, 2)
+    return int(horas) if horas.is_integer() else horas
+
+
+def _completar(estadisticas, segundos, latencia_suma, latencia_n, por_dia, sketch, cortes):
+    """
+    Agrega al resumen lo común a datos promediados y crudos: segundos y
+    horas por estado, disponibilidad (segundos up / segundos up + down),
+    latencias, por_dia, sketch y cortes.
+    """
+    for estado, clave in (("up", "up"), ("down", "down"), ("omitida", "omitidas"),
+                          ("mantenimiento", "mantenimiento")):
+        estadisticas["segundos_" + clave] = segundos[estado]
+        estadisticas["horas_" + clave] = _horas(segundos[estado])
+    estadisticas["horas_totales"] = _horas(sum(segundos.values()))
+    validos = segundos["up"] + segundos["down"]
+    estadisticas["disponibilidad"] = round(100 * segundos["up"] / validos, 2) if validos else None
+
+    estadisticas["latencia_promedio"] = round(latencia_suma / latencia_n, 2) if latencia_n else None
+    estadisticas["por_dia"] = por_dia
+    estadisticas["sketch"] = sketch
+    estadisticas["cortes"] = cortes
+    estadisticas.update(("latencia_" + k, v) for k, v in sketch.percentiles().items())
+    return estadisticas
+
+
+# ==========================
+# DATOS CRUDOS (avg=0)
+# ==========================
+# Un match por registro: datetime_raw, el primer value_raw y el resto del
+# registro (solo se vuelve a mirar si el primer valor no alcanza para up).
+_REGISTRO_CRUDO = re.compile(r'"datetime_raw":\s*([-0-9.eE]+)[^{}]*?"value_raw":\s*"?([^",}]*)"?([^{}]*)\}')
+_VALOR_CRUDO = re.compile(r'"value_raw":\s*"?([^",}]*)')
+
+
+class AcumuladorCrudo:
+    """
+    Resume historicdata con avg=0 (un registro por escaneo). Cada escaneo
+    pesa los segundos hasta el siguiente, como mucho hueco_max; el resto de
+    un hueco más largo cuenta como omitido (sin datos). Así la
+    disponibilidad queda ponderada por los intervalos reales de escaneo y
+    una caída de minutos no se diluye en el promedio de la hora.
+
+    Las respuestas se recorren con una expresión regular sobre cada bloque
+    de texto (findall en C), sin decodificar los registros a objetos JSON
+    ni guardar las muestras: solo se actualizan contadores, el sketch y
+    los cortes. El
+    último escaneo queda pendiente entre respuestas, así se pueden
+    consumir varios tramos seguidos.
+    """
+
+    def __init__(self, latencia_max=None, mantenimiento=None, hueco_max=HUECO_MAX_CRUDO, canales=None):
+        self.latencia_max = latencia_max
+        self.mantenimiento = mantenimiento
+        self.canales = canales
+        self.hueco_max = hueco_max
+        self.muestras = {"up": 0, "down": 0, "omitida": 0, "mantenimiento": 0}
+        self.segundos = {"up": 0, "down": 0, "omitida": 0, "mantenimiento": 0}
+        self.dias = {}          # día local -> [seg up, seg down, seg omitidos, suma latencias, muestras con latencia]
+        self.latencia_suma = 0.0
+        self.latencia_n = 0
+        self.sketch = SketchLatencia()
+        self.cortes = []
+        self.corte = None
+        self.previo = None      # (segundos OLE, estado, latencia) del último escaneo, aún sin peso
+        self.ultimo_paso = 0
+
+    def consumir(self, response):
+        utf8 = codecs.getincrementaldecoder("utf-8")()
+        pendiente = ""
+        latencia_max = self.latencia_max
+        canales = self.canales
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            texto = pendiente + utf8.decode(chunk)
+            fin = texto.rfind("}") + 1   # Solo registros completos; el resto espera al siguiente bloque
+            pendiente = texto[fin:]
+            for fecha, valor, resto in _REGISTRO_CRUDO.findall(texto, 0, fin):
+                latencia = _a_float(valor)
+                if canales is not None:
+                    valores = [latencia]
+                    if canales.cantidad > 1:
+                        valores += [_a_float(v) for v in _VALOR_CRUDO.findall(resto)[:canales.cantidad - 1]]
+                    estado, latencia = canales.evaluar(valores, latencia_max)
+                elif latencia is not None and (latencia_max is None or 0 <= latencia < latencia_max):
+                    estado = "up"
+                else:
+                    valores = [latencia] + [_a_float(v) for v in _VALOR_CRUDO.findall(resto)[:3]]
+                    estado, latencia = estado_por_valores(valores, latencia_max)
+                self._escaneo(round(float(fecha) * 86400), estado, latencia)
+
+    def _escaneo(self, t, estado, latencia):
+        if self.previo is not None:
+            paso = t - self.previo[0]
+            if paso > 0:
+                self.ultimo_paso = paso
+            self._contar(*self.previo, max(paso, 0))
+        self.previo = (t, estado, latencia)
+
+    def _contar(self, t, estado, latencia, paso):
+        peso = min(paso, self.hueco_max)
+        if self.mantenimiento is not None and peso and self.mantenimiento.cubre(t, t + peso):
+            estado = "mantenimiento"
+
+        fecha = dia_local(t)
+        dia = self.dias.get(fecha)
+        if dia is None:
+            dia = self.dias[fecha] = [0, 0, 0, 0.0, 0]
+        self.muestras[estado] += 1
+        self.segundos[estado] += peso
+        self.segundos["omitida"] += paso - peso
+        dia[2] += paso - peso
+
+        if estado == "down":
+            if self.corte is None:
+                self.corte = [t / 86400, 0, 0]
+                self.cortes.append(self.corte)
+            self.corte[1] += 1
+            self.corte[2] += peso
+            dia[1] += peso
+        else:
+            self.corte = None
+            if estado == "up":
+                dia[0] += peso
+                if latencia is not None:
+                    self.latencia_suma += latencia
+                    self.latencia_n += 1
+                    self.sketch.agregar(latencia)
+                    dia[3] += latencia
+                    dia[4] += 1
+            else:
+                dia[2] += peso
+        if paso > peso:
+            self.corte = None   # Un hueco sin datos corta la racha de caída
+
+    def resumen(self):
+        """Cierra el último escaneo (pesa como el intervalo anterior) y arma el resumen."""
+        if self.previo is not None:
+            self._contar(*self.previo, min(self.ultimo_paso, self.hueco_max))
+            self.previo = None
+
+        n = self.muestras
+        estadisticas = {
+            "muestras_totales": sum(n.values()),
+            "muestras_validas": n["up"] + n["down"],
+            "muestras_up": n["up"],
+            "muestras_down": n["down"],
+            "muestras_omitidas": n["omitida"],
+            "muestras_mantenimiento": n["mantenimiento"]
+        }
+        # Los rollups guardan horas con dos decimales por día; la precisión completa queda en los segundos
+        por_dia = {
+            fecha: [_horas(up), _horas(down), _horas(omitidos), suma, muestras, up, down]
+            for fecha, (up, down, omitidos, suma, muestras) in self.dias.items()
+        }
+        return _completar(estadisticas, dict(self.segundos), self.latencia_suma, self.latencia_n,
+                          por_dia, self.sketch, self.cortes)
+
+
+class AcumuladorCrudoPeriodos(AcumuladorCrudo):
+    """
+    AcumuladorCrudo para varios períodos (desde, hasta) en días OLE: cada
+    escaneo se lee una vez y pasa al acumulador de cada período que lo
+    contiene. resumen() devuelve una lista, en el orden de los períodos.
+    """
+
+    def __init__(self, periodos, latencia_max=None, mantenimiento=None, hueco_max=HUECO_MAX_CRUDO, canales=None):
+        super().__init__(latencia_max, mantenimiento, hueco_max, canales)
+        self.partes = [(round(desde * 86400), round(hasta * 86400),
+                        AcumuladorCrudo(latencia_max, mantenimiento, hueco_max, canales))
+                       for desde, hasta in periodos]
+
+    def _escaneo(self, t, estado, latencia):
+        for desde, hasta, acumulador in self.partes:
+            if desde <= t < hasta:
+                acumulador._escaneo(t, estado, latencia)
+
+    def resumen(self):
+        return [acumulador.resumen() for _, _, acumulador in self.partes]
+
+
+def tramos_crudos(params, dias=TRAMO_CRUDO_DIAS):
+    """Divide sdate/edate en tramos consecutivos de `dias` días como mucho."""
+    formato = "%Y-%m-%d-%H-%M-%S"
+    inicio = datetime.strptime(params["sdate"], formato)
+    fin = datetime.strptime(params["edate"], formato)
+    tramos = []
+    while inicio <= fin:
+        hasta = min(inicio + timedelta(days=dias) - timedelta(seconds=1), fin)
+        tramos.append(dict(params, sdate=inicio.strftime(formato), edate=hasta.strftime(formato)))
+        inicio = hasta + timedelta(seconds=1)
+    return tramos
+
+
+# ==========================
+# CONTROL DE LATENCIA DE COLA
+# ==========================
+class CircuitoPRTG:
+    """
+    Cerrado: pasan todas las llamadas. Si la tasa de error de las últimas
+    CIRCUITO_VENTANA llamadas supera CIRCUITO_TASA_ERROR se abre y los
+    workers esperan CIRCUITO_ENFRIAMIENTO segundos sin llamar a PRTG.
+    Luego pasa a semiabierto y deja pasar 1, 2, 4... llamadas simultáneas;
+    al llegar a CIRCUITO_VENTANA sin errores se cierra, y un error lo reabre.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.estado = "cerrado"
+        self.resultados = deque(maxlen=CIRCUITO_VENTANA)
+        self.abierto_hasta = 0.0
+        self.cupo = 0
+        self.exitos = 0
+        self.en_vuelo = 0
+        self.aperturas = 0
+
+    def entrar(self):
+        with self._cond:
+            while True:
+                if self.estado == "abierto":
+                    espera = self.abierto_hasta - time.monotonic()
+                    if espera > 0:
+                        self._cond.wait(espera)
+                        continue
+                    self.estado = "semiabierto"
+                    self.cupo = 1
+                    self.exitos = 0
+                    log.info("Circuito PRTG semiabierto: reanudando consultas de forma gradual")
+                if self.estado == "cerrado" or self.en_vuelo < self.cupo:
+                    self.en_vuelo += 1
+                    return
+                self._cond.wait()
+
+    def salir(self, ok):
+        with self._cond:
+            self.en_vuelo -= 1
+            if self.estado == "semiabierto":
+                if not ok:
+                    self._abrir()
+                else:
+                    self.exitos += 1
+                    if self.exitos >= self.cupo:
+                        self.cupo *= 2
+                        self.exitos = 0
+                        if self.cupo >= CIRCUITO_VENTANA:
+                            self.estado = "cerrado"
+                            self.resultados.clear()
+                            log.info("Circuito PRTG cerrado: consultas normales")
+            elif self.estado == "cerrado":
+                self.resultados.append(ok)
+                errores = self.resultados.count(False)
+                if len(self.resultados) >= CIRCUITO_VENTANA // 2 and errores / len(self.resultados) > CIRCUITO_TASA_ERROR:
+                    self._abrir()
+            self._cond.notify_all()
+
+    def _abrir(self):
+        self.estado = "abierto"
+        self.abierto_hasta = time.monotonic() + CIRCUITO_ENFRIAMIENTO
+        self.resultados.clear()
+        self.aperturas += 1
+        log.warning(f"Circuito PRTG abierto: demasiados errores, pausa de {CIRCUITO_ENFRIAMIENTO}s")
+
+
+class LatenciasPRTG:
+    """Tiempos hasta la respuesta de historicdata, por petición y efectivos (con duplicado)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.por_peticion = SketchLatencia()
+        self.efectiva = SketchLatencia()
+        self.max_peticion = 0.0
+        self.max_efectiva = 0.0
+        self.llamadas = 0
+        self.errores = 0
+        self.duplicadas = 0
+        self.ganadas_por_copia = 0
+
+    def registrar_peticion(self, segundos):
+        with self._lock:
+            self.por_peticion.agregar(segundos * 1000)
+            self.max_peticion = max(self.max_peticion, segundos)
+
+    def registrar_llamada(self, segundos, ok):
+        with self._lock:
+            self.llamadas += 1
+            if ok:
+                self.efectiva.agregar(segundos * 1000)
+                self.max_efectiva = max(self.max_efectiva, segundos)
+            else:
+                self.errores += 1
+
+    def contar(self, campo):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def umbral_duplicado(self):
+        with self._lock:
+            if self.por_peticion.n < HEDGE_MIN_MUESTRAS:
+                return HEDGE_UMBRAL_INICIAL
+            return self.por_peticion.cuantil(HEDGE_PERCENTIL) / 1000
+
+    def reporte(self):
+        if not self.llamadas:
+            return
+        with _circuitos_lock:
+            aperturas = sum(c.aperturas for c in _circuitos.values())
+        print("\n=== LATENCIA DE PRTG (historicdata) ===")
+        print(f"Llamadas: {self.llamadas} | errores: {self.errores} | duplicadas: {self.duplicadas} "
+              f"(respondió antes la copia en {self.ganadas_por_copia}) | aperturas del circuito: {aperturas}")
+        for nombre, sketch, maximo in (("Por petición", self.por_peticion, self.max_peticion),
+                                       ("Efectiva", self.efectiva, self.max_efectiva)):
+            if not sketch.n:
+                continue
+            pct = {k: v / 1000 for k, v in sketch.percentiles().items()}
+            print(f"  {nombre:<13} p50 {pct['p50']:.2f}s | p95 {pct['p95']:.2f}s | "
+                  f"p99 {pct['p99']:.2f}s | máx {maximo:.2f}s")
+
+
+latencias_prtg = LatenciasPRTG()
+_circuitos = {}   # Un circuito por servidor PRTG (URL base)
+_circuitos_lock = threading.Lock()
+
+
+def circuito_de(url):
+    with _circuitos_lock:
+        return _circuitos.setdefault(url.split("/api/")[0], CircuitoPRTG())
+
+
+def _en_hilo(funcion, *args):
+    """Ejecuta funcion en un hilo daemon: una petición colgada no retrasa la salida del script."""
+    futuro = Future()
+
+    def correr():
+        if not futuro.set_running_or_notify_cancel():
+            return
+        try:
+            futuro.set_result(funcion(*args))
+        except BaseException as e:
+            futuro.set_exception(e)
+
+    threading.Thread(target=correr, daemon=True).start()
+    return futuro
+
+
+def _cerrar_respuesta(futuro):
+    if futuro.exception() is None:
+        futuro.result().close()
+
+
+def _una_peticion(cliente, url, params, timeout):
+    t0 = time.perf_counter()
+    resp = cliente.get(url, params=params, timeout=timeout, verify=False, stream=True,
+                       headers=transferencia.CABECERAS)
+    try:
+        resp.raise_for_status()
+    except Exception:
+        resp.close()
+        raise
+    latencias_prtg.registrar_peticion(time.perf_counter() - t0)
+    return resp
+
+
+def _pedir_con_duplicado(cliente, url, params, timeout):
+    original = _en_hilo(_una_peticion, cliente, url, params, timeout)
+    pendientes = {original}
+    copia = None
+    error = None
+
+    while pendientes:
+        espera = latencias_prtg.umbral_duplicado() if copia is None else None
+        hechos, pendientes = wait(pendientes, timeout=espera, return_when=FIRST_COMPLETED)
+        if not hechos:
+            copia = _en_hilo(_una_peticion, cliente, url, params, timeout)
+            pendientes.add(copia)
+            latencias_prtg.contar("duplicadas")
+            continue
+        for futuro in hechos:
+            if futuro.exception() is None:
+                for resto in pendientes:
+                    resto.add_done_callback(_cerrar_respuesta)
+                if futuro is copia:
+                    latencias_prtg.contar("ganadas_por_copia")
+                return futuro.result()
+            error = futuro.exception()
+    raise error
+
+
+def pedir_historico(cliente, url, params, timeout=60):
+    """
+    GET en streaming de historicdata.json pasando por el circuito del
+    servidor. Si la
+    respuesta tarda más que el percentil HEDGE_PERCENTIL de las anteriores
+    se envía una copia y se usa la que responda primero; la otra se cierra
+    al llegar. Devuelve la respuesta ya validada con raise_for_status().
+    """
+    circuito = circuito_de(url)
+    circuito.entrar()
+    t0 = time.perf_counter()
+    ok = False
+    try:
+        if DUPLICAR_LENTAS:
+            resp = _pedir_con_duplicado(cliente, url, params, timeout)
+        else:
+            resp = _una_peticion(cliente, url, params, timeout)
+        ok = True
+        return resp
+    finally:
+        circuito.salir(ok)
+        latencias_prtg.registrar_llamada(time.perf_counter() - t0, ok)
+
+
+# ==========================
+# DESCARGA + RESUMEN
+# ==========================
+def resumir_historico(url, params, max_retries=3, retry_delay=5, latencia_max=None, timeout=60, session=None,
+                      mantenimiento=None, canales=None, periodos=None):
+    """
+    Descarga historicdata.json en modo streaming y lo resume registro a
+    registro. Un corte a mitad de la descarga cuenta como intento fallido.
+    Con avg=0 (datos crudos) el rango se pide por tramos y se resume con
+    AcumuladorCrudo. `canales` (canales_prtg.CanalesSensor) evalúa sensores
+    que no son Ping. Con `periodos` (ver resumir_periodos) el rango de
+    params debe cubrirlos a todos y se devuelve una lista de resúmenes, uno
+    por período, de la misma descarga. Devuelve None si no hubo respuesta
+    válida tras los reintentos.
+    """
+    cliente = session or requests
+    sensor = params.get("id")
+    intervalo = int(params.get("avg", 3600))
+    for attempt in range(1, max_retries + 1):
+        try:
+            if not intervalo:
+                return _resumir_crudo(cliente, url, params, latencia_max, timeout, mantenimiento, canales, periodos)
+            with perfil.etapa("fetch", sensor):
+                resp = pedir_historico(cliente, url, params, timeout)
+            with resp:
+                registros = perfil.cronometrar_bucle(iterar_histdata(resp), "parse", "compute", sensor)
+                resumen = resumir_histdata(registros, latencia_max, intervalo=intervalo,
+                                           mantenimiento=mantenimiento, canales=canales, periodos=periodos)
+                transferencia.registrar(resp, stream=True)
+                return resumen
+        except Exception as e:
+            log.warning(f"Error al consultar historicdata (intento {attempt}/{max_retries}): {e}")
+            if attempt < max_retries:
+                time.sleep(retry_delay)
+    return None
+
+
+def _resumir_crudo(cliente, url, params, latencia_max, timeout, mantenimiento, canales=None, periodos=None):
+    """Un intento completo con avg=0: todos los tramos en un mismo acumulador."""
+    sensor = params.get("id")
+    if periodos is not None:
+        acumulador = AcumuladorCrudoPeriodos(periodos, latencia_max, mantenimiento, canales=canales)
+    else:
+        acumulador = AcumuladorCrudo(latencia_max, mantenimiento, canales=canales)
+    for tramo in tramos_crudos(params):
+        with perfil.etapa("fetch", sensor):
+            resp = pedir_historico(cliente, url, tramo, timeout)
+        with resp:
+            with perfil.etapa("parse", sensor):
+                acumulador.consumir(resp)
+            transferencia.registrar(resp, stream=True)
+    with perfil.etapa("compute", sensor):
+        return acumulador.resumen()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Ventanas de mantenimiento planificado para el cálculo de disponibilidad.
+#
+# Se leen de un CSV (MANTENIMIENTOS_CSV) con una ventana por fila:
+#
+#   Ambito,ID,Inicio,Fin,Repeticion,Hasta,Motivo
+#   sensor,2001,2024-01-10 02:00,2024-01-10 04:00,,,Cambio de router
+#   dispositivo,1500,2024-01-15 22:00,2024-01-16 01:00,,,Actualización de firmware
+#   grupo,1234,2024-01-07 01:00,2024-01-07 03:00,semanal,2024-06-30,Ventana de los domingos
+#
+# Ambito: sensor, dispositivo o grupo (ID del grupo tal como se consulta en
+# el script; con USAR_ARBOL, cualquier grupo o probe por encima del
+# dispositivo, aunque no se haya elegido). Repeticion: vacía, diaria, semanal o mensual, hasta la fecha
+# Hasta (o hasta el fin del rango consultado).
+#
+# Las horas (muestras) que se cruzan con una ventana no cuentan como up ni
+# down: se informan aparte como horas en mantenimiento.
+#
+# Las fechas del CSV están en ZONA_HORARIA (ver historicos_prtg); cada
+# ocurrencia se pasa a segundos OLE UTC, la referencia de datetime_raw, así
+# una ventana semanal de las 01:00 sigue a las 01:00 locales tras un cambio
+# de horario.
+
+import csv
+import os
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from heapq import merge
+from historicos_prtg import EPOCA_OLE, local_a_utc
+import registro_prtg as registro
+
+MANTENIMIENTOS_CSV = "ventanas_mantenimiento.csv"
+
+AMBITOS = ("sensor", "dispositivo", "grupo")
+REPETICIONES = ("", "diaria", "semanal", "mensual")
+FORMATOS_FECHA = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y/%m/%d %H:%M:%S", "%Y/%m/%d %H:%M",
+                  "%Y-%m-%d-%H-%M-%S", "%Y-%m-%d", "%Y/%m/%d")
+
+log = registro.obtener("mantenimiento")
+
+
+def segundos_ole(fecha):
+    """Segundos OLE UTC (misma referencia que datetime_raw) de una fecha en ZONA_HORARIA."""
+    return int((local_a_utc(fecha) - EPOCA_OLE).total_seconds())
+
+
+def leer_fecha(texto):
+    texto = (texto or "").strip()
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato)
+        except ValueError:
+            pass
+    raise ValueError(f"Fecha inválida: {texto!r}")
+
+
+def _fin_del_dia(texto):
+    """Una fecha sin hora como límite incluye todo ese día."""
+    fecha = leer_fecha(texto)
+    return fecha + timedelta(days=1, seconds=-1) if len(texto.strip()) <= 10 else fecha
+
+
+def rango_fechas(start_date, end_date):
+    """Rango de la consulta como datetime, con las mismas reglas que get_historic_data."""
+    if "-" in start_date and len(start_date.split("-")) > 3:
+        return leer_fecha(start_date), leer_fecha(end_date)
+    return leer_fecha(start_date), _fin_del_dia(end_date)
+
+
+def _sumar_meses(fecha, meses):
+    mes = fecha.month - 1 + meses
+    try:
+        return fecha.replace(year=fecha.year + mes // 12, month=mes % 12 + 1)
+    except ValueError:
+        return None   # El día no existe en ese mes (p. ej. 31 de abril): se salta
+
+
+def repeticiones(inicio, fin, repeticion, desde, hasta):
+    """
+    Ocurrencias (inicio, fin) de una ventana que pueden cruzarse con
+    [desde, hasta]; las anteriores a `desde` se saltan sin generarlas.
+    """
+    if not repeticion:
+        yield inicio, fin
+        return
+
+    duracion = fin - inicio
+    n = 0
+    if desde > fin:
+        if repeticion == "mensual":
+            n = max(0, (desde.year - fin.year) * 12 + desde.month - fin.month - 1)
+        else:
+            n = max(0, (desde - fin).days // (1 if repeticion == "diaria" else 7) - 1)
+    while True:
+        if repeticion == "mensual":
+            actual = _sumar_meses(inicio, n)
+        else:
+            actual = inicio + timedelta(days=n * (1 if repeticion == "diaria" else 7))
+        n += 1
+        if actual is None:
+            continue
+        if actual > hasta:
+            return
+        yield actual, actual + duracion
+
+
+def _fusionar(intervalos):
+    """Intervalos (inicio, fin) ordenados por inicio -> lista sin solapes ni contiguos."""
+    inicios = []
+    fines = []
+    for a, b in intervalos:
+        if fines and a <= fines[-1]:
+            fines[-1] = max(fines[-1], b)
+        else:
+            inicios.append(a)
+            fines.append(b)
+    return inicios, fines
+
+
+# ==========================
+# ÍNDICE DE VENTANAS
+# ==========================
+class Ventanas:
+    """
+    Ventanas de un sensor (las propias, las de su dispositivo y las de sus
+    grupos), ordenadas y fusionadas. cubre() se llama con las muestras en
+    orden de fecha y avanza un cursor, así excluir las horas de todo un
+    rango es una sola pasada (muestras + ventanas). Si una muestra llega
+    fuera de orden el cursor se reubica con búsqueda binaria.
+    """
+
+    def __init__(self, inicios, fines):
+        self.inicios = inicios
+        self.fines = fines
+        self._j = 0
+
+    def __len__(self):
+        return len(self.inicios)
+
+    def cubre(self, a, b):
+        """True si el tramo [a, b) (segundos OLE) se cruza con alguna ventana."""
+        fines = self.fines
+        j = self._j
+        if j and a < fines[j - 1]:
+            j = bisect_right(fines, a)
+        while j < len(fines) and fines[j] <= a:
+            j += 1
+        self._j = j
+        return j < len(fines) and self.inicios[j] < b
+
+
+class IndiceMantenimiento:
+    """
+    Ventanas fusionadas por (ámbito, ID), en segundos OLE. Las repetitivas
+    se expanden solo dentro del rango consultado. ventanas_de() arma las de
+    un sensor combinando, ya ordenadas, las listas de su sensor, dispositivo
+    y grupos: no recorre las ventanas de otros objetos.
+    """
+
+    def __init__(self, desde, hasta):
+        self.desde = desde
+        self.hasta = hasta
+        self._pendientes = {}
+        self._indice = {}
+        self.cantidad = 0
+
+    def agregar(self, ambito, objid, inicio, fin, repeticion="", hasta=None):
+        if ambito not in AMBITOS:
+            raise ValueError(f"Ámbito desconocido: {ambito} (válidos: {', '.join(AMBITOS)})")
+        if repeticion not in REPETICIONES:
+            raise ValueError(f"Repetición desconocida: {repeticion} (válidas: diaria, semanal, mensual)")
+        if fin <= inicio:
+            raise ValueError(f"La ventana termina antes de empezar: {inicio} → {fin}")
+
+        limite = min(hasta, self.hasta) if hasta else self.hasta
+        lista = self._pendientes.setdefault((ambito, str(objid).strip()), [])
+        for a, b in repeticiones(inicio, fin, repeticion, self.desde, limite):
+            if b > self.desde and a <= self.hasta:
+                lista.append((segundos_ole(a), segundos_ole(b)))
+                self.cantidad += 1
+
+    def preparar(self):
+        for clave, intervalos in self._pendientes.items():
+            intervalos.sort()
+            self._indice[clave] = _fusionar(intervalos)
+        self._pendientes = {}
+        return self
+
+    def ventanas_de(self, sensor, grupos=()):
+        """Ventanas de un sensor de table.json (objid, parentid) y los IDs de grupo que lo incluyen."""
+        claves = [("sensor", str(sensor.get("objid"))), ("dispositivo", str(sensor.get("parentid")))]
+        claves += [("grupo", str(g)) for g in grupos]
+        listas = [self._indice[k] for k in claves if k in self._indice]
+        if not listas:
+            return None
+        if len(listas) == 1:
+            return Ventanas(*listas[0])
+        return Ventanas(*_fusionar(merge(*(zip(inicios, fines) for inicios, fines in listas))))
+
+
+def grupos_por_sensor(referencias):
+    """objid -> IDs de los grupos consultados que incluyen al sensor (ver sensores_unicos)."""
+    grupos = {}
+    for gid, oid in referencias:
+        grupos.setdefault(oid, []).append(gid)
+    return grupos
+
+
+def cargar_mantenimientos(desde, hasta, ruta=MANTENIMIENTOS_CSV):
+    """Lee el CSV de ventanas; sin archivo devuelve un índice vacío."""
+    indice = IndiceMantenimiento(desde, hasta)
+    if not os.path.exists(ruta):
+        return indice.preparar()
+
+    with open(ruta, newline="", encoding="utf-8-sig") as f:
+        for n, fila in enumerate(csv.DictReader(f), start=2):
+            fila = {k.strip(): (v or "").strip() for k, v in fila.items() if k}
+            try:
+                indice.agregar(
+                    fila.get("Ambito", "").lower(), fila.get("ID"),
+                    leer_fecha(fila.get("Inicio")), leer_fecha(fila.get("Fin")),
+                    fila.get("Repeticion", "").lower(),
+                    _fin_del_dia(fila["Hasta"]) if fila.get("Hasta") else None
+                )
+            except ValueError as e:
+                log.warning(f"{ruta} línea {n}: {e} (se omite)")
+
+    print(f"Ventanas de mantenimiento: {indice.cantidad} en el rango ({ruta})")
+    return indice.preparar()
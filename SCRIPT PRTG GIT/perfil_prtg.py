@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Modo de perfilado compartido por todos los scripts.
+#
+#   python script.py --profile                      tiempos por etapa y por sensor
+#   python script.py --profile --profile-dump x.prof   además vuelca cProfile
+#
+# Sin --profile las funciones de este módulo no miden nada.
+
+import sys
+import time
+import threading
+import cProfile
+import pstats
+from contextlib import contextmanager
+
+TOP_N = 10
+
+ACTIVO = "--profile" in sys.argv
+ARCHIVO_CPROFILE = None
+for _i, _arg in enumerate(sys.argv):
+    if _arg.startswith("--profile-dump="):
+        ARCHIVO_CPROFILE = _arg.split("=", 1)[1]
+    elif _arg == "--profile-dump" and _i + 1 < len(sys.argv):
+        ARCHIVO_CPROFILE = sys.argv[_i + 1]
+if ARCHIVO_CPROFILE:
+    ACTIVO = True
+
+_lock = threading.Lock()
+_etapas = {}     # nombre -> [wall, cpu, llamadas]
+_sensores = {}   # sensor -> [wall, cpu]
+
+
+# ==========================
+# REGISTRO DE TIEMPOS
+# ==========================
+def registrar(nombre, wall, cpu, sensor=None):
+    with _lock:
+        acumulado = _etapas.setdefault(nombre, [0.0, 0.0, 0])
+        acumulado[0] += wall
+        acumulado[1] += cpu
+        acumulado[2] += 1
+        if sensor is not None:
+            por_sensor = _sensores.setdefault(sensor, [0.0, 0.0])
+            por_sensor[0] += wall
+            por_sensor[1] += cpu
+
+
+@contextmanager
+def etapa(nombre, sensor=None):
+    """Mide wall y CPU (del hilo actual) de un bloque: inventario, fetch, parse, compute, write."""
+    if not ACTIVO:
+        yield
+        return
+
+    t0 = time.perf_counter()
+    c0 = time.thread_time()
+    try:
+        yield
+    finally:
+        registrar(nombre, time.perf_counter() - t0, time.thread_time() - c0, sensor)
+
+
+def cronometrar_bucle(iterable, etapa_iterador, etapa_cuerpo, sensor=None):
+    """
+    Reparte el tiempo de un bucle for entre esperar el siguiente elemento
+    (etapa_iterador, p. ej. leer y decodificar) y procesarlo en el cuerpo
+    del bucle (etapa_cuerpo, p. ej. clasificar).
+    """
+    if not ACTIVO:
+        yield from iterable
+        return
+
+    iterador = iter(iterable)
+    w_iter = c_iter = w_cuerpo = c_cuerpo = 0.0
+    try:
+        while True:
+            t0 = time.perf_counter()
+            c0 = time.thread_time()
+            try:
+                item = next(iterador)
+            finally:
+                t1 = time.perf_counter()
+                c1 = time.thread_time()
+                w_iter += t1 - t0
+                c_iter += c1 - c0
+            yield item
+            w_cuerpo += time.perf_counter() - t1
+            c_cuerpo += time.thread_time() - c1
+    except StopIteration:
+        return
+    finally:
+        registrar(etapa_iterador, w_iter, c_iter, sensor)
+        registrar(etapa_cuerpo, w_cuerpo, c_cuerpo)
+        if sensor is not None:
+            with _lock:
+                _sensores.setdefault(sensor, [0.0, 0.0])
+                _sensores[sensor][0] += w_cuerpo
+                _sensores[sensor][1] += c_cuerpo
+
+
+# ==========================
+# REPORTE
+# ==========================
+def reporte(wall_total, cpu_total):
+    print("\n=== PERFIL DE EJECUCIÓN ===")
+    print(f"Total: {wall_total:.2f}s wall | {cpu_total:.2f}s CPU (proceso)")
+
+    with _lock:
+        etapas = sorted(_etapas.items(), key=lambda kv: kv[1][0], reverse=True)
+        sensores = sorted(_sensores.items(), key=lambda kv: kv[1][0], reverse=True)
+
+    # Con varios workers la suma de etapas puede superar el wall total
+    print("\nEtapas (tiempo acumulado de todos los hilos):")
+    for nombre, (wall, cpu, llamadas) in etapas[:TOP_N]:
+        print(f"  {nombre:<12} {wall:9.2f}s wall | {cpu:8.2f}s CPU | {llamadas} llamadas")
+
+    if sensores:
+        print(f"\nTop {min(TOP_N, len(sensores))} sensores más lentos:")
+        for sensor, (wall, cpu) in sensores[:TOP_N]:
+            print(f"  {str(sensor):<12} {wall:9.2f}s wall | {cpu:8.2f}s CPU")
+
+
+@contextmanager
+def sesion():
+    """Envuelve la ejecución de main(): activa cProfile si se pidió e imprime el reporte al final."""
+    if not ACTIVO:
+        yield
+        return
+
+    perfilador = cProfile.Profile() if ARCHIVO_CPROFILE else None
+    t0 = time.perf_counter()
+    c0 = time.process_time()
+    if perfilador:
+        perfilador.enable()
+    try:
+        yield
+    finally:
+        if perfilador:
+            perfilador.disable()
+            perfilador.dump_stats(ARCHIVO_CPROFILE)
+        reporte(time.perf_counter() - t0, time.process_time() - c0)
+        if perfilador:
+            print(f"\ncProfile (hilo principal) guardado en {ARCHIVO_CPROFILE}")
+            pstats.Stats(perfilador).sort_stats("cumulative").print_stats(TOP_N)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Varios períodos de informe (mes, trimestre, año, YTD) con una sola
+# descarga de históricos por sensor.
+#
+#   periodos = leer_periodos("2024-01, 2024-T1, ytd, 2024/02/10~2024/02/20")
+#   inicio, fin = union(periodos)          # rango que abarcan todos
+#   rangos = rangos_ole(periodos)          # (desde, hasta) en días OLE para historicos_prtg
+#   resultados = por_tramos(periodos, descargar)   # una descarga por tramo contiguo
+#
+# Cada período es (etiqueta, inicio, fin) con fechas AAAA/MM/DD, el mismo
+# formato que se ingresa en "Fecha inicio" / "Fecha fin"; el día de fin
+# se incluye completo. Los períodos que se solapan o quedan cerca se piden
+# a PRTG en una sola descarga; los separados por más de HUECO_MAX_DIAS
+# (p. ej. "2023-01, 2024-01") se piden aparte, sin bajar los meses del medio.
+
+from datetime import date, datetime, timedelta
+from historicos_prtg import ole_de_local
+
+FORMATOS_FECHA = ("%Y/%m/%d", "%Y-%m-%d")
+HUECO_MAX_DIAS = 31   # Hueco entre períodos hasta el que conviene una sola descarga
+
+
+def _fecha(texto):
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto.strip(), formato).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Fecha inválida: {texto!r} (use AAAA/MM/DD)")
+
+
+def _fin_de_mes(anio, mes):
+    return date(anio + mes // 12, mes % 12 + 1, 1) - timedelta(days=1)
+
+
+def _periodo(token, hoy):
+    """Un período a partir de su texto: AAAA, AAAA-MM, AAAA-Tn (o Qn), ytd o inicio~fin."""
+    t = token.strip()
+    if "~" in t:
+        inicio, fin = (_fecha(x) for x in t.split("~", 1))
+        etiqueta = f"{inicio:%Y-%m-%d} a {fin:%Y-%m-%d}"
+    elif t.lower() == "ytd":
+        inicio, fin = date(hoy.year, 1, 1), hoy
+        etiqueta = f"YTD {hoy.year}"
+    elif t.isdigit() and len(t) == 4:
+        inicio, fin = date(int(t), 1, 1), date(int(t), 12, 31)
+        etiqueta = t
+    elif len(t) == 7 and t[4] == "-" and t[5].upper() in ("T", "Q") and t[6] in "1234":
+        anio, trimestre = int(t[:4]), int(t[6])
+        inicio = date(anio, 3 * trimestre - 2, 1)
+        fin = _fin_de_mes(anio, 3 * trimestre)
+        etiqueta = f"{anio}-T{trimestre}"
+    elif len(t) == 7 and t[4] == "-" and t[:4].isdigit() and t[5:].isdigit() and 1 <= int(t[5:]) <= 12:
+        inicio = date(int(t[:4]), int(t[5:]), 1)
+        fin = _fin_de_mes(inicio.year, inicio.month)
+        etiqueta = t
+    else:
+        raise ValueError(f"Período no reconocido: {token!r}")
+
+    if fin < inicio:
+        raise ValueError(f"El período {token!r} termina antes de empezar")
+    return etiqueta, inicio.strftime("%Y/%m/%d"), fin.strftime("%Y/%m/%d")
+
+
+def leer_periodos(texto, hoy=None):
+    """Lista separada por comas -> [(etiqueta, inicio, fin)], sin repetir, en el orden ingresado."""
+    hoy = hoy or date.today()
+    periodos = []
+    for token in texto.split(","):
+        if token.strip():
+            periodo = _periodo(token, hoy)
+            if periodo not in periodos:
+                periodos.append(periodo)
+    return periodos
+
+
+def union(periodos):
+    """(inicio, fin) que cubre todos los períodos (rango de mantenimientos y de duplicados en BD)."""
+    return min(p[1] for p in periodos), max(p[2] for p in periodos)
+
+
+def tramos(periodos, hueco_max=HUECO_MAX_DIAS):
+    """
+    Rangos de descarga [(inicio, fin, índices)]: los períodos que se solapan
+    o quedan a hueco_max días o menos van en el mismo tramo; `índices` son
+    sus posiciones en `periodos`.
+    """
+    orden = sorted(range(len(periodos)), key=lambda i: periodos[i][1:])
+    resultado = []
+    for i in orden:
+        _, inicio, fin = periodos[i]
+        if resultado and (_fecha(inicio) - _fecha(resultado[-1][1])).days - 1 <= hueco_max:
+            resultado[-1][1] = max(resultado[-1][1], fin)
+            resultado[-1][2].append(i)
+        else:
+            resultado.append([inicio, fin, [i]])
+    return [tuple(t) for t in resultado]
+
+
+def por_tramos(periodos, descargar, hueco_max=HUECO_MAX_DIAS):
+    """
+    Un resultado por período, en el orden de `periodos`, con una descarga por
+    tramo: descargar(inicio, fin, periodos_del_tramo) devuelve la lista de
+    resultados de esos períodos.
+    """
+    resultados = [None] * len(periodos)
+    for inicio, fin, indices in tramos(periodos, hueco_max):
+        for i, resultado in zip(indices, descargar(inicio, fin, [periodos[i] for i in indices])):
+            resultados[i] = resultado
+    return resultados
+
+
+def rangos_ole(periodos):
+    """
+    [(desde, hasta)] en días OLE UTC (como datetime_raw), con el día de fin
+    completo en ZONA_HORARIA: desde <= t < hasta.
+    """
+    rangos = []
+    for _, inicio, fin in periodos:
+        desde = ole_de_local(datetime.strptime(inicio, "%Y/%m/%d"))
+        hasta = ole_de_local(datetime.strptime(fin, "%Y/%m/%d") + timedelta(days=1))
+        rangos.append((desde, hasta))
+    return rangos
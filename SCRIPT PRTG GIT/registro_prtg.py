@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Registro (logging) compartido por todos los scripts.
+#
+#   python script.py                      progreso y avisos en consola
+#   python script.py --verbose            además el detalle por sensor
+#   python script.py --quiet              solo avisos y errores
+#   python script.py --log-json x.jsonl   además todo el detalle en JSON (una línea por evento)
+#
+# Los mensajes se encolan (QueueHandler) y un hilo en segundo plano los
+# escribe, así los bucles de consulta no esperan a la consola ni al disco.
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+PROGRESO_CADA = 5.0   # Segundos mínimos entre dos líneas de progreso
+
+NIVEL_CONSOLA = logging.INFO
+if "--verbose" in sys.argv:
+    NIVEL_CONSOLA = logging.DEBUG
+elif "--quiet" in sys.argv:
+    NIVEL_CONSOLA = logging.WARNING
+
+ARCHIVO_JSON = None
+for _i, _arg in enumerate(sys.argv):
+    if _arg.startswith("--log-json="):
+        ARCHIVO_JSON = _arg.split("=", 1)[1]
+    elif _arg == "--log-json" and _i + 1 < len(sys.argv):
+        ARCHIVO_JSON = sys.argv[_i + 1]
+
+_cola = queue.Queue()
+_listener = None
+_lock = threading.Lock()
+
+
+# ==========================
+# FORMATOS
+# ==========================
+class FormatoConsola(logging.Formatter):
+    """Info y debug tal cual, como los print de siempre; avisos y errores con prefijo."""
+
+    def format(self, record):
+        mensaje = record.getMessage()
+        if record.levelno >= logging.ERROR:
+            return f"[ERROR] {mensaje}"
+        if record.levelno >= logging.WARNING:
+            return f"⚠ {mensaje}"
+        return mensaje
+
+
+class FormatoJSON(logging.Formatter):
+    def format(self, record):
+        evento = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "origen": record.name,
+            "hilo": record.threadName,
+            "mensaje": record.getMessage()
+        }
+        evento.update(getattr(record, "datos", {}))
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+
+# ==========================
+# CONFIGURACIÓN
+# ==========================
+def _configurar():
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+
+        consola = logging.StreamHandler(sys.stdout)
+        consola.setLevel(NIVEL_CONSOLA)
+        consola.setFormatter(FormatoConsola())
+        handlers = [consola]
+        if ARCHIVO_JSON:
+            archivo = logging.FileHandler(ARCHIVO_JSON, encoding="utf-8")
+            archivo.setLevel(logging.DEBUG)
+            archivo.setFormatter(FormatoJSON())
+            handlers.append(archivo)
+
+        raiz = logging.getLogger("prtg")
+        raiz.setLevel(logging.DEBUG if ARCHIVO_JSON else NIVEL_CONSOLA)
+        raiz.propagate = False
+        raiz.addHandler(logging.handlers.QueueHandler(_cola))
+
+        _listener = logging.handlers.QueueListener(_cola, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def obtener(nombre):
+    """Logger "prtg.<nombre>". Los datos estructurados van en extra={"datos": {...}}."""
+    _configurar()
+    return logging.getLogger(f"prtg.{nombre}")
+
+
+def vaciar():
+    """Espera a que el hilo escriba todo lo encolado (antes de imprimir un resumen final)."""
+    if _listener is not None:
+        _cola.join()
+
+
+# ==========================
+# PROGRESO
+# ==========================
+class Progreso:
+    """
+    Cuenta elementos procesados e informa como mucho una vez cada
+    PROGRESO_CADA segundos: hechos/total, ritmo por segundo y tiempo
+    restante estimado. avanzar() es seguro entre hilos.
+    """
+
+    def __init__(self, total, etiqueta="sensores", log=None, cada=PROGRESO_CADA):
+        self.total = total
+        self.etiqueta = etiqueta
+        self.log = log or obtener("progreso")
+        self.cada = cada
+        self.hechos = 0
+        self.inicio = time.monotonic()
+        self.proximo = self.inicio + cada
+        self.lock = threading.Lock()
+
+    def avanzar(self, n=1):
+        with self.lock:
+            self.hechos += n
+            ahora = time.monotonic()
+            if ahora < self.proximo and self.hechos < self.total:
+                return
+            self.proximo = ahora + self.cada
+            hechos = self.hechos
+        self._informar(hechos, ahora)
+
+    def _informar(self, hechos, ahora):
+        transcurrido = max(ahora - self.inicio, 1e-9)
+        ritmo = hechos / transcurrido
+        restante = (self.total - hechos) / ritmo if ritmo and self.total else 0
+        porcentaje = 100 * hechos / self.total if self.total else 100
+        self.log.info(
+            f"[{hechos}/{self.total}] {self.etiqueta} procesados ({porcentaje:.0f}%) | "
+            f"{ritmo:.1f}/s | ETA {formatear_segundos(restante)}",
+            extra={"datos": {"evento": "progreso", "hechos": hechos, "total": self.total,
+                             "por_segundo": round(ritmo, 2), "eta_s": round(restante, 1)}}
+        )
+
+    def terminar(self):
+        transcurrido = time.monotonic() - self.inicio
+        self.log.info(
+            f"{self.hechos} {self.etiqueta} en {formatear_segundos(transcurrido)} "
+            f"({self.hechos / max(transcurrido, 1e-9):.1f}/s)",
+            extra={"datos": {"evento": "fin", "hechos": self.hechos, "segundos": round(transcurrido, 2)}}
+        )
+        vaciar()
+
+
+def formatear_segundos(segundos):
+    segundos = int(segundos)
+    return f"{segundos // 3600:02d}:{segundos % 3600 // 60:02d}:{segundos % 60:02d}"
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Salidas intercambiables (CSV, XLSX, SQL Server, SQLite) alimentadas por una
+# cola de escritura en segundo plano.
+#
+#   cola = ColaEscritura(crear_salidas(["csv", "sqlite"], "canales", "Canales_PRTG")).iniciar()
+#   cola.enviar(filas)                   # no espera disco ni base de datos
+#   cola.enviar(filas, tabla="Resumen")  # otra hoja / archivo / tabla
+#   cola.cerrar()
+#
+# Todas las salidas reciben listas de dict. Las columnas y tipos de cada
+# tabla se pueden declarar de antemano (esquemas); sin declarar, se toman
+# de las claves de la primera tanda y el tipo de sus valores:
+#
+#   esquemas = {None: {"SensorID": "entero", "Disponibilidad": "real", "Sensor": "texto"}}
+#   crear_salidas(["csv", "sqlite"], "informe", "Informe", esquemas=esquemas)
+#
+# Una columna que aparece en una tanda posterior se agrega en SQLite y SQL
+# Server; en CSV y XLSX, cuya cabecera ya está escrita, se descarta con un
+# aviso. Al anexar a un CSV existente se usa su cabecera, que debe incluir
+# todas las columnas.
+
+import csv
+import os
+import queue
+import re
+import sqlite3
+import threading
+import perfil_prtg as perfil
+import registro_prtg as registro
+
+MAX_PENDIENTES = 1000   # Lotes en cola; con la cola llena enviar() espera (acota la memoria)
+MAX_TITULO_HOJA = 31    # Límite de Excel para el nombre de una hoja
+SALIDAS_VALIDAS = ("csv", "xlsx", "sqlite", "sqlserver")
+
+_FIN = object()
+log = registro.obtener("salidas")
+
+
+# ==========================
+# SALIDAS
+# ==========================
+class Salida:
+    """Interfaz: escribir(tabla, filas) y cerrar(). tabla=None es la tabla principal."""
+
+    nombre = "salida"
+    esquemas = {}
+
+    def escribir(self, tabla, filas):
+        raise NotImplementedError
+
+    def cerrar(self):
+        pass
+
+    def _columnas_de(self, tabla, filas):
+        """Columnas declaradas de la tabla o, si no hay, las claves de la tanda en orden de aparición."""
+        if tabla in self.esquemas:
+            return list(self.esquemas[tabla])
+        return list(dict.fromkeys(c for f in filas for c in f))
+
+    def _avisar_descartadas(self, tabla, columnas, filas, avisadas):
+        nuevas = {c for f in filas for c in f} - set(columnas) - avisadas
+        if nuevas:
+            avisadas.update(nuevas)
+            log.warning(f"Salida {self.nombre} ({tabla or 'principal'}): columnas fuera de la cabecera, "
+                        f"se descartan: {', '.join(sorted(nuevas))}")
+
+
+class SalidaCSV(Salida):
+    """Un archivo por tabla: <ruta> para la principal y <base>_<tabla>.csv para las demás."""
+
+    nombre = "csv"
+
+    def __init__(self, ruta, anexar=False):
+        self.ruta = ruta
+        self.anexar = anexar
+        self._abiertos = {}
+        self._descartadas = set()
+
+    def _writer(self, tabla, campos):
+        if tabla not in self._abiertos:
+            base, ext = os.path.splitext(self.ruta)
+            ruta = self.ruta if tabla is None else f"{base}_{tabla}{ext or '.csv'}"
+            existente = self.anexar and os.path.exists(ruta) and os.path.getsize(ruta) > 0
+            if existente:
+                with open(ruta, newline="", encoding="utf-8") as f:
+                    cabecera = next(csv.reader(f), [])
+                faltan = [c for c in campos if c not in cabecera]
+                if faltan:
+                    raise ValueError(f"{ruta} tiene otra cabecera (faltan {', '.join(faltan)}); "
+                                     f"muévalo o use otro nombre")
+                campos = cabecera
+            f = open(ruta, "a" if self.anexar else "w", newline="", encoding="utf-8")
+            writer = csv.DictWriter(f, fieldnames=campos, extrasaction="ignore")
+            if not existente:
+                writer.writeheader()
+            self._abiertos[tabla] = (f, writer)
+        return self._abiertos[tabla]
+
+    def escribir(self, tabla, filas):
+        f, writer = self._writer(tabla, self._columnas_de(tabla, filas))
+        self._avisar_descartadas(tabla, writer.fieldnames, filas, self._descartadas)
+        writer.writerows(filas)
+        f.flush()
+
+    def cerrar(self):
+        for f, _ in self._abiertos.values():
+            f.close()
+        self._abiertos = {}
+
+
+class SalidaXLSX(Salida):
+    """Un libro con una hoja por tabla; se guarda al cerrar (modo write_only)."""
+
+    nombre = "xlsx"
+
+    def __init__(self, ruta, hoja="Datos"):
+        from openpyxl import Workbook
+        self.ruta = ruta
+        self.hoja = hoja
+        self.wb = Workbook(write_only=True)
+        self._hojas = {}
+        self._cabeceras = {}
+        self._descartadas = set()
+
+    def _titulo(self, tabla):
+        """
+        Nombre de hoja válido y único: sin los caracteres que Excel no admite
+        y recortado a MAX_TITULO_HOJA; si dos tablas quedan con el mismo
+        nombre, la segunda lleva " (2)" y así sucesivamente.
+        """
+        base = re.sub(r"[\[\]:*?/\\]", "-", tabla or self.hoja)[:MAX_TITULO_HOJA]
+        usados = {ws.title for ws in self._hojas.values()}
+        titulo = base
+        n = 1
+        while titulo in usados:
+            n += 1
+            sufijo = f" ({n})"
+            titulo = base[:MAX_TITULO_HOJA - len(sufijo)] + sufijo
+        return titulo
+
+    def escribir(self, tabla, filas):
+        if tabla not in self._hojas:
+            self._hojas[tabla] = self.wb.create_sheet(title=self._titulo(tabla))
+            self._cabeceras[tabla] = self._columnas_de(tabla, filas)
+            self._hojas[tabla].append(self._cabeceras[tabla])
+        ws = self._hojas[tabla]
+        columnas = self._cabeceras[tabla]
+        self._avisar_descartadas(tabla, columnas, filas, self._descartadas)
+        for fila in filas:
+            ws.append([fila.get(c) for c in columnas])
+
+    def cerrar(self):
+        if self._hojas:
+            self.wb.save(self.ruta)
+
+
+TIPOS_COLUMNA = ("entero", "real", "texto")
+
+
+def _tipo_columna(valores):
+    """
+    Tipo de columna según los valores de una tanda (entero, real o texto);
+    None si todos están vacíos: todavía no se sabe.
+    """
+    presentes = [v for v in valores if v is not None and v != ""]
+    if not presentes:
+        return None
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in presentes):
+        return "entero"
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in presentes):
+        return "real"
+    return "texto"
+
+
+class _SalidaBD(Salida):
+    """
+    Base de SQLite y SQL Server: crea la tabla si no existe y hace
+    executemany por lote. Sin esquema declarado, una columna que solo trae
+    vacíos no se crea hasta que llega una tanda con valores (así no queda
+    como texto por defecto); las columnas nuevas se agregan con ALTER TABLE.
+    """
+
+    TIPOS = {}
+
+    def __init__(self, tabla):
+        self.tabla = tabla
+        self.conn = None
+        self._columnas = {}
+
+    def _conectar(self):
+        raise NotImplementedError
+
+    def _crear_tabla(self, cursor, nombre, definicion):
+        raise NotImplementedError
+
+    def _columnas_existentes(self, cursor, nombre):
+        raise NotImplementedError
+
+    def _citar(self, nombre):
+        return f'"{nombre}"'
+
+    def _cursor(self):
+        return self.conn.cursor()
+
+    def escribir(self, tabla, filas):
+        if self.conn is None:
+            self.conn = self._conectar()
+        nombre = tabla or self.tabla
+        cursor = self._cursor()
+
+        declaradas = self.esquemas.get(tabla, {})
+        conocidas = self._columnas.get(nombre, [])
+        tipos = {}
+        for c in self._columnas_de(tabla, filas):
+            if c not in conocidas:
+                tipo = declaradas.get(c) or _tipo_columna([f.get(c) for f in filas])
+                if tipo is not None:
+                    tipos[c] = self.TIPOS[tipo]
+
+        if nombre not in self._columnas:
+            if not tipos:
+                # Ninguna columna con valores: no hay de dónde sacar tipos
+                tipos = {c: self.TIPOS["texto"] for c in self._columnas_de(tabla, filas)}
+            self._crear_tabla(cursor, nombre, ", ".join(f"{self._citar(c)} {t}" for c, t in tipos.items()))
+            # Tabla de una ejecución anterior: se usan sus columnas
+            self._columnas[nombre] = list(self._columnas_existentes(cursor, nombre))
+        existentes = {c.lower() for c in self._columnas[nombre]}
+        for c, tipo in tipos.items():
+            if c.lower() not in existentes:
+                cursor.execute(f"ALTER TABLE {self._citar(nombre)} ADD {self._citar(c)} {tipo}")
+                self._columnas[nombre].append(c)
+
+        columnas = self._columnas[nombre]
+        sql = (f"INSERT INTO {self._citar(nombre)} ({', '.join(self._citar(c) for c in columnas)}) "
+               f"VALUES ({', '.join('?' for _ in columnas)})")
+        # "" -> NULL, para que una celda vacía no rompa una columna numérica
+        cursor.executemany(sql, [tuple(None if f.get(c) == "" else f.get(c) for c in columnas) for f in filas])
+        self.conn.commit()
+
+    def cerrar(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class SalidaSQLite(_SalidaBD):
+    """Base local SQLite: sustituto de SQL Server para pruebas y benchmarks."""
+
+    nombre = "sqlite"
+    TIPOS = {"entero": "INTEGER", "real": "REAL", "texto": "TEXT"}
+
+    def __init__(self, ruta, tabla):
+        super().__init__(tabla)
+        self.ruta = ruta
+
+    def _conectar(self):
+        conn = sqlite3.connect(self.ruta)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _crear_tabla(self, cursor, nombre, definicion):
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {self._citar(nombre)} ({definicion})")
+
+    def _columnas_existentes(self, cursor, nombre):
+        return [fila[1] for fila in cursor.execute(f"PRAGMA table_info({self._citar(nombre)})")]
+
+
+class SalidaSQLServer(_SalidaBD):
+    """SQL Server vía pyodbc; conectar es una función que devuelve la conexión (p. ej. conectar_sql)."""
+
+    nombre = "sqlserver"
+    TIPOS = {"entero": "BIGINT", "real": "FLOAT", "texto": "NVARCHAR(4000)"}
+
+    def __init__(self, conectar, tabla):
+        super().__init__(tabla)
+        self.conectar = conectar
+
+    def _conectar(self):
+        conn = self.conectar()
+        if not conn:
+            raise RuntimeError("No se pudo conectar SQL.")
+        return conn
+
+    def _citar(self, nombre):
+        return f"[{nombre}]"
+
+    def _cursor(self):
+        cursor = self.conn.cursor()
+        cursor.fast_executemany = True
+        return cursor
+
+    def _crear_tabla(self, cursor, nombre, definicion):
+        cursor.execute(f"IF OBJECT_ID(?, 'U') IS NULL CREATE TABLE {self._citar(nombre)} ({definicion})", nombre)
+        self.conn.commit()
+
+    def _columnas_existentes(self, cursor, nombre):
+        cursor.execute("SELECT name FROM sys.columns WHERE object_id = OBJECT_ID(?)", nombre)
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def crear_salidas(nombres, base, tabla, hoja="Datos", conectar_sql=None, anexar=False, esquemas=None):
+    """
+    Arma las salidas elegidas: <base>.csv, <base>.xlsx, <base>.db (SQLite) y
+    SQL Server (por defecto con la conexión del script de carga a BD).
+    esquemas: {tabla (None = la principal): {columna: entero | real | texto}}.
+    """
+    esquemas = esquemas or {}
+    for declarada in esquemas.values():
+        invalidos = set(declarada.values()) - set(TIPOS_COLUMNA)
+        if invalidos:
+            raise ValueError(f"Tipos de columna desconocidos: {', '.join(invalidos)} "
+                             f"(válidos: {', '.join(TIPOS_COLUMNA)})")
+    salidas = []
+    for nombre in nombres:
+        if nombre == "csv":
+            salidas.append(SalidaCSV(base + ".csv", anexar=anexar))
+        elif nombre == "xlsx":
+            salidas.append(SalidaXLSX(base + ".xlsx", hoja))
+        elif nombre == "sqlite":
+            salidas.append(SalidaSQLite(base + ".db", tabla))
+        elif nombre == "sqlserver":
+            if conectar_sql is None:
+                # La configuración SQL vive en el script de carga a BD.
+                from Insertar_datos_historicos_PRTG_en_BD_SQL import conectar_sql
+            salidas.append(SalidaSQLServer(conectar_sql, tabla))
+        else:
+            raise ValueError(f"Salida desconocida: {nombre} (válidas: {', '.join(SALIDAS_VALIDAS)})")
+    for salida in salidas:
+        salida.esquemas = esquemas
+    return salidas
+
+
+# ==========================
+# COLA DE ESCRITURA
+# ==========================
+class ColaEscritura:
+    """
+    Un hilo escritor vuelca cada lote en todas las salidas. enviar() solo
+    encola, así el bucle de consultas nunca espera el disco ni la base de
+    datos; solo se bloquea si hay MAX_PENDIENTES lotes sin escribir.
+    Si una salida falla se informa y se desactiva, las demás siguen.
+    """
+
+    def __init__(self, salidas, max_pendientes=MAX_PENDIENTES):
+        self.salidas = list(salidas)
+        self.cola = queue.Queue(maxsize=max_pendientes)
+        self.hilo = threading.Thread(target=self._worker, daemon=True)
+        self.filas = 0
+        self.errores = 0
+
+    def iniciar(self):
+        self.hilo.start()
+        return self
+
+    def enviar(self, filas, tabla=None):
+        if filas:
+            self.cola.put((tabla, list(filas)))
+
+    def cerrar(self):
+        self.cola.put(_FIN)
+        self.hilo.join()
+        return self.filas
+
+    def _worker(self):
+        while True:
+            item = self.cola.get()
+            if item is _FIN:
+                break
+            tabla, filas = item
+            with perfil.etapa("write"):
+                for salida in list(self.salidas):
+                    try:
+                        salida.escribir(tabla, filas)
+                    except Exception as e:
+                        log.error(f"Salida {salida.nombre}: {e} (se desactiva)")
+                        self.errores += 1
+                        self.salidas.remove(salida)
+                        try:
+                            salida.cerrar()
+                        except Exception:
+                            pass
+            self.filas += len(filas)
+
+        for salida in self.salidas:
+            try:
+                salida.cerrar()
+            except Exception as e:
+                log.error(f"Cerrando salida {salida.nombre}: {e}")
+                self.errores += 1
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los scripts y módulos compartidos viven en la carpeta padre, sin paquete
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
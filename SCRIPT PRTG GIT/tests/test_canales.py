@@ -0,0 +1,55 @@
+from canales_prtg import CanalesSensor, EvaluadorCanales, resolver_canales, MAPAS_CANALES
+
+CANALES_HTTP = [{"objid": -4, "name": "Downtime"}, {"objid": 1, "name": "Bytes"},
+                {"objid": 0, "name": "Status"}, {"objid": 2, "name": "Loading time"}]
+
+
+class Tabla:
+    """consultar_tabla falso que cuenta las consultas de content=channels."""
+
+    def __init__(self):
+        self.consultas = []
+
+    def __call__(self, params):
+        self.consultas.append(params["id"])
+        return {"channels": CANALES_HTTP}
+
+
+def test_resolver_canales_ordena_por_id_y_salta_los_internos():
+    canales = resolver_canales(CANALES_HTTP, MAPAS_CANALES["http"])
+    assert (canales.estado, canales.latencia, canales.cantidad) == (2, 2, 3)
+    assert resolver_canales([{"objid": 0, "name": "Otro"}], MAPAS_CANALES["http"]) is None
+
+
+def test_evaluar_por_posicion():
+    canales = CanalesSensor(0, 1)
+    assert canales.evaluar([5.0, 120.0]) == ("up", 120.0)
+    assert canales.evaluar([None, 120.0]) == ("down", None)
+    assert canales.evaluar([5.0, 120.0], latencia_max=100) == ("down", None)
+    assert CanalesSensor(0).evaluar([5.0]) == ("up", None)
+
+
+def test_ping_no_consulta_canales():
+    tabla = Tabla()
+    evaluador = EvaluadorCanales(tabla, ["ping", "http"])
+    canales = evaluador.de_sensor({"objid": 10, "type": "ping"})
+    assert (canales.estado, canales.latencia) == (0, 0)
+    assert tabla.consultas == []
+
+
+def test_indices_resueltos_se_recuerdan_entre_ejecuciones(tmp_path):
+    archivo = str(tmp_path / "almacen" / "canales.json")
+    tabla = Tabla()
+    evaluador = EvaluadorCanales(tabla, ["http"], archivo=archivo)
+    assert evaluador.de_sensor({"objid": 11, "type": "http"}).estado == 2
+    assert evaluador.de_sensor({"objid": 11, "type": "http"}).estado == 2
+    evaluador.guardar()
+    assert tabla.consultas == [11]
+
+    otra = Tabla()
+    siguiente = EvaluadorCanales(otra, ["http", "port"], archivo=archivo)
+    assert siguiente.de_sensor({"objid": 11, "type": "http"}).estado == 2
+    assert otra.consultas == []
+    # Si el sensor cambió de tipo, el índice guardado no sirve
+    EvaluadorCanales(otra, ["port"], archivo=archivo).de_sensor({"objid": 11, "type": "port"})
+    assert otra.consultas == [11]
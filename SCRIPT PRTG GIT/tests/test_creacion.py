@@ -0,0 +1,45 @@
+import pytest
+
+import Crear_dispositivos_masivo_PRTG as creacion
+
+FILA = {"Dispositivo": "sw-01", "Host": "10.0.0.1", "GrupoID": "50"}
+
+
+@pytest.fixture
+def prtg(monkeypatch):
+    """duplicateobject, pause y la búsqueda por host reemplazados por un PRTG en memoria."""
+    estado = {"creados": [], "reanudados": [], "fallas_reanudar": 0}
+
+    def duplicar(plantilla, nombre, host, grupo):
+        estado["creados"].append(host)
+        return "9001"
+
+    def reanudar(objid):
+        if estado["fallas_reanudar"]:
+            estado["fallas_reanudar"] -= 1
+            raise RuntimeError("timeout")
+        estado["reanudados"].append(objid)
+
+    monkeypatch.setattr(creacion, "duplicar_dispositivo", duplicar)
+    monkeypatch.setattr(creacion, "reanudar", reanudar)
+    monkeypatch.setattr(creacion, "buscar_en_prtg", lambda host, grupo: "9001" if estado["creados"] else None)
+    monkeypatch.setattr(creacion, "RETRY_DELAY", 0)
+    monkeypatch.setattr(creacion, "REANUDAR", True)
+    return estado
+
+
+def test_reintento_reanuda_el_dispositivo_ya_creado(prtg):
+    prtg["fallas_reanudar"] = 1
+    resultado = creacion.crear(FILA, creacion.Inventario())
+    assert (resultado["Estado"], resultado["ObjID"]) == ("creado", "9001")
+    assert prtg["creados"] == ["10.0.0.1"]
+    assert prtg["reanudados"] == ["9001"]
+
+
+def test_sin_poder_reanudar_queda_como_creado_pausado(prtg):
+    prtg["fallas_reanudar"] = creacion.MAX_RETRIES
+    inventario = creacion.Inventario()
+    resultado = creacion.crear(FILA, inventario)
+    assert (resultado["Estado"], resultado["ObjID"]) == ("creado_pausado", "9001")
+    assert prtg["creados"] == ["10.0.0.1"]
+    assert inventario.buscar("10.0.0.1", "50") == "9001"
@@ -0,0 +1,164 @@
+import sqlite3
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import Insertar_datos_historicos_PRTG_en_BD_SQL as insertar
+from historicos_prtg import EPOCA_OLE, resumir_histdata
+
+SENSOR = {"objid": 2001, "parentid": 1500, "group": "G1", "device": "dev1", "sensor": "Ping"}
+
+
+def registro(fecha, valor):
+    raw = (fecha - EPOCA_OLE).total_seconds() / 86400
+    return [("datetime", str(fecha)), ("datetime_raw", raw), ("value", ""), ("value_raw", valor),
+            ("coverage_raw", 10000)]
+
+
+def historico_con_corte():
+    """48 horas desde el 2024-01-01, con 3 horas caídas el día 1 de 02:00 a 05:00."""
+    registros = []
+    for hora in range(48):
+        fecha = datetime(2024, 1, 1 + hora // 24, hora % 24)
+        registros.append(registro(fecha, "" if 2 <= hora < 5 else 20.0))
+    return registros
+
+
+@pytest.fixture
+def bd(tmp_path, monkeypatch):
+    """SQL Server reemplazado por SQLite con las mismas claves de Disponibilidad_PRTG y Cortes_PRTG."""
+    ruta = str(tmp_path / "prtg.db")
+    conn = sqlite3.connect(ruta)
+    conn.execute("""
+        CREATE TABLE Disponibilidad_PRTG (
+            Grupo, Dispositivo, Sensor, SensorID, Disponibilidad, Horas_Up, Horas_Down, Horas_Omitidas,
+            Total_Horas, Fecha_Inicio, Fecha_Fin, Latencia_P50, Latencia_P95, Latencia_P99,
+            Horas_Mantenimiento, Latencia_Promedio,
+            UNIQUE (SensorID, Fecha_Inicio, Fecha_Fin))
+    """)
+    conn.execute("""
+        CREATE TABLE Cortes_PRTG (
+            SensorID, Inicio, Fin, Duracion_Minutos, Muestras, Fecha_Inicio NOT NULL, Fecha_Fin NOT NULL,
+            PRIMARY KEY (SensorID, Inicio, Fecha_Inicio, Fecha_Fin))
+    """)
+    conn.commit()
+
+    falso = SimpleNamespace(Error=sqlite3.Error, IntegrityError=sqlite3.IntegrityError,
+                            connect=lambda *a, **k: sqlite3.connect(ruta, check_same_thread=False))
+    rollups = []
+    monkeypatch.setattr(insertar, "pyodbc", falso)
+    monkeypatch.setattr(insertar, "aplicar_rollups", lambda cursor, deltas: rollups.append(deltas))
+    monkeypatch.setattr(insertar, "REQUEST_DELAY", 0)
+    monkeypatch.setattr(insertar, "USAR_ALMACEN_LOCAL", False)
+    monkeypatch.setattr(insertar, "resumir_historico",
+                        lambda url, params, *a, mantenimiento=None, canales=None, periodos=None, **k:
+                        resumir_histdata(historico_con_corte(), mantenimiento=mantenimiento, canales=canales,
+                                         periodos=periodos))
+    yield conn, rollups
+    conn.close()
+
+
+def test_periodos_solapados_guardan_cada_fila_y_sus_cortes(bd):
+    conn, rollups = bd
+    periodos = [("2024-01-01 a 2024-01-01", "2024/01/01", "2024/01/01"),
+                ("2024-01-01 a 2024-01-02", "2024/01/01", "2024/01/02")]
+
+    filas = insertar.procesar_sensor(SENSOR, "2024/01/01", "2024/01/02", periodos=periodos)
+    assert [f["Fecha Fin"] for f, _, _, _ in filas] == ["2024/01/01", "2024/01/02"]
+    assert all(len(cortes) == 1 for _, _, cortes, _ in filas)
+
+    pool = insertar.PoolEscritoresSQL(n_workers=1, batch_size=10)
+    pool.iniciar()
+    for fila, deltas, cortes, _ in filas:
+        pool.enviar(fila, deltas, cortes)
+    totales = pool.cerrar()
+
+    assert totales == {"insertado": 2, "duplicado": 0, "error": 0}
+    assert conn.execute("SELECT Fecha_Fin, Horas_Down FROM Disponibilidad_PRTG ORDER BY Fecha_Fin").fetchall() == [
+        ("2024/01/01", 3), ("2024/01/02", 3)]
+    # El mismo corte queda una vez por cada período que lo contiene
+    assert conn.execute("SELECT Fecha_Fin, Duracion_Minutos FROM Cortes_PRTG ORDER BY Fecha_Fin").fetchall() == [
+        ("2024/01/01", 180), ("2024/01/02", 180)]
+    # Los rollups reciben cada día una sola vez
+    dias = [clave[3] for deltas in rollups for clave in deltas if clave[:2] == ("diario", "Sensor")]
+    assert sorted(dias) == [datetime(2024, 1, 1).date(), datetime(2024, 1, 2).date()]
+
+
+def test_periodos_lejanos_no_descargan_el_hueco(bd, monkeypatch):
+    rangos = []
+    resumir = insertar.resumir_historico
+    monkeypatch.setattr(insertar, "resumir_historico", lambda url, params, *a, **k: (
+        rangos.append((params["sdate"][:10], params["edate"][:10])), resumir(url, params, *a, **k))[1])
+    periodos = [("2023-01", "2023/01/01", "2023/01/31"), ("2024-01", "2024/01/01", "2024/01/31")]
+
+    filas = insertar.procesar_sensor(SENSOR, "2023/01/01", "2024/01/31", periodos=periodos)
+    assert rangos == [("2023-01-01", "2023-01-31"), ("2024-01-01", "2024-01-31")]
+    assert [f["Fecha Inicio"] for f, _, _, _ in filas] == ["2023/01/01", "2024/01/01"]
+
+
+def test_percentiles_solo_de_filas_insertadas_y_sin_sumar_dos_veces(bd):
+    filas = insertar.procesar_sensor(SENSOR, "2024/01/01", "2024/01/02")
+    fila, deltas, cortes, sketch = filas[0]
+    clave = (SENSOR["objid"], fila["Fecha Inicio"], fila["Fecha Fin"])
+
+    pool = insertar.PoolEscritoresSQL(n_workers=1, batch_size=10)
+    pool.iniciar()
+    pool.enviar(fila, deltas, cortes)
+    pool.enviar(dict(fila, Grupo="G2"), deltas, cortes)   # mismo sensor y período: duplicado
+    assert pool.cerrar() == {"insertado": 1, "duplicado": 1, "error": 0}
+    assert pool.insertados == {clave}
+
+    por_grupo = {"G1": {SENSOR["objid"]: sketch}, "G2": {2002: sketch}}
+    insertados = insertar.sketches_insertados(por_grupo, pool.insertados, fila["Fecha Inicio"], fila["Fecha Fin"])
+    assert insertados == {"G1": {SENSOR["objid"]: sketch}}
+
+    primero, sensores, ids = insertar.combinar_percentiles(None, insertados["G1"])
+    guardado = (primero.a_json(), sensores, insertar.json.dumps(sorted(ids)))
+    assert (sensores, primero.n) == (1, sketch.n)
+    # Repetir la carga no vuelve a sumar el mismo sensor
+    assert insertar.combinar_percentiles(guardado, insertados["G1"]) is None
+    otro, sensores, ids = insertar.combinar_percentiles(guardado, {SENSOR["objid"]: sketch, 2003: sketch})
+    assert (sensores, otro.n, ids) == (2, 2 * sketch.n, {SENSOR["objid"], 2003})
+
+
+class ConexionQueSeCae:
+    """Conexión SQLite que se cae en el primer rollback, como una sesión que SQL Server cerró."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.caida = False
+
+    def cursor(self):
+        if self.caida:
+            raise sqlite3.OperationalError("conexión caída")
+        return self.conn.cursor()
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        # SQL Server deshace la transacción de una sesión cerrada; el cliente recibe el error
+        self.caida = True
+        self.conn.rollback()
+        self.conn.close()
+        raise sqlite3.OperationalError("conexión caída")
+
+    def close(self):
+        self.conn.close()
+
+
+def test_duplicado_con_la_conexion_caida_no_detiene_al_escritor(bd, monkeypatch):
+    conn, _ = bd
+    ruta = conn.execute("PRAGMA database_list").fetchone()[2]
+    monkeypatch.setattr(insertar.pyodbc, "connect",
+                        lambda *a, **k: ConexionQueSeCae(sqlite3.connect(ruta, check_same_thread=False)))
+    fila, deltas, cortes, _ = insertar.procesar_sensor(SENSOR, "2024/01/01", "2024/01/02")[0]
+    assert insertar.insertar_resumen(insertar.conectar_sql(), fila) == "insertado"
+
+    pool = insertar.PoolEscritoresSQL(n_workers=1, batch_size=10)
+    pool.iniciar()
+    pool.enviar(fila, deltas, cortes)
+    pool.enviar(dict(fila, SensorID=2002), deltas, cortes)
+    assert pool.cerrar() == {"insertado": 1, "duplicado": 1, "error": 0}
+    assert conn.execute("SELECT SensorID FROM Disponibilidad_PRTG ORDER BY SensorID").fetchall() == [(2001,), (2002,)]
@@ -0,0 +1,52 @@
+import heapq
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import Monitoreo_continuo_canales_PRTG as monitoreo
+
+
+def test_leer_dispositivos_quita_repetidos_en_orden():
+    assert monitoreo.leer_dispositivos("30, 10,x\n30,20 ,10") == ["30", "10", "20"]
+
+
+def test_cola_llena_no_bloquea_a_los_demas_dispositivos(monkeypatch):
+    """El envío de un dispositivo espera al del otro: con el lock tomado no llegaría nunca."""
+    otro_envio = threading.Event()
+    esperas = []
+
+    class ColaLenta:
+        def __init__(self, salidas):
+            pass
+
+        def iniciar(self):
+            pass
+
+        def enviar(self, filas):
+            if filas[0]["Device"] == "1":
+                esperas.append(otro_envio.wait(timeout=2))
+            else:
+                otro_envio.set()
+
+        def cerrar(self):
+            pass
+
+    sacados = []
+
+    def sacar(agenda):
+        if len(sacados) == 2:
+            raise KeyboardInterrupt
+        sacados.append(heapq.heappop(agenda))
+        return sacados[-1]
+
+    monkeypatch.setattr(monitoreo, "INTERVALO_SONDEO", 0.2)
+    monkeypatch.setattr(monitoreo, "MAX_WORKERS", 2)
+    monkeypatch.setattr(monitoreo, "crear_salidas", lambda *a, **k: [])
+    monkeypatch.setattr(monitoreo, "ColaEscritura", ColaLenta)
+    monkeypatch.setattr(monitoreo, "heapq", SimpleNamespace(heappush=heapq.heappush, heappop=sacar))
+    monkeypatch.setattr(monitoreo, "sondear_perfilado", lambda device_id: ([{"Device": device_id}], 1, 1))
+
+    with pytest.raises(KeyboardInterrupt):
+        monitoreo.monitorear(["1", "2"])
+    assert esperas == [True]
@@ -0,0 +1,55 @@
+from datetime import date
+
+import pytest
+
+from historicos_prtg import fecha_ole
+from periodos_prtg import leer_periodos, union, rangos_ole, tramos, por_tramos
+
+HOY = date(2024, 5, 15)
+
+
+def test_leer_periodos_reconoce_cada_formato():
+    periodos = leer_periodos("2024, 2024-02, 2024-T2, 2024-q1, ytd, 2024/01/10~2024/01/20", HOY)
+    assert periodos == [
+        ("2024", "2024/01/01", "2024/12/31"),
+        ("2024-02", "2024/02/01", "2024/02/29"),
+        ("2024-T2", "2024/04/01", "2024/06/30"),
+        ("2024-T1", "2024/01/01", "2024/03/31"),
+        ("YTD 2024", "2024/01/01", "2024/05/15"),
+        ("2024-01-10 a 2024-01-20", "2024/01/10", "2024/01/20"),
+    ]
+
+
+def test_leer_periodos_sin_repetidos():
+    assert leer_periodos("2024-T1, 2024-Q1, , 2024-T1", HOY) == [("2024-T1", "2024/01/01", "2024/03/31")]
+
+
+@pytest.mark.parametrize("texto", ["2024-13", "enero", "2024/02/10~2024/02/01"])
+def test_leer_periodos_rechaza_textos_invalidos(texto):
+    with pytest.raises(ValueError):
+        leer_periodos(texto, HOY)
+
+
+def test_rangos_ole_incluyen_el_dia_de_fin_completo():
+    (desde, hasta), = rangos_ole([("x", "2024/01/01", "2024/01/31")])
+    assert fecha_ole(desde).date() == date(2024, 1, 1)
+    assert fecha_ole(hasta).date() == date(2024, 2, 1)
+
+
+def test_tramos_separa_periodos_lejanos_y_junta_los_cercanos():
+    periodos = leer_periodos("2024-01, 2023-01, 2024-T1, 2024-03", HOY)
+    assert union(periodos) == ("2023/01/01", "2024/03/31")
+    assert tramos(periodos) == [("2023/01/01", "2023/01/31", [1]), ("2024/01/01", "2024/03/31", [0, 2, 3])]
+    assert len(tramos(leer_periodos("2024-01, 2024-03", HOY), hueco_max=0)) == 2
+
+
+def test_por_tramos_devuelve_en_el_orden_de_los_periodos():
+    periodos = leer_periodos("2024-01, 2023-01, 2024-02", HOY)
+    descargas = []
+
+    def descargar(inicio, fin, del_tramo):
+        descargas.append((inicio, fin))
+        return [etiqueta for etiqueta, _, _ in del_tramo]
+
+    assert por_tramos(periodos, descargar) == ["2024-01", "2023-01", "2024-02"]
+    assert descargas == [("2023/01/01", "2023/01/31"), ("2024/01/01", "2024/02/29")]
@@ -0,0 +1,56 @@
+from datetime import date, datetime
+
+import pytest
+
+import almacen_prtg
+import historicos_prtg as hist
+from mantenimiento_prtg import segundos_ole
+from periodos_prtg import rangos_ole
+
+
+@pytest.fixture
+def bogota(monkeypatch):
+    """Fechas legibles en UTC-5 (sin horario de verano) y datetime_raw en UTC."""
+    monkeypatch.setattr(hist, "ZONA_HORARIA", "America/Bogota")
+
+
+def raw(fecha_utc):
+    return (fecha_utc - hist.EPOCA_OLE).total_seconds() / 86400
+
+
+def test_conversiones_entre_zona_y_utc(bogota):
+    assert hist.local_a_utc(datetime(2024, 1, 1)) == datetime(2024, 1, 1, 5)
+    assert hist.utc_a_local(datetime(2024, 1, 1, 5)) == datetime(2024, 1, 1)
+    assert hist.fecha_local_ole(raw(datetime(2024, 1, 2, 3))) == datetime(2024, 1, 1, 22)
+    assert hist.dia_local(raw(datetime(2024, 1, 2, 3)) * 86400) == date(2024, 1, 1)
+
+
+def test_periodos_y_mantenimientos_se_comparan_en_utc(bogota):
+    (desde, hasta), = rangos_ole([("x", "2024/01/01", "2024/01/01")])
+    assert (hist.fecha_ole(desde), hist.fecha_ole(hasta)) == (datetime(2024, 1, 1, 5), datetime(2024, 1, 2, 5))
+    assert segundos_ole(datetime(2024, 1, 1, 2)) == round(raw(datetime(2024, 1, 1, 7)) * 86400)
+
+
+def test_por_dia_usa_el_dia_local(bogota):
+    muestras = [("up", 10.0, raw(datetime(2024, 1, 2, 3))), ("up", 10.0, raw(datetime(2024, 1, 2, 6)))]
+    por_dia = hist.resumir_muestras(muestras)["por_dia"]
+    assert sorted(por_dia) == [date(2024, 1, 1), date(2024, 1, 2)]
+
+
+def test_almacen_pide_el_rango_local_y_no_guarda_la_hora_en_curso(bogota, monkeypatch, tmp_path):
+    pedidos = []
+
+    def descargar(almacen, url, params, a, b, *args):
+        pedidos.append((params["sdate"], almacen_prtg.fecha_prtg(almacen_prtg.fecha_de_slot(a, 3600)),
+                        almacen_prtg.fecha_de_slot(b, 3600)))
+        almacen.marcar(a, b, almacen_prtg.SIN_DATO)
+        return True
+
+    monkeypatch.setattr(almacen_prtg, "_descargar_hueco", descargar)
+    # En UTC ya es el 2 de enero a las 02:30; en Bogotá todavía el 1 a las 21:30
+    monkeypatch.setattr(hist, "ahora_utc", lambda: datetime(2024, 1, 2, 2, 30))
+    params = {"id": 1, "avg": 3600, "sdate": "2024-01-01-00-00-00", "edate": "2024-01-01-23-59-59"}
+    almacen_prtg.resumir_con_almacen("url", params, directorio=str(tmp_path))
+
+    # Desde la medianoche local hasta el inicio de la hora en curso (02:00 UTC), sin incluirla
+    assert pedidos == [("2024-01-01-00-00-00", "2024-01-01-00-00-00", datetime(2024, 1, 2, 2))]
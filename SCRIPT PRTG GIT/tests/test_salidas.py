@@ -0,0 +1,82 @@
+import csv
+import sqlite3
+
+import openpyxl
+import pytest
+
+from salidas_prtg import SalidaCSV, SalidaSQLite, SalidaXLSX, crear_salidas
+
+
+def test_xlsx_nombres_de_hoja_largos_no_se_mezclan(tmp_path):
+    ruta = str(tmp_path / "informe.xlsx")
+    salida = SalidaXLSX(ruta, hoja="Informe")
+    tablas = ["Percentiles 2024-01-01 a 2024-01-31", "Percentiles 2024-01-01 a 2024-03-31",
+              "Percentiles 2024-01-01 a 2024-03-31 [x]", None]
+    for n, tabla in enumerate(tablas):
+        salida.escribir(tabla, [{"Tabla": n}])
+        salida.escribir(tabla, [{"Tabla": n}])
+    salida.cerrar()
+
+    wb = openpyxl.load_workbook(ruta)
+    assert wb.sheetnames == ["Percentiles 2024-01-01 a 2024-0", "Percentiles 2024-01-01 a 20 (2)",
+                             "Percentiles 2024-01-01 a 20 (3)", "Informe"]
+    for n, titulo in enumerate(wb.sheetnames):
+        assert [c.value for c in wb[titulo]["A"]] == ["Tabla", n, n]
+
+
+def test_csv_columnas_nuevas_en_otra_tanda_no_rompen(tmp_path):
+    ruta = str(tmp_path / "deltas.csv")
+    salida = SalidaCSV(ruta)
+    salida.escribir(None, [{"A": 1, "B": 2}])
+    salida.escribir(None, [{"A": 3, "C": 4}])
+    salida.cerrar()
+
+    with open(ruta, newline="", encoding="utf-8") as f:
+        assert list(csv.reader(f)) == [["A", "B"], ["1", "2"], ["3", ""]]
+
+
+def test_csv_anexar_usa_la_cabecera_existente_y_rechaza_otra(tmp_path):
+    ruta = str(tmp_path / "deltas.csv")
+    with open(ruta, "w", newline="", encoding="utf-8") as f:
+        f.write("B,A\r\n2,1\r\n")
+
+    salida = SalidaCSV(ruta, anexar=True)
+    salida.escribir(None, [{"A": 3, "B": 4}])
+    salida.cerrar()
+    with open(ruta, newline="", encoding="utf-8") as f:
+        assert list(csv.reader(f)) == [["B", "A"], ["2", "1"], ["4", "3"]]
+
+    salida = SalidaCSV(ruta, anexar=True)
+    with pytest.raises(ValueError, match="faltan C"):
+        salida.escribir(None, [{"A": 5, "C": 6}])
+
+
+def test_sqlite_primera_tanda_vacia_no_fija_texto(tmp_path):
+    ruta = str(tmp_path / "informe.db")
+    salida = SalidaSQLite(ruta, "Informe")
+    salida.escribir(None, [{"SensorID": 1, "Latencia P50 (ms)": None}])
+    salida.escribir(None, [{"SensorID": 2, "Latencia P50 (ms)": 12.5, "Nueva": 3}])
+    salida.cerrar()
+
+    conn = sqlite3.connect(ruta)
+    tipos = {fila[1]: fila[2] for fila in conn.execute("PRAGMA table_info(Informe)")}
+    assert tipos == {"SensorID": "INTEGER", "Latencia P50 (ms)": "REAL", "Nueva": "INTEGER"}
+    assert conn.execute("SELECT * FROM Informe ORDER BY SensorID").fetchall() == [(1, None, None), (2, 12.5, 3)]
+    conn.close()
+
+
+def test_esquema_declarado_fija_columnas_y_tipos(tmp_path):
+    esquemas = {None: {"SensorID": "entero", "Disponibilidad": "real", "Sensor": "texto"}}
+    base = str(tmp_path / "informe")
+    for salida in crear_salidas(["csv", "sqlite"], base, "Informe", esquemas=esquemas):
+        salida.escribir(None, [{"Sensor": "Ping", "SensorID": 1, "Disponibilidad": None}])
+        salida.cerrar()
+
+    with open(base + ".csv", newline="", encoding="utf-8") as f:
+        assert next(csv.reader(f)) == ["SensorID", "Disponibilidad", "Sensor"]
+    conn = sqlite3.connect(base + ".db")
+    tipos = [(fila[1], fila[2]) for fila in conn.execute("PRAGMA table_info(Informe)")]
+    assert tipos == [("SensorID", "INTEGER"), ("Disponibilidad", "REAL"), ("Sensor", "TEXT")]
+    conn.close()
+    with pytest.raises(ValueError, match="decimal"):
+        crear_salidas(["csv"], base, "Informe", esquemas={None: {"A": "decimal"}})
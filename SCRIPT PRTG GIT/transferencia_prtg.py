@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Control del volumen transferido desde la API de PRTG.
+#
+# Todas las peticiones piden gzip (CABECERAS) y pasan la respuesta por
+# registrar(): bytes recibidos por la red, bytes ya descomprimidos y si PRTG
+# respondió comprimido. reporte() imprime el total de la ejecución.
+#
+# Para las columnas con versión numérica PRTG devuelve dos claves, p. ej.
+# "lastvalue" (texto para mostrar, "12 msec") y "lastvalue_raw" (12.0).
+# valores_raw() deja solo las columnas que usa cada export, con el _raw.
+#
+# LimitadorTasa espacia las peticiones contra un servidor (lo comparten la
+# federación y la creación masiva de dispositivos).
+
+import threading
+import time
+
+CABECERAS = {"Accept-Encoding": "gzip, deflate"}
+MINIMO_PARA_COMPRIMIR = 1024   # Respuestas más chicas pueden llegar sin gzip
+
+_lock = threading.Lock()
+_totales = {
+    "respuestas": 0,
+    "comprimidas": 0,
+    "red": 0,              # Bytes recibidos por la red (comprimidos)
+    "red_medida": 0,       # Bytes de red de las respuestas con tamaño descomprimido conocido
+    "descomprimidos": 0
+}
+_avisado = False
+
+
+# ==========================
+# BYTES TRANSFERIDOS
+# ==========================
+def registrar(resp, stream=False):
+    """
+    Cuenta una respuesta ya leída. Con stream=True (respuesta consumida por
+    un parser incremental) solo se conoce el tamaño en la red.
+    """
+    global _avisado
+    codificacion = resp.headers.get("Content-Encoding", "").lower()
+    comprimida = "gzip" in codificacion or "deflate" in codificacion
+    red = resp.raw.tell() if hasattr(resp.raw, "tell") else 0
+    descomprimidos = None if stream else len(resp.content)
+    if not red and descomprimidos is not None and not comprimida:
+        red = descomprimidos
+
+    with _lock:
+        _totales["respuestas"] += 1
+        _totales["comprimidas"] += comprimida
+        _totales["red"] += red
+        if descomprimidos is not None:
+            _totales["red_medida"] += red
+            _totales["descomprimidos"] += descomprimidos
+        avisar = not comprimida and red >= MINIMO_PARA_COMPRIMIR and not _avisado
+        if avisar:
+            _avisado = True
+
+    if avisar:
+        print("⚠ PRTG respondió sin comprimir (sin Content-Encoding gzip): "
+              "revisar la compresión en el servidor web de PRTG o en el proxy")
+    return resp
+
+
+def formatear_bytes(n):
+    if n < 1024:
+        return f"{n} B"
+    for unidad in ("KB", "MB", "GB"):
+        n /= 1024
+        if n < 1024 or unidad == "GB":
+            return f"{n:.1f} {unidad}"
+
+
+def reporte():
+    with _lock:
+        t = dict(_totales)
+    if not t["respuestas"]:
+        return
+
+    print(f"\nTransferido desde PRTG: {formatear_bytes(t['red'])} en {t['respuestas']} respuestas "
+          f"({t['comprimidas']} comprimidas)")
+    if t["red_medida"] and t["descomprimidos"] > t["red_medida"]:
+        print(f"  Sin compresión habrían sido {formatear_bytes(t['descomprimidos'])} en las respuestas medidas "
+              f"(x{t['descomprimidos'] / t['red_medida']:.1f})")
+
+
+# ==========================
+# LÍMITE DE TASA POR SERVIDOR
+# ==========================
+class LimitadorTasa:
+    """Espacia las peticiones para no superar max_rps contra un servidor."""
+
+    def __init__(self, max_rps):
+        self.intervalo = 1.0 / max_rps if max_rps else 0.0
+        self.lock = threading.Lock()
+        self.siguiente = 0.0
+
+    def esperar(self):
+        with self.lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self.siguiente)
+            self.siguiente = turno + self.intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+# ==========================
+# COLUMNAS
+# ==========================
+def valores_raw(registros, columnas, raw=()):
+    """
+    Deja en cada registro solo `columnas`; para las incluidas en `raw` usa
+    el valor <columna>_raw si PRTG lo entregó, en vez del texto formateado.
+    """
+    return [
+        {c: r.get(c + "_raw", r.get(c)) if c in raw else r.get(c) for c in columnas}
+        for r in registros
+    ]